@@ -0,0 +1,145 @@
+import re
+import logging
+import unicodedata
+
+
+
+class AnswerMatcher():
+    """
+    USAGE:
+        answer_matcher = AnswerMatcher(similarity_required=0.8)
+
+        # at ingest time
+        entry["normalized_answers"] = answer_matcher.normalize_all(
+                                      entry["answers"])
+
+        # for every user answer
+        is_correct = answer_matcher.is_correct(user_answer,
+                                               entry["normalized_answers"])
+
+    similarity of two normalized strings is 1 - indel_distance / total_length
+    (indel distance counts insertions and deletions only), which equals
+    2 * LCS / total_length and matches difflib.SequenceMatcher.ratio()
+    for the short phrases the bot deals with
+
+    the distance is computed only within the band allowed by
+    similarity_required and stops as soon as it's exceeded,
+    so wrong answers are rejected after a few rows
+    """
+
+    # letters which are typed interchangeably
+    LETTER_FOLDING = str.maketrans({
+        "ё": "е",
+    })
+    SEPARATORS = re.compile(r"\s+")
+
+    def __init__(self, similarity_required=0.8):
+        self.logger = logging.getLogger(__name__)
+
+        self.similarity_required = similarity_required
+
+
+    def normalize(self, text):
+        """
+        function returns:
+            str - NFKC normalized, case folded text where punctuation
+                  is replaced by spaces and spaces are collapsed
+        """
+
+        text = unicodedata.normalize("NFKC", text).casefold()
+        text = text.translate(self.LETTER_FOLDING)
+        text = "".join(" " if unicodedata.category(char).startswith("P")
+                       else char for char in text)
+        return self.SEPARATORS.sub(" ", text).strip()
+
+
+    def normalize_all(self, answers):
+        return [self.normalize(answer) for answer in answers]
+
+
+    def is_correct(self, user_answer, normalized_answers):
+        """
+        args:
+            user_answer (str) - raw text sent by user
+            normalized_answers (list) - answers normalized by normalize()
+
+        function returns:
+            True - user_answer is similar enough to one of the answers
+            False - otherwise
+        """
+
+        normalized_user_answer = self.normalize(user_answer)
+        return any(self.is_similar(normalized_user_answer, answer)
+                   for answer in normalized_answers)
+
+
+    def is_similar(self, first, second):
+        """
+        function returns:
+            True - similarity of two normalized strings is
+                   greater than similarity_required
+            False - otherwise
+        """
+
+        if first == second:
+            return True
+        total_length = len(first) + len(second)
+        max_distance = self._max_distance(total_length)
+        distance = self.bounded_distance(first, second, max_distance)
+        if distance is None:
+            return False
+        return 1 - distance / total_length > self.similarity_required
+
+
+    def _max_distance(self, total_length):
+        # the largest distance which might pass the threshold,
+        # the final verdict is made by the same formula as ratio()
+        return int((1 - self.similarity_required) * total_length) + 1
+
+
+    @staticmethod
+    def bounded_distance(first, second, max_distance):
+        """
+        function returns:
+            int - indel distance between first and second
+            None - distance is greater than max_distance
+        """
+
+        if abs(len(first) - len(second)) > max_distance:
+            return None
+        if len(first) > len(second):
+            first, second = second, first
+
+        # previous[j] - distance between first[:i] and second[:j],
+        # cells outside of the band |i - j| <= max_distance are never
+        # within the bound and are kept as infinity
+        infinity = max_distance + 1
+        previous = [j if j <= max_distance else infinity
+                    for j in range(len(second) + 1)]
+
+        for i in range(1, len(first) + 1):
+            current = [infinity] * (len(second) + 1)
+            if i <= max_distance:
+                current[0] = i
+
+            low = max(1, i - max_distance)
+            high = min(len(second), i + max_distance)
+            char = first[i - 1]
+            row_minimum = current[0]
+            for j in range(low, high + 1):
+                if char == second[j - 1]:
+                    value = previous[j - 1]
+                else:
+                    value = min(previous[j], current[j - 1]) + 1
+                if value > infinity:
+                    value = infinity
+                current[j] = value
+                if value < row_minimum:
+                    row_minimum = value
+
+            if row_minimum > max_distance:
+                return None
+            previous = current
+
+        distance = previous[len(second)]
+        return distance if distance <= max_distance else None
@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+import threading
+
+import yaml
+from jinja2 import Environment, BaseLoader, TemplateError
+
+
+
+class AnswerTemplates():
+    """
+    USAGE:
+        answer_templates = AnswerTemplates("answers.yml", default_lang="en")
+        answer_templates.reload()
+
+        text = answer_templates.get("hello", lang_code)
+        text = answer_templates.render("user_answer_feedback", lang_code,
+                                       is_answer_correct=True, ...)
+
+    every entry of the file is compiled once per language on load,
+    unknown languages fall back to default_lang (and to any language
+    which the entry has if default_lang is missing too)
+
+    the file is checked for changes at most every check_interval
+    seconds on access, a changed file is loaded again, a broken file
+    is logged and the previous templates are kept
+    """
+
+    ROOT_KEY = "answers"
+
+    def __init__(self, filename, default_lang="en", check_interval=10):
+        self.logger = logging.getLogger(__name__)
+
+        self.filename = filename
+        self.default_lang = default_lang
+        self.check_interval = check_interval
+
+        self.__environment = Environment(loader=BaseLoader())
+        self.__lock = threading.Lock()
+        # key: {lang_code: (text, compiled template)}
+        self.__templates = {}
+        self.__mtime = None
+        self.__last_check = time.monotonic()
+
+
+    def reload(self):
+        """
+        load and compile the file
+
+        function returns:
+            True - templates are replaced with the file content
+            False - the file cannot be read or parsed, templates are kept
+        """
+
+        try:
+            mtime = os.stat(self.filename).st_mtime
+            with open(self.filename, "r") as file:
+                data = yaml.safe_load(file)[self.ROOT_KEY]
+
+            templates = {}
+            for key, translations in data.items():
+                templates[key] = {
+                    lang_code: (text,
+                                self.__environment.from_string(text))
+                    for lang_code, text in translations.items()
+                }
+        except (OSError, yaml.YAMLError, TemplateError,
+                KeyError, TypeError, AttributeError) as exc:
+            self.logger.exception("Cannot load answers from %s due to %s",
+                                  self.filename, exc)
+            return False
+
+        with self.__lock:
+            self.__templates = templates
+            self.__mtime = mtime
+        self.logger.info("loaded %s answers from %s",
+                         len(templates), self.filename)
+        return True
+
+
+    def reload_if_changed(self):
+        """
+        function returns:
+            True - the file has been changed and loaded
+            False - otherwise
+        """
+
+        try:
+            mtime = os.stat(self.filename).st_mtime
+        except OSError as exc:
+            self.logger.warning("Cannot check %s due to %s",
+                                self.filename, exc)
+            return False
+
+        if mtime == self.__mtime:
+            return False
+        return self.reload()
+
+
+    def get(self, key, lang_code):
+        """
+        function returns:
+            str - raw text of <key> in lang_code or in the fallback language
+        """
+
+        return self._lookup(key, lang_code)[0]
+
+
+    def render(self, key, lang_code, **context):
+        """
+        function returns:
+            str - compiled template <key> rendered with context
+        """
+
+        return self._lookup(key, lang_code)[1].render(context)
+
+
+    def _lookup(self, key, lang_code):
+        now = time.monotonic()
+        if now - self.__last_check >= self.check_interval:
+            self.__last_check = now
+            self.reload_if_changed()
+
+        translations = self.__templates[key]
+        for candidate in [lang_code, str(lang_code).split("-")[0],
+                          self.default_lang]:
+            if candidate in translations:
+                return translations[candidate]
+        return next(iter(translations.values()))
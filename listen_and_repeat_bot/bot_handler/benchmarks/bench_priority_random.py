@@ -0,0 +1,76 @@
+"""
+compares ProgressQueuePriorityRandom with the previous
+implementation which rebuilt population and weights on every call
+
+USAGE:
+    PYTHONPATH=. python3 benchmarks/bench_priority_random.py --questions 10000
+"""
+import json
+import random
+import argparse
+import timeit
+
+from progress_queue_library import (
+    ProgressQueueRandom,
+    ProgressQueuePriorityRandom
+)
+
+
+class LegacyProgressQueuePriorityRandom(ProgressQueueRandom):
+    """
+    previous O(n) implementation with a fixed weight function
+    """
+
+    __slots__ = ()
+
+    def next_question(self):
+        choices = random.choices(
+                       population=list(self.progress.keys()),
+                       weights=[1001 - el for el in self.progress.values()],
+                       k=1)
+        self.current_question_id = choices[0] if choices else None
+        return self.current_question_id
+
+
+def answer_questions(queue_obj, answers):
+    for i in range(answers):
+        question_id = queue_obj.next_question()
+        queue_obj.change_question_progress(question_id,
+                                           15 if i % 3 else -35)
+
+
+def run(questions, answers, repeat):
+    progress = {f"{i:040x}": random.randint(0, 1000)
+                for i in range(questions)}
+
+    results = []
+    for queue_class in [LegacyProgressQueuePriorityRandom,
+                        ProgressQueuePriorityRandom]:
+        queue_obj = queue_class()
+        queue_obj.set_progress(dict(progress))
+        # build lazy structures outside of measurements
+        queue_obj.next_question()
+
+        seconds = min(timeit.repeat(
+                      lambda: answer_questions(queue_obj, answers),
+                      number=1, repeat=repeat))
+        results.append({
+            "benchmark": "priority_random_answer",
+            "implementation": queue_class.__name__,
+            "questions": questions,
+            "answers": answers,
+            "seconds": seconds,
+            "us_per_answer": seconds / answers * 1e6
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=10000)
+    parser.add_argument("--answers", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for result in run(args.questions, args.answers, args.repeat):
+        print(json.dumps(result))
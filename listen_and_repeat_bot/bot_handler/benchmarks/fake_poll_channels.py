@@ -0,0 +1,118 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler
+
+from benchmarks.fake_telegram import FakeHTTPServer
+
+
+
+def format_channels(channels, parser="parser_default"):
+    """
+    convert parsed channels (like tests/fixtures/poll_channels_data.json)
+    to raw posts which poll_channels serves
+
+    function returns:
+        dict - full /data response of poll_channels
+    """
+
+    data = {"cursor": "fake-1", "full": True, "channels": []}
+    for channel in channels:
+        posts = []
+        for post_id, entry in enumerate(channel["data"]):
+            lines = [entry["question"], " / ".join(entry["answers"])]
+            posts.append({
+                "id": post_id,
+                "timestamp": 0,
+                "data": "\n".join(lines + entry["examples"])
+            })
+        data["channels"].append({
+            "name": channel["name"],
+            "channel_id": channel["channel_id"],
+            "tags": {"parser": parser},
+            "posts": posts
+        })
+    return data
+
+
+
+class FakePollChannels():
+    """
+    USAGE:
+        with open("tests/fixtures/poll_channels_data.json") as file:
+            channels = json.load(file)["channels"]
+        fake_poll_channels = FakePollChannels(format_channels(channels))
+        fake_poll_channels.start()
+
+        # POLL_CHANNELS_URL of bot_handler
+        fake_poll_channels.url
+
+    serves GET /data of poll_channels with constant content,
+    requests with the current ETag are answered with 304
+    """
+
+    ETAG = '"fake-1"'
+
+    def __init__(self, data, listen="127.0.0.1", port=0):
+        self.logger = logging.getLogger(__name__)
+
+        self.body = json.dumps(data).encode("utf-8")
+        self.requests = 0
+
+        self.__server = FakeHTTPServer((listen, port),
+                                       self._make_request_handler())
+        self.__thread = None
+
+        host, port = self.__server.server_address[:2]
+        self.url = f"http://{host}:{port}/data"
+
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever,
+                                         name="fake-poll-channels",
+                                         daemon=True)
+        self.__thread.start()
+
+
+    def stop(self, timeout=None):
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+
+    def _make_request_handler(self):
+        fake_poll_channels = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fake_poll_channels.requests += 1
+                if self.path.split("?")[0] != "/data":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                if self.headers.get("If-None-Match") == \
+                        fake_poll_channels.ETAG:
+                    self.send_response(304)
+                    self.send_header("ETag", fake_poll_channels.ETAG)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("ETag", fake_poll_channels.ETAG)
+                self.send_header("Content-Length",
+                                 str(len(fake_poll_channels.body)))
+                self.end_headers()
+                self.wfile.write(fake_poll_channels.body)
+
+            def log_message(self, format, *args):
+                fake_poll_channels.logger.debug(format, *args)
+
+        return RequestHandler
@@ -0,0 +1,295 @@
+import json
+import time
+import logging
+import threading
+from urllib import request, parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    # load tests open hundreds of connections at once,
+    # the default backlog of 5 drops them and clients wait for 1s
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+
+class FakeTelegram():
+    """
+    USAGE:
+        fake_telegram = FakeTelegram()
+        fake_telegram.start()
+
+        bot = Bot(token, base_url=fake_telegram.base_url)
+        ...
+        fake_telegram.get_calls("sendMessage")
+
+        fake_telegram.stop()
+
+    local Bot API server for tests and load tests, it records every
+    called method and answers with minimal valid results,
+    updates put by add_update() are returned by getUpdates
+
+    fail_every > 0 makes every <fail_every>-th sendMessage call fail
+    with 429 Too Many Requests and retry_after like the real Bot API
+
+    getUpdates waits for updates up to its timeout like long polling
+    does, updates below offset are confirmed and forgotten,
+    on_call(method, params) is called after every recorded call,
+    e.g. load tests use it to wait for responses of the bot
+    """
+
+    BOT_USER = {
+        "id": 1,
+        "is_bot": True,
+        "first_name": "fake",
+        "username": "fake_bot"
+    }
+
+    def __init__(self, listen="127.0.0.1", port=0,
+                 response_delay=0, fail_every=0, retry_after=1,
+                 on_call=None):
+        self.logger = logging.getLogger(__name__)
+
+        self.response_delay = response_delay
+        self.fail_every = fail_every
+        self.retry_after = retry_after
+        self.on_call = on_call
+
+        self.__lock = threading.Condition()
+        self.__calls = []
+        self.__updates = []
+        self.__message_id = 0
+        self.__send_counter = 0
+
+        self.__server = FakeHTTPServer((listen, port),
+                                       self._make_request_handler())
+        self.__thread = None
+
+        host, port = self.__server.server_address[:2]
+        # python-telegram-bot appends <token>/<method> to base_url
+        self.base_url = f"http://{host}:{port}/bot"
+
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever,
+                                         name="fake-telegram",
+                                         daemon=True)
+        self.__thread.start()
+
+
+    def stop(self, timeout=None):
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+
+    def add_update(self, update):
+        with self.__lock:
+            self.__updates.append(update)
+            self.__lock.notify_all()
+
+
+    def get_calls(self, method=None):
+        """
+        function returns:
+            list of (method, params) which were called,
+            only calls of <method> if it's specified
+        """
+
+        with self.__lock:
+            return [call for call in self.__calls
+                    if method is None or call[0] == method]
+
+
+    def wait_for_calls(self, method, amount, timeout=5):
+        """
+        function returns:
+            True - at least <amount> calls of <method> were made
+            False - timeout is exceeded
+        """
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if len(self.get_calls(method)) >= amount:
+                return True
+            time.sleep(0.01)
+        return False
+
+
+    def call(self, method, params):
+        """
+        function returns:
+            (HTTP status, JSON response of the Bot API)
+        """
+
+        if self.response_delay:
+            time.sleep(self.response_delay)
+
+        if method == "getUpdates":
+            return (200, {"ok": True, "result": self._get_updates(params)})
+
+        with self.__lock:
+            self.__calls.append((method, params))
+
+            if method == "sendMessage" and self.fail_every:
+                self.__send_counter += 1
+                if self.__send_counter % self.fail_every == 0:
+                    return (429, {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": "Too Many Requests: retry after "
+                                       f"{self.retry_after}",
+                        "parameters": {"retry_after": self.retry_after}
+                    })
+
+            if method == "getMe":
+                result = self.BOT_USER
+            elif method in ["sendMessage", "editMessageText"]:
+                self.__message_id += 1
+                result = {
+                    "message_id": self.__message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": int(params.get("chat_id", 0)),
+                             "type": "private"},
+                    "from": self.BOT_USER,
+                    "text": params.get("text", "")
+                }
+            else:
+                result = True
+
+        if self.on_call is not None:
+            self.on_call(method, params)
+        return (200, {"ok": True, "result": result})
+
+
+    def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        with self.__lock:
+            self.__calls.append(("getUpdates", params))
+
+            # updates below offset are confirmed by the client
+            self.__updates = [update for update in self.__updates
+                              if update["update_id"] >= offset]
+            self.__lock.wait_for(lambda: self.__updates, timeout)
+            return list(self.__updates)
+
+
+    def _make_request_handler(self):
+        fake_telegram = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            # keep connections of Bot API clients alive, headers and
+            # body are separate writes, Nagle would delay them by 40ms
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                if self.headers.get("Content-Type", "").startswith(
+                        "application/json") and body:
+                    params = json.loads(body)
+                else:
+                    # GET requests pass parameters in the query string
+                    params = dict(parse.parse_qsl(parse.urlsplit(
+                                  self.path).query))
+
+                path = parse.urlsplit(self.path).path
+                method = path.rstrip("/").split("/")[-1]
+                status, response = fake_telegram.call(method, params)
+
+                data = json.dumps(response).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):
+                fake_telegram.logger.debug(format, *args)
+
+        return RequestHandler
+
+
+def make_message_update(update_id, user_id, text, language_code="en"):
+    """
+    function returns:
+        dict - Telegram update with a private text message of user_id
+    """
+
+    user = {
+        "id": user_id,
+        "is_bot": False,
+        "first_name": f"user{user_id}",
+        "language_code": language_code
+    }
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": user,
+        "text": text
+    }
+    if text.startswith("/"):
+        command = text.split()[0]
+        message["entities"] = [{"type": "bot_command", "offset": 0,
+                                "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+def make_callback_update(update_id, user_id, data, message_id=1,
+                         language_code="en"):
+    """
+    function returns:
+        dict - Telegram update with a press of an inline button
+               with callback <data> under message_id of the bot
+    """
+
+    user = {
+        "id": user_id,
+        "is_bot": False,
+        "first_name": f"user{user_id}",
+        "language_code": language_code
+    }
+    message = {
+        "message_id": message_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": FakeTelegram.BOT_USER,
+        "text": "select"
+    }
+    callback_query = {
+        "id": str(update_id),
+        "from": user,
+        "message": message,
+        "chat_instance": str(user_id),
+        "data": data
+    }
+    return {"update_id": update_id, "callback_query": callback_query}
+
+
+def post_update(url, update, secret_token=None, timeout=5):
+    """
+    deliver update to a webhook like Telegram does
+
+    function returns:
+        int - HTTP status of the response
+    """
+
+    headers = {"Content-Type": "application/json"}
+    if secret_token is not None:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = secret_token
+
+    req = request.Request(url, data=json.dumps(update).encode("utf-8"),
+                          headers=headers, method="POST")
+    try:
+        with request.urlopen(req, timeout=timeout) as response:
+            return response.status
+    except request.HTTPError as exc:
+        return exc.code
@@ -0,0 +1,390 @@
+"""
+load test of bot_handler without Telegram and poll_channels,
+main.py is started with benchmarks.fake_telegram.FakeTelegram as Bot API
+and benchmarks.fake_poll_channels.FakePollChannels as POLL_CHANNELS_URL,
+simulated users run /start, /learn, select a channel,
+answer questions and run /progress
+
+USAGE:
+    PYTHONPATH=. python3 benchmarks/load_test.py \
+        --users 2000 --concurrency 200 --answers 10 --output load.json
+
+    # synthetic channel instead of the fixture, bot settings by --env
+    PYTHONPATH=. python3 benchmarks/load_test.py --questions 5000 \
+        --env COMBINE_FEEDBACK=true --env BOT_WORKERS=8
+
+memory of the bot and throughput are printed as JSON lines every
+--sample-interval seconds, the summary with p50/p99 latency of
+every action is printed at the end, a step is finished when
+the bot has sent its last message for the step
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import synthetic_data
+from benchmarks.fake_telegram import (
+    FakeTelegram,
+    make_message_update,
+    make_callback_update
+)
+from benchmarks.fake_poll_channels import FakePollChannels, format_channels
+
+
+BOT_HANDLER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the bot is measured, not Telegram limits, --env can restore them
+DEFAULT_BOT_ENV = {
+    "SEND_GLOBAL_RATE": "100000",
+    "SEND_CHAT_RATE": "1000",
+    "SEND_CHAT_BURST": "100"
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[int(round(fraction * (len(values) - 1)))]
+
+
+def get_rss(pid):
+    """
+    function returns:
+        int - resident memory of process in bytes
+        None - /proc is not available
+    """
+
+    try:
+        with open(f"/proc/{pid}/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def get_reply_markup(params):
+    # python-telegram-bot sends reply_markup as a JSON string
+    reply_markup = params.get("reply_markup") or {}
+    if isinstance(reply_markup, str):
+        reply_markup = json.loads(reply_markup)
+    return reply_markup
+
+
+def is_message(method, params):
+    return method == "sendMessage"
+
+
+def is_channel_list(method, params):
+    return method == "sendMessage" and \
+           "inline_keyboard" in get_reply_markup(params)
+
+
+def is_question(method, params):
+    return method == "sendMessage" and \
+           "keyboard" in get_reply_markup(params)
+
+
+
+class LoadTest():
+    """
+    USAGE:
+        load_test = LoadTest(fake_telegram, channel_ids, answers=10)
+        fake_telegram.on_call = load_test.on_call
+        load_test.run_user(user_id)
+        load_test.get_summary(elapsed)
+
+    every user waits for the response to its step before the next one,
+    so latency is measured from the update to the last message of step
+    """
+
+    def __init__(self, fake_telegram, channel_ids, answers=10,
+                 think_time=0, timeout=30, seed=0):
+        self.fake_telegram = fake_telegram
+        self.channel_ids = channel_ids
+        self.answers = answers
+        self.think_time = think_time
+        self.timeout = timeout
+        self.seed = seed
+
+        self.__lock = threading.Lock()
+        self.__update_id = 0
+        # chat_id: [predicate, threading.Event, params of response]
+        self.__waiters = {}
+
+        # action: list of latencies in seconds
+        self.latencies = {}
+        self.completed = 0
+        self.timeouts = 0
+
+
+    def on_call(self, method, params):
+        try:
+            chat_id = int(params.get("chat_id"))
+        except (TypeError, ValueError):
+            return
+        waiter = self.__waiters.get(chat_id)
+        if waiter is not None and waiter[0](method, params):
+            waiter[2] = params
+            waiter[1].set()
+
+
+    def step(self, action, user_id, make_update, predicate):
+        """
+        function returns:
+            dict - params of the bot response which finishes the step
+            None - the bot hasn't responded in time
+        """
+
+        waiter = [predicate, threading.Event(), None]
+        self.__waiters[user_id] = waiter
+        started = time.perf_counter()
+        with self.__lock:
+            # getUpdates offset requires updates in order of update_id
+            self.__update_id += 1
+            self.fake_telegram.add_update(make_update(self.__update_id))
+
+        responded = waiter[1].wait(self.timeout)
+        latency = time.perf_counter() - started
+        self.__waiters.pop(user_id, None)
+
+        with self.__lock:
+            if not responded:
+                self.timeouts += 1
+                return None
+            self.latencies.setdefault(action, []).append(latency)
+            self.completed += 1
+
+        if self.think_time:
+            time.sleep(self.think_time)
+        return waiter[2]
+
+
+    def run_user(self, user_id):
+        rnd = random.Random(f"{self.seed}-{user_id}")
+        steps = [
+            ("start", lambda update_id: make_message_update(
+                update_id, user_id, "/start"), is_message),
+            ("learn", lambda update_id: make_message_update(
+                update_id, user_id, "/learn"), is_channel_list),
+            ("select_channel", lambda update_id: make_callback_update(
+                update_id, user_id,
+                f"0,{rnd.choice(self.channel_ids)}"), is_question)
+        ]
+        for action, make_update, predicate in steps:
+            response = self.step(action, user_id, make_update, predicate)
+            if response is None:
+                return False
+
+        for i in range(self.answers):
+            # the last button is "I don't know"
+            buttons = get_reply_markup(response)["keyboard"][:-1]
+            text = rnd.choice(buttons)[0]["text"] if buttons else "?"
+            response = self.step(
+                "answer", user_id,
+                lambda update_id: make_message_update(update_id,
+                                                      user_id, text),
+                is_question)
+            if response is None:
+                return False
+
+        return self.step(
+            "progress", user_id,
+            lambda update_id: make_message_update(update_id, user_id,
+                                                  "/progress"),
+            is_message) is not None
+
+
+    def get_summary(self, elapsed):
+        with self.__lock:
+            latencies = {action: list(values)
+                         for action, values in self.latencies.items()}
+            completed, timeouts = self.completed, self.timeouts
+
+        all_latencies = [value for values in latencies.values()
+                         for value in values]
+        return {
+            "type": "summary",
+            "elapsed": elapsed,
+            "steps": completed,
+            "timeouts": timeouts,
+            "throughput": completed / elapsed if elapsed else 0,
+            "latency_p50": percentile(all_latencies, 0.5),
+            "latency_p99": percentile(all_latencies, 0.99),
+            "actions": {
+                action: {
+                    "steps": len(values),
+                    "latency_p50": percentile(values, 0.5),
+                    "latency_p99": percentile(values, 0.99)
+                }
+                for action, values in latencies.items()
+            }
+        }
+
+
+def load_channels(args):
+    """
+    function returns:
+        list of parsed channels in the format of
+        tests/fixtures/poll_channels_data.json
+    """
+
+    if args.questions:
+        rnd = random.Random(args.seed)
+        return [{
+            "name": f"Synthetic {i}",
+            "channel_id": f"synthetic{i}",
+            "data": synthetic_data.generate_posts(rnd, args.questions,
+                                                  args.answer_length)
+        } for i in range(args.channels)]
+
+    with open(args.fixture, "r") as file:
+        return json.load(file)["channels"]
+
+
+def start_bot(args, data_dir, fake_telegram, fake_poll_channels):
+    env = {
+        **os.environ,
+        **DEFAULT_BOT_ENV,
+        "PYTHONPATH": BOT_HANDLER_DIR,
+        "BOT_API_KEY": "123456:fake-token",
+        "TELEGRAM_API_URL": fake_telegram.base_url,
+        "POLL_CHANNELS_URL": fake_poll_channels.url,
+        "ANSWERS_FILE": os.path.join(BOT_HANDLER_DIR, "answers.yml"),
+        "QUESTIONS_DB_FILE": os.path.join(data_dir, "questions_db.json"),
+        "USERS_DB_FILE": os.path.join(data_dir, "users_db.json"),
+        "USERS_DB_SQLITE_FILE": os.path.join(data_dir, "users_db.sqlite"),
+        "PROFILES_DIR": os.path.join(data_dir, "profiles")
+    }
+    for item in args.env:
+        key, value = item.split("=", 1)
+        env[key] = value
+
+    return subprocess.Popen([sys.executable, "main.py"],
+                            cwd=BOT_HANDLER_DIR, env=env)
+
+
+def sample_forever(load_test, pid, interval, started, stopped, samples):
+    last_time, last_completed = started, 0
+    while not stopped.wait(interval):
+        now = time.perf_counter()
+        completed = load_test.completed
+        sample = {
+            "type": "sample",
+            "elapsed": now - started,
+            "steps": completed,
+            "timeouts": load_test.timeouts,
+            "throughput": (completed - last_completed) / (now - last_time),
+            "rss_bytes": get_rss(pid)
+        }
+        last_time, last_completed = now, completed
+        samples.append(sample)
+        print(json.dumps(sample), flush=True)
+
+
+def run(args):
+    channels = load_channels(args)
+    fake_poll_channels = FakePollChannels(format_channels(channels))
+    fake_telegram = FakeTelegram()
+    load_test = LoadTest(fake_telegram,
+                         [channel["channel_id"] for channel in channels],
+                         answers=args.answers, think_time=args.think_time,
+                         timeout=args.timeout, seed=args.seed)
+    fake_telegram.on_call = load_test.on_call
+
+    fake_poll_channels.start()
+    fake_telegram.start()
+    data_dir = tempfile.mkdtemp(prefix="load-test-")
+    bot = start_bot(args, data_dir, fake_telegram, fake_poll_channels)
+
+    samples = []
+    stopped = threading.Event()
+    try:
+        if not fake_telegram.wait_for_calls("getUpdates", 1,
+                                            timeout=args.startup_timeout):
+            raise RuntimeError("bot_handler hasn't started polling")
+
+        started = time.perf_counter()
+        sampler = threading.Thread(target=sample_forever,
+                                   args=(load_test, bot.pid,
+                                         args.sample_interval, started,
+                                         stopped, samples),
+                                   daemon=True)
+        sampler.start()
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            finished = list(executor.map(load_test.run_user,
+                                         range(100000,
+                                               100000 + args.users)))
+        elapsed = time.perf_counter() - started
+    finally:
+        stopped.set()
+        bot.terminate()
+        try:
+            bot.wait(30)
+        except subprocess.TimeoutExpired:
+            bot.kill()
+        fake_telegram.stop()
+        fake_poll_channels.stop()
+
+    summary = load_test.get_summary(elapsed)
+    summary["users"] = args.users
+    summary["users_finished"] = sum(finished)
+    summary["rss_bytes_max"] = max(
+        [sample["rss_bytes"] or 0 for sample in samples], default=None)
+    return summary, samples
+
+
+def make_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100,
+                        help="users which are active at the same time")
+    parser.add_argument("--answers", type=int, default=10,
+                        help="answers of every user")
+    parser.add_argument("--think-time", type=float, default=0,
+                        help="pause of a user between steps, in seconds")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="seconds to wait for a response of the bot")
+    parser.add_argument("--fixture",
+                        default=os.path.join(BOT_HANDLER_DIR, "tests",
+                                             "fixtures",
+                                             "poll_channels_data.json"))
+    parser.add_argument("--questions", type=int, default=0,
+                        help="questions per synthetic channel, "
+                             "0 - use --fixture")
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--answer-length", type=int, default=20)
+    parser.add_argument("--env", action="append", default=[],
+                        help="KEY=VALUE variable of bot_handler")
+    parser.add_argument("--sample-interval", type=float, default=1)
+    parser.add_argument("--startup-timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None,
+                        help="file to save summary and samples to")
+    return parser
+
+
+if __name__ == "__main__":
+    args = make_parser().parse_args()
+    summary, samples = run(args)
+    print(json.dumps(summary))
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({
+                "meta": {
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "args": vars(args)
+                },
+                "summary": summary,
+                "samples": samples
+            }, file, indent=2)
@@ -0,0 +1,366 @@
+"""
+runs benchmarks of hot paths on synthetic data, no network is used
+
+USAGE:
+    PYTHONPATH=. python3 benchmarks/run_benchmarks.py \
+        --questions 5000 --users 1000 --channels 2 --answer-length 20
+
+    # save results and compare the next run with them
+    PYTHONPATH=. python3 benchmarks/run_benchmarks.py --output before.json
+    PYTHONPATH=. python3 benchmarks/run_benchmarks.py --compare before.json
+
+every result is printed as one JSON line, --output saves all results
+with parameters of the run as one JSON document
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import timeit
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+from benchmarks import synthetic_data
+from parsers import parsers
+from progress_db import ProgressDatabase
+from progress_snapshot import write_snapshot
+from question_db import QuestionDatabase
+from answer_matching import AnswerMatcher
+from progress_queue_library import (
+    ProgressQueueRandom,
+    ProgressQueuePriorityRandom,
+    ProgressQueuePriorityRandomLimited,
+    ProgressQueueLearnModesAndSubsets,
+    CompactProgressQueueRandom,
+    CompactProgressQueuePriorityRandom,
+    CompactProgressQueuePriorityRandomLimited,
+    CompactProgressQueueLearnModesAndSubsets
+)
+
+
+QUEUE_CLASSES = [
+    ProgressQueueRandom,
+    ProgressQueuePriorityRandom,
+    ProgressQueuePriorityRandomLimited,
+    ProgressQueueLearnModesAndSubsets,
+    CompactProgressQueueRandom,
+    CompactProgressQueuePriorityRandom,
+    CompactProgressQueuePriorityRandomLimited,
+    CompactProgressQueueLearnModesAndSubsets
+]
+PARSER_NAMES = ["parser_default", "parser_english_expressions"]
+# keys which identify a result when runs are compared
+RESULT_KEYS = ["benchmark", "implementation"]
+
+
+def measure(func, repeat):
+    """
+    function returns:
+        float - the best time of <repeat> calls of func in seconds
+    """
+
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def measure_peak_memory(func):
+    """
+    function returns:
+        int - peak of memory allocated by python during func in bytes
+    """
+
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def make_result(benchmark, implementation, operations, seconds, **params):
+    return {
+        "benchmark": benchmark,
+        "implementation": implementation,
+        **params,
+        "operations": operations,
+        "seconds": seconds,
+        "us_per_op": seconds / max(operations, 1) * 1e6
+    }
+
+
+def make_queue(queue_class, progress):
+    queue_obj = queue_class.for_channel("channel0")
+    queue_obj.set_progress(dict(progress))
+    return queue_obj
+
+
+def answer_questions(queue_obj, answers):
+    for i in range(answers):
+        question_id = queue_obj.next_question()
+        queue_obj.change_question_progress(question_id,
+                                           15 if i % 3 else -35)
+
+
+def bench_queue_next_question(rnd, args):
+    progress = synthetic_data.generate_progress(
+        rnd, synthetic_data.generate_question_ids(args.questions))
+
+    results = []
+    for queue_class in QUEUE_CLASSES:
+        queue_obj = make_queue(queue_class, progress)
+        # build lazy structures outside of measurements
+        queue_obj.next_question()
+
+        seconds = measure(lambda: answer_questions(queue_obj, args.answers),
+                          args.repeat)
+        results.append(make_result("queue_next_question",
+                                   queue_class.__name__, args.answers,
+                                   seconds, questions=args.questions))
+    return results
+
+
+def bench_queue_generate_subset(rnd, args):
+    progress = synthetic_data.generate_progress(
+        rnd, synthetic_data.generate_question_ids(args.questions))
+
+    results = []
+    for queue_class in QUEUE_CLASSES:
+        if not hasattr(queue_class, "_generate_subset"):
+            continue
+
+        queue_obj = make_queue(queue_class, progress)
+        queue_obj._generate_subset()
+
+        seconds = measure(
+            lambda: [queue_obj._generate_subset()
+                     for i in range(args.subsets)],
+            args.repeat)
+        results.append(make_result("queue_generate_subset",
+                                   queue_class.__name__, args.subsets,
+                                   seconds, questions=args.questions))
+    return results
+
+
+def bench_progress_db(rnd, args):
+    exported = json.dumps(synthetic_data.generate_users(
+        rnd, args.users, args.channels, args.questions))
+
+    directory = tempfile.mkdtemp(prefix="bench-progress-db-")
+    snapshot_filename = os.path.join(directory, "users.db.json")
+    with open(snapshot_filename, "w") as file:
+        file.write(exported)
+    binary_filename = os.path.join(directory, "users.db.bin")
+    with open(binary_filename, "wb") as file:
+        write_snapshot(json.loads(exported).items(), file)
+
+    def import_from_file(progress_db):
+        with open(snapshot_filename, "r") as file:
+            progress_db.import_from_file(file)
+
+    def export_to_file(progress_db):
+        with open(os.path.join(directory, "export.json"), "w") as file:
+            progress_db.export_to_file(file)
+
+    def import_from_snapshot(progress_db):
+        progress_db.import_from_snapshot(binary_filename)
+        # users are converted on access, all of them are accessed here
+        for user_id in list(progress_db.progress_db):
+            progress_db.get_current_channel_of_user(user_id)
+
+    def export_to_snapshot(progress_db):
+        with open(os.path.join(directory, "export.bin"), "wb") as file:
+            progress_db.export_to_snapshot(file)
+
+    def export_to_json(progress_db):
+        # the string is written to a file like snapshots were written
+        with open(os.path.join(directory, "export.json"), "w") as file:
+            file.write(progress_db.export_to_json())
+
+    operations = [
+        ("progress_db_import_from_json",
+         lambda progress_db: progress_db.import_from_json(exported)),
+        ("progress_db_import_from_file", import_from_file),
+        ("progress_db_import_from_snapshot", import_from_snapshot),
+        ("progress_db_export_to_json", export_to_json),
+        ("progress_db_export_to_file", export_to_file),
+        ("progress_db_export_to_snapshot", export_to_snapshot)
+    ]
+
+    results = []
+    try:
+        for queue_class in [ProgressQueueLearnModesAndSubsets,
+                            CompactProgressQueueLearnModesAndSubsets]:
+            progress_db = ProgressDatabase(queue_class)
+            for benchmark, operation in operations:
+                seconds = measure(lambda: operation(progress_db),
+                                  args.repeat)
+                peak_bytes = measure_peak_memory(
+                             lambda: operation(progress_db))
+                results.append(make_result(
+                    benchmark, queue_class.__name__, args.users, seconds,
+                    users=args.users, channels=args.channels,
+                    questions=args.questions, size=len(exported),
+                    peak_bytes=peak_bytes))
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+def bench_question_db(rnd, args):
+    posts = synthetic_data.generate_posts(rnd, args.questions,
+                                          args.answer_length)
+
+    def update_channel_posts():
+        question_db = QuestionDatabase()
+        question_db.create_channel("channel0")
+        question_db.update_channel_posts("channel0", posts)
+
+    seconds = measure(update_channel_posts, args.repeat)
+    return [make_result("question_db_update_channel_posts",
+                        QuestionDatabase.__name__, args.questions, seconds,
+                        questions=args.questions,
+                        answer_length=args.answer_length)]
+
+
+def bench_parsers(rnd, args):
+    results = []
+    for parser_name in PARSER_NAMES:
+        messages = [synthetic_data.generate_message(rnd, parser_name,
+                                                    args.answer_length)
+                    for i in range(args.questions)]
+        parser = parsers.run(parser_name)
+
+        seconds = measure(lambda: [parser(message) for message in messages],
+                          args.repeat)
+        results.append(make_result("parser", parser_name, args.questions,
+                                   seconds, answer_length=args.answer_length))
+    return results
+
+
+def bench_similarity(rnd, args):
+    answer_matcher = AnswerMatcher()
+    checks = []
+    for i in range(args.checks):
+        answers = [synthetic_data.generate_phrase(rnd, args.answer_length)
+                   for j in range(rnd.randint(1, 3))]
+        # exact answers, answers with typos and wrong answers
+        user_answer = rnd.choice([
+            answers[0],
+            synthetic_data.make_typos(rnd, answers[0], rnd.randint(1, 3)),
+            synthetic_data.generate_phrase(rnd, args.answer_length)
+        ])
+        checks.append((user_answer, answer_matcher.normalize_all(answers)))
+
+    seconds = measure(
+        lambda: [answer_matcher.is_correct(user_answer, normalized_answers)
+                 for user_answer, normalized_answers in checks],
+        args.repeat)
+    return [make_result("similarity_check", AnswerMatcher.__name__,
+                        args.checks, seconds,
+                        answer_length=args.answer_length)]
+
+
+BENCHMARKS = {
+    "queue_next_question": bench_queue_next_question,
+    "queue_generate_subset": bench_queue_generate_subset,
+    "progress_db": bench_progress_db,
+    "question_db": bench_question_db,
+    "parsers": bench_parsers,
+    "similarity": bench_similarity
+}
+
+
+def run(args):
+    """
+    function returns:
+        list of results (dict) of benchmarks selected by args.only
+    """
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    results = []
+    for name in names:
+        # every benchmark gets the same data regardless of selection
+        rnd = random.Random(f"{args.seed}-{name}")
+        random.seed(args.seed)
+        results.extend(BENCHMARKS[name](rnd, args))
+    return results
+
+
+def compare(results, baseline):
+    """
+    function returns:
+        list of (result, baseline seconds / seconds) for results
+        which are presented in baseline, ratio > 1 means faster
+    """
+
+    baseline_seconds = {
+        tuple(result[key] for key in RESULT_KEYS): result["seconds"]
+        for result in baseline["results"]
+    }
+
+    comparison = []
+    for result in results:
+        seconds = baseline_seconds.get(
+                  tuple(result[key] for key in RESULT_KEYS))
+        if seconds is not None and result["seconds"] > 0:
+            comparison.append((result, seconds / result["seconds"]))
+    return comparison
+
+
+def make_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=5000,
+                        help="questions per channel")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--answer-length", type=int, default=20)
+    parser.add_argument("--answers", type=int, default=1000,
+                        help="next_question calls per measurement")
+    parser.add_argument("--subsets", type=int, default=100,
+                        help="_generate_subset calls per measurement")
+    parser.add_argument("--checks", type=int, default=1000,
+                        help="similarity checks per measurement")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", default="",
+                        help=f"comma separated list of {list(BENCHMARKS)}")
+    parser.add_argument("--output", default=None,
+                        help="file to save results to")
+    parser.add_argument("--compare", default=None,
+                        help="file with results of a previous run")
+    return parser
+
+
+if __name__ == "__main__":
+    args = make_parser().parse_args()
+    unknown = set(filter(None, args.only.split(","))) - set(BENCHMARKS)
+    if unknown:
+        print(f"unknown benchmarks {sorted(unknown)}, "
+              f"choose from {list(BENCHMARKS)}")
+        sys.exit(1)
+
+    results = run(args)
+    for result in results:
+        print(json.dumps(result))
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({
+                "meta": {
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "args": vars(args)
+                },
+                "results": results
+            }, file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, "r") as file:
+            baseline = json.load(file)
+        for result, ratio in compare(results, baseline):
+            print(f"{result['benchmark']:34} {result['implementation']:42} "
+                  f"x{ratio:.2f}")
@@ -0,0 +1,129 @@
+"""
+generators of synthetic channels, posts, answers and users for benchmarks,
+every generator takes random.Random obj, so data is the same for one seed
+"""
+import string
+
+from question_db import QuestionDatabase
+
+
+ALPHABETS = {
+    "latin": string.ascii_lowercase,
+    "cyrillic": "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+}
+
+
+def generate_word(rnd, alphabet="latin", min_length=2, max_length=10):
+    letters = ALPHABETS[alphabet]
+    return "".join(rnd.choice(letters)
+                   for i in range(rnd.randint(min_length, max_length)))
+
+
+def generate_phrase(rnd, length, alphabet="latin"):
+    """
+    function returns:
+        str - words separated by spaces, len() is close to <length>
+    """
+
+    words = []
+    size = 0
+    while size < length:
+        word = generate_word(rnd, alphabet)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:max(length, 1)].strip()
+
+
+def make_typos(rnd, text, amount):
+    """
+    function returns:
+        str - text with <amount> random insertions, deletions
+              and substitutions of letters
+    """
+
+    letters = list(text)
+    for i in range(amount):
+        position = rnd.randrange(len(letters) + 1)
+        operation = rnd.choice(["insert", "delete", "replace"])
+        if operation == "insert" or position >= len(letters):
+            letters.insert(position, rnd.choice(string.ascii_lowercase))
+        elif operation == "delete":
+            del letters[position]
+        else:
+            letters[position] = rnd.choice(string.ascii_lowercase)
+    return "".join(letters)
+
+
+def generate_message(rnd, parser, answer_length=20, examples=1):
+    """
+    function returns:
+        str - raw text of a channel post in the format of <parser>
+    """
+
+    question = generate_phrase(rnd, answer_length)
+    answers = [generate_phrase(rnd, answer_length, "cyrillic")
+               for i in range(rnd.randint(1, 3))]
+    example_lines = [generate_phrase(rnd, 4 * answer_length)
+                     for i in range(examples)]
+
+    if parser == "parser_english_expressions":
+        return "\n".join([f"📌 {question}", answers[0], "Example:"] +
+                         example_lines)
+    return "\n".join([question, " / ".join(answers)] + example_lines)
+
+
+def generate_posts(rnd, amount, answer_length=20):
+    """
+    function returns:
+        list of posts formatted as parsers do (question, answers, examples)
+        with post_id and question_id like update_question_db() makes
+    """
+
+    posts = []
+    for post_id in range(amount):
+        question = f"{generate_phrase(rnd, answer_length)} {post_id}"
+        posts.append({
+            "question": question,
+            "answers": [generate_phrase(rnd, answer_length, "cyrillic")
+                        for i in range(rnd.randint(1, 3))],
+            "examples": [generate_phrase(rnd, 4 * answer_length)],
+            "post_id": post_id,
+            "question_id": QuestionDatabase.generate_question_id(question)
+        })
+    return posts
+
+
+def generate_question_ids(amount):
+    return [QuestionDatabase.generate_question_id(f"question {i}")
+            for i in range(amount)]
+
+
+def generate_progress(rnd, question_ids):
+    """
+    function returns:
+        dict - question_id: progress value, a quarter of questions
+               are not answered yet, others are spread over 0-1000
+    """
+
+    return {
+        question_id: 0 if rnd.random() < 0.25 else rnd.randint(0, 1000)
+        for question_id in question_ids
+    }
+
+
+def generate_users(rnd, users, channels, questions):
+    """
+    function returns:
+        dict in the format of ProgressDatabase.export_to_json()
+    """
+
+    channel_ids = [f"channel{i}" for i in range(channels)]
+    question_ids = generate_question_ids(questions)
+
+    exported = {}
+    for user_id in range(users):
+        user_data = {"current_channel_id": rnd.choice(channel_ids)}
+        for channel_id in channel_ids:
+            user_data[channel_id] = generate_progress(rnd, question_ids)
+        exported[str(user_id)] = user_data
+    return exported
@@ -0,0 +1,203 @@
+import queue
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+
+class KeyedExecutor():
+    """
+    USAGE:
+        executor = KeyedExecutor(workers=8)
+        executor.start()
+
+        # tasks of the same key run one by one in order of submission,
+        # tasks of different keys run in parallel
+        future = executor.submit(user_id, handler, update, context)
+
+        executor.stop()     # waits for submitted tasks
+
+    every key has its own FIFO queue, a key is handed to at most one
+    worker at a time, after running one task the key is put back
+    to the end of the ready queue, so a busy key doesn't block others
+    """
+
+    def __init__(self, workers=4, name="keyed-executor"):
+        self.logger = logging.getLogger(__name__)
+
+        self.workers = workers
+        self.name = name
+
+        self.__lock = threading.Lock()
+        self.__drained = threading.Condition(self.__lock)
+        # key: deque of (future, func, args, kwargs)
+        self.__pending = {}
+        self.__ready_keys = queue.Queue()
+        self.__threads = []
+
+
+    def start(self):
+        """
+        function returns:
+            True - workers are started
+            False - workers are already running
+        """
+
+        if self.__threads:
+            return False
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run,
+                                      name=f"{self.name}-{i}",
+                                      daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+        return True
+
+
+    def stop(self, timeout=None):
+        """
+        run tasks submitted before stop() and stop workers
+        """
+
+        with self.__drained:
+            self.__drained.wait_for(lambda: not self.__pending, timeout)
+        for thread in self.__threads:
+            self.__ready_keys.put(None)
+        for thread in self.__threads:
+            thread.join(timeout)
+        self.__threads = []
+
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        function returns:
+            concurrent.futures.Future obj with result of func
+        """
+
+        future = Future()
+        with self.__lock:
+            tasks = self.__pending.get(key)
+            if tasks is None:
+                # key is idle, it's not owned by any worker
+                self.__pending[key] = deque([(future, func, args, kwargs)])
+                self.__ready_keys.put(key)
+            else:
+                tasks.append((future, func, args, kwargs))
+        return future
+
+
+    def get_queue_depth(self):
+        """
+        function returns:
+            int - amount of tasks which are waiting or running
+        """
+
+        with self.__lock:
+            return sum(len(tasks) for tasks in self.__pending.values())
+
+
+    def _run(self):
+        while True:
+            key = self.__ready_keys.get()
+            if key is None:
+                return
+
+            with self.__lock:
+                future, func, args, kwargs = self.__pending[key][0]
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args, **kwargs))
+                except Exception as exc:
+                    self.logger.exception("Task of key=%s failed due to %s",
+                                          key, exc)
+                    future.set_exception(exc)
+
+            with self.__lock:
+                tasks = self.__pending[key]
+                tasks.popleft()
+                if tasks:
+                    self.__ready_keys.put(key)
+                else:
+                    self.__pending.pop(key)
+                    if not self.__pending:
+                        self.__drained.notify_all()
+
+
+
+class ReadWriteLock():
+    """
+    USAGE:
+        lock = ReadWriteLock()
+
+        with lock.shared():
+            # any amount of threads, e.g. handlers of different users
+            ...
+
+        with lock.exclusive():
+            # one thread and no shared holders, e.g. a snapshot
+            ...
+
+    waiting exclusive holders block new shared holders,
+    so snapshots are not starved by a steady flow of updates,
+    exclusive() is reentrant for the thread which holds it,
+    shared() is not reentrant and cannot be upgraded to exclusive()
+    """
+
+    def __init__(self):
+        self.__condition = threading.Condition(threading.Lock())
+        self.__shared_holders = 0
+        self.__exclusive_waiters = 0
+        self.__exclusive_owner = None
+        self.__exclusive_depth = 0
+
+
+    @contextmanager
+    def shared(self):
+        current_thread = threading.get_ident()
+        with self.__condition:
+            if self.__exclusive_owner == current_thread:
+                # exclusive holder already excludes everybody
+                self.__exclusive_depth += 1
+            else:
+                while self.__exclusive_owner is not None or \
+                      self.__exclusive_waiters:
+                    self.__condition.wait()
+                self.__shared_holders += 1
+        try:
+            yield
+        finally:
+            with self.__condition:
+                if self.__exclusive_owner == current_thread:
+                    self.__exclusive_depth -= 1
+                else:
+                    self.__shared_holders -= 1
+                    if self.__shared_holders == 0:
+                        self.__condition.notify_all()
+
+
+    @contextmanager
+    def exclusive(self):
+        current_thread = threading.get_ident()
+        with self.__condition:
+            if self.__exclusive_owner == current_thread:
+                self.__exclusive_depth += 1
+            else:
+                self.__exclusive_waiters += 1
+                while self.__exclusive_owner is not None or \
+                      self.__shared_holders:
+                    self.__condition.wait()
+                self.__exclusive_waiters -= 1
+                self.__exclusive_owner = current_thread
+                self.__exclusive_depth = 1
+        try:
+            yield
+        finally:
+            with self.__condition:
+                self.__exclusive_depth -= 1
+                if self.__exclusive_depth == 0:
+                    self.__exclusive_owner = None
+                    self.__condition.notify_all()
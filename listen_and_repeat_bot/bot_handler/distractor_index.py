@@ -0,0 +1,150 @@
+import random
+import logging
+from collections import Counter
+
+
+
+class DistractorIndex():
+    """
+    USAGE:
+        distractor_index = DistractorIndex(question_db, hard_distractors=5)
+        options = distractor_index.pick(channel_id, question_id, k=3)
+
+    index is built once per question_db version and keeps
+    a flat pool of unique answers per channel, so options for
+    a keyboard are picked without materializing question lists
+
+    picked options are unique and never equal (case-insensitive)
+    to any correct answer of the question
+
+    hard_distractors > 0 additionally keeps for every question
+    up to <hard_distractors> answers which look like the correct one:
+    similar length and many common character n-grams
+    """
+
+    NGRAM_SIZE = 3
+    # rejection sampling attempts before falling back to a full scan
+    MAX_ATTEMPTS = 16
+
+    def __init__(self, question_db, hard_distractors=0):
+        self.logger = logging.getLogger(__name__)
+
+        self.hard_distractors = hard_distractors
+        # channel_id: list of unique answers (str)
+        self.answer_pools = {}
+        # channel_id: {question_id: set of normalized correct answers}
+        self.correct_answers = {}
+        # channel_id: {question_id: list of similar answers (str)}
+        self.similar_answers = {}
+
+        for channel_id in question_db.list_all_channels():
+            self._build_channel(question_db, channel_id)
+
+
+    @staticmethod
+    def _normalize(answer):
+        return answer.strip().lower()
+
+
+    def _build_channel(self, question_db, channel_id):
+        pool = {}
+        correct_answers = {}
+
+        for question_id in question_db.get_question_ids(channel_id):
+            answers = question_db.get_question_by_id(
+                      channel_id, question_id)["answers"]
+            correct_answers[question_id] = {
+                self._normalize(answer) for answer in answers
+            }
+            for answer in answers:
+                pool.setdefault(self._normalize(answer), answer)
+
+        self.answer_pools[channel_id] = list(pool.values())
+        self.correct_answers[channel_id] = correct_answers
+
+        if self.hard_distractors > 0:
+            self.similar_answers[channel_id] = self._find_similar_answers(
+                question_db, channel_id, self.answer_pools[channel_id])
+
+
+    def _ngrams(self, answer):
+        padded = f" {self._normalize(answer)} "
+        return {padded[i:i + self.NGRAM_SIZE]
+                for i in range(max(len(padded) - self.NGRAM_SIZE + 1, 1))}
+
+
+    def _find_similar_answers(self, question_db, channel_id, pool):
+        # inverted index: ngram -> positions of answers in pool
+        pool_ngrams = [self._ngrams(answer) for answer in pool]
+        postings = {}
+        for position, ngrams in enumerate(pool_ngrams):
+            for ngram in ngrams:
+                postings.setdefault(ngram, []).append(position)
+
+        similar_answers = {}
+        for question_id, correct in self.correct_answers[channel_id].items():
+            answer = question_db.get_question_by_id(
+                     channel_id, question_id)["answers"][0]
+            ngrams = self._ngrams(answer)
+
+            common = Counter()
+            for ngram in ngrams:
+                common.update(postings.get(ngram, []))
+
+            scored = []
+            for position, common_amount in common.items():
+                candidate = pool[position]
+                if self._normalize(candidate) in correct:
+                    continue
+                jaccard = common_amount / (len(ngrams) +
+                          len(pool_ngrams[position]) - common_amount)
+                length_ratio = min(len(answer), len(candidate)) / \
+                               max(len(answer), len(candidate), 1)
+                scored.append((jaccard + 0.5 * length_ratio, candidate))
+
+            scored.sort(reverse=True)
+            similar_answers[question_id] = [
+                candidate for _, candidate in scored[:self.hard_distractors]
+            ]
+        return similar_answers
+
+
+    def pick(self, channel_id, question_id, k=3, hard=False):
+        """
+        function returns:
+            list of up to k unique answers (str) which are not correct
+            for question_id, less than k only if the channel
+            doesn't have enough different answers
+        """
+
+        pool = self.answer_pools.get(channel_id, [])
+        correct = self.correct_answers.get(channel_id, {}).get(
+                                                    question_id, set())
+        picked = []
+        picked_normalized = set(correct)
+
+        def try_add(answer):
+            normalized = self._normalize(answer)
+            if normalized not in picked_normalized:
+                picked.append(answer)
+                picked_normalized.add(normalized)
+
+        if hard:
+            similar = self.similar_answers.get(channel_id, {}).get(
+                                                      question_id, [])
+            for answer in random.sample(similar, min(k, len(similar))):
+                try_add(answer)
+
+        # expected O(k) attempts, pool is much larger than k
+        for _ in range(self.MAX_ATTEMPTS):
+            if len(picked) >= k or not pool:
+                return picked
+            try_add(random.choice(pool))
+
+        # tiny pools with many rejections
+        candidates = [answer for answer in pool
+                      if self._normalize(answer) not in picked_normalized]
+        for answer in random.sample(candidates,
+                                    min(k - len(picked), len(candidates))):
+            try_add(answer)
+        return picked
@@ -0,0 +1,100 @@
+import json
+
+
+def iterate_json_object(file, chunk_size=65536):
+    """
+    USAGE:
+        with open("users.db.json", "r") as file:
+            for key, value in iterate_json_object(file):
+                ...
+
+    function yields:
+        (key, value) - items of the top level JSON object of file,
+                       only one value is kept in memory at a time
+    raises:
+        ValueError - file is not a JSON object
+    """
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, position, eof
+        # double the read size while a value doesn't fit the buffer,
+        # so a large value is decoded a few times, not per chunk
+        data = file.read(max(chunk_size, len(buffer) - position))
+        eof = not data
+        buffer = buffer[position:] + data
+        position = 0
+        return not eof
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or not read_more():
+                return buffer[position:position + 1]
+
+    def decode():
+        nonlocal position
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+                continue
+            if end == len(buffer) and not eof and \
+                    isinstance(value, (int, float)):
+                # a number can continue in the next chunk
+                if read_more():
+                    continue
+            position = end
+            return value
+
+    if skip_whitespace() != "{":
+        raise ValueError("JSON object is expected")
+    position += 1
+
+    if skip_whitespace() == "}":
+        return
+    while True:
+        key = decode()
+        if not isinstance(key, str) or skip_whitespace() != ":":
+            raise ValueError(f"Malformed JSON object at key {key!r}")
+        position += 1
+        skip_whitespace()
+        yield (key, decode())
+
+        delimiter = skip_whitespace()
+        position += 1
+        if delimiter == "}":
+            return
+        if delimiter != ",":
+            raise ValueError(f"Malformed JSON object after key {key!r}")
+        skip_whitespace()
+
+
+def write_json_object(items, file):
+    """
+    write (key, value) pairs as one JSON object to a text file obj,
+    the output is the same as json.dumps(dict(items))
+
+    function returns:
+        int - amount of written items
+    """
+
+    written = 0
+    file.write("{")
+    for key, value in items:
+        if written:
+            file.write(", ")
+        file.write(json.dumps(key))
+        file.write(": ")
+        file.write(json.dumps(value))
+        written += 1
+    file.write("}")
+    return written
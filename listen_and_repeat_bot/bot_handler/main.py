@@ -3,23 +3,21 @@ import sys
 import time
 import json
 import random
-import getpass
+import signal
 import logging
+import threading
 
-import yaml
-from urllib import request, error
-from difflib import SequenceMatcher
+from urllib import request, error, parse
 
-from jinja2 import Environment, BaseLoader
 from telegram.ext import (
     Updater,
     CommandHandler,
     MessageHandler,
-    CallbackContext,
     CallbackQueryHandler,
     Filters
 )
 from telegram import (
+    Update,
     ParseMode,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -28,15 +26,33 @@ from telegram import (
 )
 
 from progress_db import ProgressDatabase
+from progress_db_sqlite import SQLiteProgressDatabase
+from progress_journal import ProgressJournal
+from progress_snapshot import is_snapshot
 from question_db import QuestionDatabase
+from question_db_refresher import QuestionDatabaseRefresher
+from snapshot_writer import SnapshotWriter
+from distractor_index import DistractorIndex
+from answer_matching import AnswerMatcher
+from answer_templates import AnswerTemplates
+from concurrency import KeyedExecutor
+from webhook_server import WebhookServer
+from send_queue import SendQueue
+from sharding import shard_filename
+from profiling import ProfilingSession, SlowHandlerLog
+from metrics import (
+    MetricsRegistry,
+    MetricsServer,
+    Counter,
+    Gauge,
+    Histogram
+)
 from progress_queue_library import (
-    ProgressQueue, 
-    ProgressQueueRandom,
-    ProgressQueuePriorityRandom,
     ProgressQueuePriorityRandomLimited,
-    ProgressQueueLearnModesAndSubsets
+    ProgressQueueLearnModesAndSubsets,
+    CompactProgressQueueLearnModesAndSubsets
 )
-from parsers import parsers
+from parsers import parsers, ParseCache
 from event_handlers import callback_handler
 
 
@@ -44,7 +60,88 @@ QUESTIONS_DB_FILE = os.environ.get("QUESTIONS_DB_FILE",
                                    "./data/questions.db.json")
 USERS_DB_FILE = os.environ.get("USERS_DB_FILE",
                                "./data/users.db.json")
+# json - users.db.json with the journal, sqlite - users.db.sqlite3
+USERS_DB_BACKEND = os.environ.get("USERS_DB_BACKEND", "json")
+USERS_DB_SQLITE_FILE = os.environ.get("USERS_DB_SQLITE_FILE",
+                                      "./data/users.db.sqlite3")
+# format of USERS_DB_FILE of json backend: json or binary (memory mapped,
+# users are loaded on the first access), both formats are restored,
+# see progress_snapshot.py to convert files
+USERS_DB_FORMAT = os.environ.get("USERS_DB_FORMAT", "json")
+USERS_DB_JOURNAL_FILE = os.environ.get("USERS_DB_JOURNAL_FILE",
+                                       f"{USERS_DB_FILE}.journal")
+USERS_DB_JOURNAL_BATCH_INTERVAL = float(os.environ.get(
+                                  "USERS_DB_JOURNAL_BATCH_INTERVAL", 1))
+USERS_DB_COMPACT_INTERVAL = int(os.environ.get(
+                            "USERS_DB_COMPACT_INTERVAL", 3600))
+# users are split between SHARD_COUNT processes by sharding.ShardRouter,
+# every shard keeps its own users files, every shard refreshes questions
+# from poll_channels by itself, so it saves them to its own file as well
+# instead of racing other shards on one file
+SHARD_INDEX = int(os.environ.get("SHARD_INDEX", 0))
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", 1))
+QUESTIONS_DB_FILE = shard_filename(QUESTIONS_DB_FILE,
+                                   SHARD_INDEX, SHARD_COUNT)
+USERS_DB_FILE = shard_filename(USERS_DB_FILE, SHARD_INDEX, SHARD_COUNT)
+USERS_DB_SQLITE_FILE = shard_filename(USERS_DB_SQLITE_FILE,
+                                      SHARD_INDEX, SHARD_COUNT)
+USERS_DB_JOURNAL_FILE = shard_filename(USERS_DB_JOURNAL_FILE,
+                                       SHARD_INDEX, SHARD_COUNT)
+QUESTIONS_DB_REFRESH_INTERVAL = int(os.environ.get(
+                                "QUESTIONS_DB_REFRESH_INTERVAL", 60))
+# keep progress values in arrays indexed by shared question ID tables
+COMPACT_PROGRESS_QUEUES = os.environ.get(
+                          "COMPACT_PROGRESS_QUEUES", "true") == "true"
+# changes made within SNAPSHOT_DELAY seconds are saved at once
+SNAPSHOT_DELAY = float(os.environ.get("SNAPSHOT_DELAY", 5))
+# amount of similar answers to keep per question for answer keyboards,
+# 0 - options are picked randomly
+HARD_DISTRACTORS = int(os.environ.get("HARD_DISTRACTORS", 0))
+PARSE_CACHE_SIZE = int(os.environ.get("PARSE_CACHE_SIZE", 20000))
 SIMILARITY_REQUIRED = 0.8
+ANSWERS_FILE = os.environ.get("ANSWERS_FILE", None)
+# answers are sent in DEFAULT_LANG_CODE if user's language is not supported
+DEFAULT_LANG_CODE = os.environ.get("DEFAULT_LANG_CODE", "en")
+# how often ANSWERS_FILE is checked for changes, in seconds
+ANSWERS_RELOAD_INTERVAL = int(os.environ.get("ANSWERS_RELOAD_INTERVAL", 10))
+# updates of different users are handled by BOT_WORKERS threads in parallel
+BOT_WORKERS = int(os.environ.get("BOT_WORKERS", 4))
+# polling - updates are requested by getUpdates,
+# webhook - Telegram sends updates to WEBHOOK_URL,
+# shard - updates are sent by sharding.ShardRouter to WEBHOOK_PATH
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+# Bot API server, load tests point it to benchmarks.fake_telegram.FakeTelegram
+TELEGRAM_API_URL = os.environ.get("TELEGRAM_API_URL",
+                                  "https://api.telegram.org/bot")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", None)
+WEBHOOK_SECRET_TOKEN = os.environ.get("WEBHOOK_SECRET_TOKEN", None)
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/webhook")
+# outgoing requests are sent by SEND_WORKERS threads within Telegram limits:
+# SEND_GLOBAL_RATE messages per second in total and
+# SEND_CHAT_RATE messages per second (bursts of SEND_CHAT_BURST) per chat
+SEND_WORKERS = int(os.environ.get("SEND_WORKERS", 8))
+SEND_GLOBAL_RATE = float(os.environ.get("SEND_GLOBAL_RATE", 30))
+SEND_CHAT_RATE = float(os.environ.get("SEND_CHAT_RATE", 1))
+SEND_CHAT_BURST = int(os.environ.get("SEND_CHAT_BURST", 3))
+# send answer feedback and the next question in one message
+COMBINE_FEEDBACK = os.environ.get("COMBINE_FEEDBACK", "false") == "true"
+# /metrics in Prometheus format is served on METRICS_LISTEN:METRICS_PORT,
+# 0 - metrics endpoint is disabled
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+# users who have sent an update within this amount of seconds are active
+ACTIVE_USERS_WINDOW = int(os.environ.get("ACTIVE_USERS_WINDOW", 3600))
+# handlers slower than SLOW_HANDLER_THRESHOLD seconds are logged by phases
+SLOW_HANDLER_THRESHOLD = float(os.environ.get("SLOW_HANDLER_THRESHOLD", 1))
+# users who can run /profile <seconds>, pstats are saved to PROFILES_DIR
+ADMIN_USER_IDS = [
+    int(user_id) for user_id in
+    os.environ.get("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+]
+PROFILES_DIR = os.environ.get("PROFILES_DIR", "./data/profiles")
+MAX_PROFILE_DURATION = 600
 
 
 logging.basicConfig(
@@ -54,197 +151,543 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-progress_db = ProgressDatabase(
-                queue_class=ProgressQueueLearnModesAndSubsets)
-question_db = QuestionDatabase()
-bonus_db = {}
+# user_id: monotonic time of the last update
+users_last_seen = {}
 
-db_list = [
-    (question_db, QUESTIONS_DB_FILE),
-    (progress_db, USERS_DB_FILE)]
 
+def count_active_users():
+    deadline = time.monotonic() - ACTIVE_USERS_WINDOW
+    active = 0
+    for user_id, last_seen in list(users_last_seen.items()):
+        if last_seen >= deadline:
+            active += 1
+        elif users_last_seen.get(user_id) == last_seen:
+            users_last_seen.pop(user_id, None)
+    return active
 
 
-def parse_answers_file(filename):
-    try:
-        with open(filename, "r") as file:
-            return yaml.safe_load(file)
-    except (yaml.YAMLError, OSError) as exc:
-        if isinstance(exc, OSError):
-            print("Cannot read configuration file, "
-                  "check path and permissions")
-        if isinstance(exc, yaml.YAMLError):
-            print("Config file has incorrect format, "
-                  "cannot parse config options")
-        return None
+def count_channel_questions():
+    question_db = question_db_refresher.get_question_db()
+    return [((channel_id,), len(question_db.get_question_ids(channel_id)))
+            for channel_id in question_db.list_all_channels()]
 
 
+def get_saved_bytes():
+    if progress_journal is None:
+        saved = [("users", os.path.getsize(USERS_DB_SQLITE_FILE))]
+    else:
+        saved = [("users", snapshot_writer.get_bytes_written("users") or 0)]
+    saved.append(("questions",
+                  snapshot_writer.get_bytes_written("questions") or 0))
+    return [((name,), value) for name, value in saved]
+
+
+metrics_registry = MetricsRegistry()
+handler_seconds = metrics_registry.register(Histogram(
+    "bot_handler_seconds",
+    "Time spent in update handlers by command or callback id",
+    ["handler"]))
+question_db_update_seconds = metrics_registry.register(Histogram(
+    "bot_question_db_update_seconds",
+    "Duration of update_question_db"))
+question_db_updates = metrics_registry.register(Counter(
+    "bot_question_db_updates_total",
+    "Outcomes of update_question_db: updated, not_modified, failed",
+    ["outcome"]))
+save_data_seconds = metrics_registry.register(Histogram(
+    "bot_save_data_seconds",
+    "Duration of save_data"))
+metrics_registry.register(Gauge(
+    "bot_saved_bytes",
+    "Size of the last saved database",
+    ["database"],
+    callback=get_saved_bytes))
+similarity_check_seconds = metrics_registry.register(Histogram(
+    "bot_similarity_check_seconds",
+    "Time spent in matching a user answer with correct answers",
+    buckets=[0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+             0.001, 0.0025, 0.005, 0.01]))
+metrics_registry.register(Gauge(
+    "bot_active_users",
+    "Users who have sent an update within ACTIVE_USERS_WINDOW",
+    callback=count_active_users))
+metrics_registry.register(Gauge(
+    "bot_channel_questions",
+    "Questions per channel in the current question database",
+    ["channel"],
+    callback=count_channel_questions))
+metrics_registry.register(Counter(
+    "bot_subset_regenerations_total",
+    "Question subsets generated by progress queues",
+    callback=lambda: ProgressQueuePriorityRandomLimited.subsets_generated))
+metrics_registry.register(Counter(
+    "bot_slow_handlers_total",
+    "Handlers which took more than SLOW_HANDLER_THRESHOLD seconds",
+    callback=lambda: slow_handler_log.slow_handlers))
+metrics_registry.register(Gauge(
+    "bot_update_queue_depth",
+    "Updates which are waiting or being handled",
+    callback=lambda: update_executor.get_queue_depth()))
+metrics_registry.register(Gauge(
+    "bot_send_queue_depth",
+    "Bot API requests which are waiting or being sent",
+    callback=lambda: send_queue.get_queue_depth()))
+
+
+queue_class = ProgressQueueLearnModesAndSubsets
+if COMPACT_PROGRESS_QUEUES:
+    queue_class = CompactProgressQueueLearnModesAndSubsets
+
+progress_journal = None
+if USERS_DB_BACKEND == "sqlite":
+    progress_db = SQLiteProgressDatabase(
+                    queue_class=queue_class,
+                    filename=USERS_DB_SQLITE_FILE,
+                    active_seconds=ACTIVE_USERS_WINDOW)
+else:
+    progress_journal = ProgressJournal(
+                         USERS_DB_JOURNAL_FILE,
+                         batch_interval=USERS_DB_JOURNAL_BATCH_INTERVAL,
+                         compact_interval=USERS_DB_COMPACT_INTERVAL)
+    progress_db = ProgressDatabase(
+                    queue_class=queue_class,
+                    journal=progress_journal)
+bonus_db = {}
+answer_matcher = AnswerMatcher(similarity_required=SIMILARITY_REQUIRED)
+# templates are loaded by reload() on startup
+answer_templates = AnswerTemplates(ANSWERS_FILE,
+                                   default_lang=DEFAULT_LANG_CODE,
+                                   check_interval=ANSWERS_RELOAD_INTERVAL)
+parse_cache = ParseCache(
+                parsers,
+                max_size=PARSE_CACHE_SIZE,
+                prepare=lambda entry: {
+                    **entry,
+                    "question_id": QuestionDatabase.generate_question_id(
+                                   entry["question"]),
+                    "normalized_answers": answer_matcher.normalize_all(
+                                          entry["answers"])
+                })
+# validators of the last /data response applied to question_db
+poll_channels_validators = {}
+
+
+
+@save_data_seconds.time()
 def save_data():
-    for obj, filename in db_list:
-        with open(filename, "w") as file:
-            file.write(obj.export_to_json())
-            logger.info("saved %s bytes to %s",
-                        sys.getsizeof(obj), filename)
-
+    """
+    question_db is saved by snapshot_writer once it's published,
+    progress_db is saved depending on its backend
+    """
+
+    if progress_journal is None:
+        progress_db.flush()
+    # progress_db mutations are kept in the journal between compactions
+    elif progress_journal.is_compaction_due():
+        progress_journal.compact(
+            lambda: snapshot_writer.write_now("users"))
+
+
+def restore_file(obj, filename):
+    if hasattr(obj, "import_from_snapshot") and is_snapshot(filename):
+        obj.import_from_snapshot(filename)
+        logger.info("restored %s bytes from %s",
+                    os.path.getsize(filename), filename)
+        return
 
-def restore_data():
-    for obj, filename in db_list:
-        try:
-            with open(filename, "r") as file:
+    try:
+        with open(filename, "r") as file:
+            # users are read one by one, questions as one document
+            if hasattr(obj, "import_from_file"):
+                obj.import_from_file(file)
+            else:
                 obj.import_from_json(file.read())
-                logger.info("restored %s bytes from %s",
-                            sys.getsizeof(obj), filename)
-
-        except FileNotFoundError as exc:
-            logger.warning("Cannot find filename=%s to restore data",
-                           filename)
+            logger.info("restored %s bytes from %s",
+                        file.tell(), filename)
 
+    except FileNotFoundError as exc:
+        logger.warning("Cannot find filename=%s to restore data",
+                       filename)
 
-def random_answer(channel_id):
-    random_question = random.choice(question_db.get_question_ids(channel_id))
-    question_obj = question_db.get_question_by_id(channel_id, random_question)
-    return random.choice(question_obj["answers"])
 
+def restore_data():
+    # published snapshots are never modified, so questions are restored
+    # before the publish and indexes are built from restored questions
+    question_db = QuestionDatabase()
+    restore_file(question_db, QUESTIONS_DB_FILE)
+    question_db_refresher.publish(question_db)
+
+    # SQLite backend keeps its data in USERS_DB_SQLITE_FILE
+    if progress_journal is not None:
+        restore_file(progress_db, USERS_DB_FILE)
+        progress_journal.replay(progress_db)
+
+
+def parse_posts(parser_name, posts):
+    """
+    function returns a tuple:
+        (formatted_posts, broken_post_ids) - parsed posts with "post_id"
+                                             key and ids of posts which
+                                             cannot be parsed
+    """
+
+    formatted_data = []
+    broken_post_ids = []
+    for entry in posts:
+        formatted_entry = parse_cache.run(parser_name, entry["data"])
+        if formatted_entry is None:
+            broken_post_ids.append(entry.get("id"))
+            continue
+        formatted_entry["post_id"] = entry.get("id")
+        formatted_data.append(formatted_entry)
+    return (formatted_data, broken_post_ids)
+
+
+@question_db_update_seconds.time()
+def update_question_db(current_question_db):
+    """
+    runs in the background thread of question_db_refresher
+
+    function returns:
+        QuestionDatabase obj - a new version of current_question_db
+        None - poll_channels is unavailable or content is not modified
+    """
+
+    headers = {}
+    if "ETag" in poll_channels_validators:
+        headers["If-None-Match"] = poll_channels_validators["ETag"]
+    if "Last-Modified" in poll_channels_validators:
+        headers["If-Modified-Since"] = \
+            poll_channels_validators["Last-Modified"]
+
+    url = poll_channel_url
+    if "cursor" in poll_channels_validators:
+        url += "&" if "?" in url else "?"
+        url += parse.urlencode({"since": poll_channels_validators["cursor"]})
 
-def update_question_db():
     try:
-        contents = request.urlopen(poll_channel_url).read()
+        response = request.urlopen(request.Request(url, headers=headers))
+        contents = response.read()
         data = json.loads(contents)
+    except error.HTTPError as exc:
+        if exc.code == 304:
+            question_db_updates.labels("not_modified").inc()
+            logger.debug("%s is not modified, skip update",
+                         poll_channel_url)
+        else:
+            question_db_updates.labels("failed").inc()
+            logger.warning("Cannot fetch %s due to %s",
+                           poll_channel_url, exc)
+        return None
     except (ConnectionError, error.URLError) as exc:
-        return (False, 0)
+        question_db_updates.labels("failed").inc()
+        logger.warning("Cannot fetch %s due to %s", poll_channel_url, exc)
+        return None
+
+    # handlers keep reading current_question_db while it's being updated,
+    # channels are copied only when they are changed
+    question_db = current_question_db.copy()
+    is_full = data.get("full", True)
+    changed = is_full
 
     for channel in data["channels"]:
         channel_id = channel["channel_id"]
-        question_db.create_channel(channel_id)
+        if question_db.create_channel(channel_id):
+            changed = True
+        if question_db.get_channel_metadata(channel_id, "channel_name") != \
+                channel["name"]:
+            changed = True
 
         question_db.set_channel_metadata(channel_id, 
                                         "channel_name", 
                                         channel["name"])
 
-        formatted_data = []
-        for entry in channel["posts"]:
-            formatted_entry = parsers.run(channel["tags"]["parser"])(entry["data"])
-            if formatted_entry is not None:
-                formatted_data.append(formatted_entry)
-        
-        question_db.update_channel_posts(
-            channel_id,
-            formatted_data)
-    save_data()
-    return (True, len(data["channels"]))
+        parser_name = channel["tags"]["parser"]
+        if is_full:
+            formatted_data, _ = parse_posts(parser_name, channel["posts"])
+            question_db.update_channel_posts(
+                channel_id,
+                formatted_data)
+        elif channel["added"] or channel["edited"] or channel["deleted"]:
+            changed = True
+            formatted_data, broken_post_ids = parse_posts(
+                parser_name, channel["added"] + channel["edited"])
+            question_db.apply_channel_delta(
+                channel_id,
+                formatted_data,
+                channel["deleted"] + broken_post_ids)
+
+    logger.debug("parse_cache: hits=%s misses=%s size=%s",
+                 parse_cache.hits, parse_cache.misses, parse_cache.len())
+
+    for key in ["ETag", "Last-Modified"]:
+        if response.headers.get(key) is not None:
+            poll_channels_validators[key] = response.headers[key]
+    if data.get("cursor") is not None:
+        poll_channels_validators["cursor"] = data["cursor"]
+
+    if not changed:
+        # an empty delta doesn't rebuild indexes and rewrite the snapshot
+        question_db_updates.labels("not_modified").inc()
+        return None
+    question_db_updates.labels("updated").inc()
+    return question_db
+
+
+question_db_refresher = QuestionDatabaseRefresher(
+                          update_question_db,
+                          interval=QUESTIONS_DB_REFRESH_INTERVAL,
+                          after_refresh=save_data,
+                          on_publish=lambda question_db, version: \
+                              snapshot_writer.mark_dirty("questions"))
+
+question_db_refresher.register_index(
+    "distractors",
+    lambda question_db: DistractorIndex(question_db,
+                                        hard_distractors=HARD_DISTRACTORS))
+
+snapshot_writer = SnapshotWriter(delay=SNAPSHOT_DELAY)
+snapshot_writer.register("questions",
+                         question_db_refresher.get_question_db,
+                         QUESTIONS_DB_FILE)
+if progress_journal is not None:
+    snapshot_writer.register("users", lambda: progress_db, USERS_DB_FILE,
+                             binary=USERS_DB_FORMAT == "binary")
+
 
+update_executor = KeyedExecutor(workers=BOT_WORKERS, name="bot-worker")
+send_queue = SendQueue(workers=SEND_WORKERS,
+                       global_rate=SEND_GLOBAL_RATE,
+                       chat_rate=SEND_CHAT_RATE,
+                       chat_burst=SEND_CHAT_BURST)
 
-def get_similarity(user_answer, correct_answer):
-    return SequenceMatcher(None, user_answer, correct_answer).ratio()
+
+profiling_session = ProfilingSession(PROFILES_DIR)
+slow_handler_log = SlowHandlerLog(threshold=SLOW_HANDLER_THRESHOLD)
+phase = slow_handler_log.phase
+
+
+def send(update, method, *args, **kwargs):
+    """
+    queue a Bot API call (e.g. update.message.reply_text) to send_queue,
+    calls for one chat are made in order, the handler doesn't wait
+    """
+
+    with phase("send"):
+        return send_queue.send(update.effective_chat.id,
+                               method, *args, **kwargs)
+
+
+def handle_in_order(handler):
+    """
+    function returns:
+        handler which is queued to update_executor, so updates of
+        one user are handled one by one in order of arrival
+        and updates of different users are handled in parallel
+    """
+
+    def _handle_in_order(update, context):
+        user = update.effective_user
+        key = user.id if user is not None else None
+        update_executor.submit(key, _handle_shared, handler, update, context)
+
+    return _handle_in_order
+
+
+def _handle_shared(handler, update, context):
+    if update.effective_user is not None:
+        users_last_seen[update.effective_user.id] = time.monotonic()
+
+    if update.callback_query is not None:
+        handler_name = "callback_" + update.callback_query.data.split(",")[0]
+    else:
+        handler_name = handler.__name__
+
+    # handlers change only their own user, snapshots wait for them
+    with handler_seconds.labels(handler_name).time(), \
+         slow_handler_log.track(handler_name), \
+         progress_db.lock.shared():
+        return profiling_session.run(handler, update, context)
+
+
+def run_webhook(updater, set_webhook=True):
+    """
+    receive updates by WebhookServer until SIGINT or SIGTERM,
+    updates are put to the dispatcher queue in order of arrival
+
+    args:
+        set_webhook - register WEBHOOK_URL in Telegram,
+                      shards get updates from the router instead
+    """
+
+    dispatcher = updater.dispatcher
+    webhook_server = WebhookServer(
+        on_update=lambda data: dispatcher.update_queue.put(
+                               Update.de_json(data, updater.bot)),
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, url_path=WEBHOOK_PATH)
+
+    dispatcher_thread = threading.Thread(target=dispatcher.start,
+                                         name="dispatcher", daemon=True)
+    dispatcher_thread.start()
+    webhook_server.start()
+    if set_webhook:
+        updater.bot.set_webhook(url=WEBHOOK_URL,
+                                secret_token=WEBHOOK_SECRET_TOKEN)
+
+    stopped = threading.Event()
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        signal.signal(signum, lambda signum, frame: stopped.set())
+    stopped.wait()
+
+    webhook_server.stop()
+    dispatcher.stop()
+    dispatcher_thread.join()
 
 
 def help_handler(update, context):
     user_id = str(update.message.from_user.id)
     lang_code = str(update.message.from_user.language_code)
-    update.message.reply_text(answers["help"][lang_code],
-                              parse_mode=ParseMode.HTML)
+    send(update, update.message.reply_text,
+         answer_templates.get("help", lang_code), parse_mode=ParseMode.HTML)
 
 def start(update, context):
     user_id = str(update.message.from_user.id)
     lang_code = str(update.message.from_user.language_code)
-    answer = answers["hello"][lang_code]
+    answer = answer_templates.get("hello", lang_code)
 
     if progress_db.create_user(user_id):
-        update.message.reply_text(answer, 
-                                  parse_mode=ParseMode.HTML)
+        send(update, update.message.reply_text,
+             answer, parse_mode=ParseMode.HTML)
         logger.info(f"new user has been created, user_id={user_id}")
     else:
         send_phrase_to_learn(update, context)
 
 
-def send_phrase_to_learn(update, context, from_callback=False):
-    # temporary solution
-    update_question_db()
+def send_phrase_to_learn(update, context, from_callback=False,
+                         feedback=None):
+    """
+    args:
+        feedback (str) - HTML text to put before the next question,
+                         optional, it saves one message per answer,
+                         it's sent alone if there is no next question
+    """
+
+    with phase("refresh"):
+        question_db, indexes = question_db_refresher.get_snapshot()
 
     if from_callback:
         user_id = str(update.callback_query.from_user.id)
         lang_code = str(update.callback_query.from_user.language_code)
+        reply_text = update.callback_query.message.reply_text
     else:
         user_id = str(update.message.from_user.id)
         lang_code = str(update.message.from_user.language_code)
+        reply_text = update.message.reply_text
+
+    def without_question(result):
+        # the answer of the user is not left without feedback
+        if feedback is not None:
+            send(update, reply_text, feedback, parse_mode=ParseMode.HTML)
+        return result
+
+    with phase("db"):
+        exit_code, channel_id = progress_db.get_current_channel_of_user(
+                                user_id)
+        if exit_code != 0:
+            return without_question(answer_templates.get("error", lang_code))
+        if channel_id is None:
+            return without_question(answer_templates.get("hello", lang_code))
+
+        exit_code, queue_obj = progress_db.get_channel_progress(
+                               user_id, channel_id)
 
-    exit_code, channel_id = progress_db.get_current_channel_of_user(user_id)
-    if exit_code != 0:
-        return answers["error"][lang_code]
-    if channel_id is None:
-        return answers["hello"][lang_code]
+        if exit_code != 0:
+            return without_question(answer_templates.get("error", lang_code))
 
-    exit_code, queue_obj = progress_db.get_channel_progress(
-                           user_id, channel_id)
+        queue_obj.update_questions(
+            question_db.get_question_ids(channel_id)
+        )
 
-    if exit_code != 0:
-        return answers["error"][lang_code]
+        question_id = queue_obj.next_question()
+        while question_id is not None and \
+              not question_db.has_question(channel_id, question_id):
+            # question was deleted from the channel
+            queue_obj.remove_questions([question_id])
+            question_id = queue_obj.next_question()
 
-    queue_obj.update_questions(
-        question_db.get_question_ids(channel_id)
-    )
+    if question_id is None:
+        # every question of the channel was deleted
+        without_question(None)
+        send(update, reply_text,
+             answer_templates.get("no_questions", lang_code))
+        return
 
-    question_id = queue_obj.next_question()
     question_obj = question_db.get_question_by_id(channel_id, question_id)
-    reply_with = f"🤔 ... <b>{question_obj['question']}</b>?"
 
-    buttons = []
-    buttons.append([KeyboardButton(text=random.choice(question_obj["answers"]))])
-    for item in [ random_answer(channel_id) for i in range(3) ]:
-        buttons.append([KeyboardButton(text=item)])
+    with phase("render"):
+        reply_with = f"🤔 ... <b>{question_obj['question']}</b>?"
+        if feedback is not None:
+            reply_with = f"{feedback.strip()}\n\n{reply_with}"
 
-    random.shuffle(buttons)
-    buttons.append([KeyboardButton(text=answers["no_user_answer"][lang_code])])
+        buttons = []
+        buttons.append([KeyboardButton(
+            text=random.choice(question_obj["answers"]))])
+        for item in indexes["distractors"].pick(channel_id, question_id, k=3,
+                                                hard=HARD_DISTRACTORS > 0):
+            buttons.append([KeyboardButton(text=item)])
 
-    keyboard = ReplyKeyboardMarkup(buttons)
+        random.shuffle(buttons)
+        buttons.append([KeyboardButton(
+            text=answer_templates.get("no_user_answer", lang_code))])
 
-    if from_callback:
-        update.callback_query.message.reply_text(
-            reply_with, 
-            parse_mode=ParseMode.HTML,
-            reply_markup=keyboard)
-    else:
-        update.message.reply_text(reply_with, parse_mode=ParseMode.HTML,
-                                  reply_markup=keyboard)
+        keyboard = ReplyKeyboardMarkup(buttons)
+
+    send(update, reply_text,
+         reply_with, parse_mode=ParseMode.HTML, reply_markup=keyboard)
 
 
 
 def check_translation(update, context):
     user_id = str(update.message.from_user.id)
     lang_code = str(update.message.from_user.language_code)
-    user_answer = update.message.text.lower()
-
-    exit_code, channel_id = progress_db.get_current_channel_of_user(user_id)
-    if exit_code != 0:
-        return answers["error"][lang_code]
-    if channel_id is None:
-        return answers["hello"][lang_code]
-
-    exit_code, queue_obj = progress_db.get_channel_progress(
-                           user_id, channel_id)
-    question_id = queue_obj.current_question()
+    user_answer = update.message.text
+    with phase("refresh"):
+        question_db = question_db_refresher.get_question_db()
+
+    with phase("db"):
+        exit_code, channel_id = progress_db.get_current_channel_of_user(
+                                user_id)
+        if exit_code != 0:
+            return answer_templates.get("error", lang_code)
+        if channel_id is None:
+            return answer_templates.get("hello", lang_code)
+
+        exit_code, queue_obj = progress_db.get_channel_progress(
+                               user_id, channel_id)
+        question_id = queue_obj.current_question()
+    if not question_db.has_question(channel_id, question_id):
+        # question was deleted from the channel while user was answering
+        send_phrase_to_learn(update, context)
+        return
 
     question = question_db.get_question_by_id(channel_id, question_id)
     correct_answers = question["answers"]
-
-
-    answers_similarity = [ 
-        (get_similarity(user_answer, answer), idx)
-        for (idx, answer) in enumerate(correct_answers)
-    ]
-    max_similar_value, max_similar_idx = max(answers_similarity)
-    is_user_answer_correct = max_similar_value > SIMILARITY_REQUIRED
-
-    answer_template = Environment(loader=BaseLoader()).from_string(
-                                answers["user_answer_feedback"][lang_code])
-    answer_render = answer_template.render({
-        "is_answer_correct": is_user_answer_correct,
-        "answers": correct_answers[:3],
-        "example": random.choice(question["examples"]) \
-                            if len(question["examples"]) else "",
-        "tags": ["think-of-an-example"]
-
-    })
+    # questions saved before normalization was added don't have the key
+    normalized_answers = question.get("normalized_answers") or \
+                         answer_matcher.normalize_all(correct_answers)
+    with phase("similarity"), similarity_check_seconds.time():
+        is_user_answer_correct = answer_matcher.is_correct(
+                                 user_answer, normalized_answers)
+
+    with phase("render"):
+        answer_render = answer_templates.render(
+            "user_answer_feedback", lang_code,
+            is_answer_correct=is_user_answer_correct,
+            answers=correct_answers[:3],
+            example=random.choice(question["examples"]) \
+                    if len(question["examples"]) else "",
+            tags=["think-of-an-example"])
 
     if user_id not in bonus_db:
         bonus_db[user_id] = {}
@@ -254,22 +697,30 @@ def check_translation(update, context):
 
     if is_user_answer_correct:
         # answer is correct
-        queue_obj.change_question_progress(question_id, 15 + bonus_db[user_id][question_id])
+        with phase("db"):
+            progress_db.change_question_progress(
+                user_id, channel_id, question_id,
+                15 + bonus_db[user_id][question_id])
         logger.debug("Change question=%s/%s/%s progress by value=%s", 
                      user_id, channel_id, question_id, 15 + bonus_db[user_id][question_id])
         
         bonus_db[user_id][question_id] += max(3, bonus_db[user_id][question_id] // 3)
-        update.message.reply_text(answer_render, parse_mode=ParseMode.HTML)
     else:
         # answer is incorrect
-        queue_obj.change_question_progress(question_id, -35)
+        with phase("db"):
+            progress_db.change_question_progress(
+                user_id, channel_id, question_id, -35)
         logger.debug("Change question=%s/%s/%s progress by value=%s", 
                      user_id, channel_id, question_id, -35)
         
         bonus_db[user_id][question_id] = 0
-        update.message.reply_text(answer_render, parse_mode=ParseMode.HTML)
 
-    send_phrase_to_learn(update, context)
+    if COMBINE_FEEDBACK:
+        send_phrase_to_learn(update, context, feedback=answer_render)
+    else:
+        send(update, update.message.reply_text,
+             answer_render, parse_mode=ParseMode.HTML)
+        send_phrase_to_learn(update, context)
 
 
 
@@ -279,24 +730,26 @@ def reset_learning_progress(update, context):
 
     exit_code, channel_id = progress_db.get_current_channel_of_user(user_id)
     if exit_code != 0:
-        return answers["error"][lang_code]
+        return answer_templates.get("error", lang_code)
     if channel_id is None:
-        return answers["hello"][lang_code]
+        return answer_templates.get("hello", lang_code)
 
     progress_db.delete_channel_progress(user_id, channel_id)
     progress_db.create_channel_progress(user_id, channel_id)
 
-    update.message.reply_text(
-        answers["reset_progress_info"][lang_code].format(channel_id))
+    send(update, update.message.reply_text,
+         answer_templates.get("reset_progress_info", lang_code).format(
+         channel_id))
 
 
 
 def set_channel_to_learn(update, context):
-    # temporary solution
-    update_question_db()
+    # show the current snapshot, new channels appear after the refresh
+    question_db_refresher.trigger()
+    question_db = question_db_refresher.get_question_db()
 
     lang_code = str(update.message.from_user.language_code)
-    answer = answers["select_channel"][lang_code]
+    answer = answer_templates.get("select_channel", lang_code)
 
 
     buttons = [
@@ -306,7 +759,7 @@ def set_channel_to_learn(update, context):
         for channel_id in question_db.list_all_channels()
     ]
     keyboard = InlineKeyboardMarkup(buttons)
-    update.message.reply_text(answer, reply_markup=keyboard)
+    send(update, update.message.reply_text, answer, reply_markup=keyboard)
 
 
 @callback_handler.callback_routing.register(0)
@@ -314,14 +767,14 @@ def select_channel_to_learn(update, context, channel_id):
     user_id = str(update.callback_query.from_user.id)
     lang_code = str(update.callback_query.from_user.language_code)
 
-    answer = answers["channel_selected"][lang_code]
+    answer = answer_templates.get("channel_selected", lang_code)
     
     progress_db.create_channel_progress(user_id, channel_id)
     if progress_db.set_current_channel_of_user(user_id, channel_id):
-        update.callback_query.edit_message_text(text=answer)
+        send(update, update.callback_query.edit_message_text, text=answer)
     else:
-        update.callback_query.edit_message_text(
-                              text=answers["error"][lang_code])
+        send(update, update.callback_query.edit_message_text,
+             text=answer_templates.get("error", lang_code))
     send_phrase_to_learn(update, context, from_callback=True)
 
 
@@ -329,13 +782,12 @@ def select_channel_to_learn(update, context, channel_id):
 def ignore_question(update, context, question_id):
     user_id = str(update.callback_query.from_user.id)
     lang_code = str(update.callback_query.from_user.language_code)
-    answer = answers["ignore_question_success"][lang_code]
+    answer = answer_templates.get("ignore_question_success", lang_code)
     
     exit_code, channel_id = progress_db.get_current_channel_of_user(user_id)
-    exit_code, queue_obj = progress_db.get_channel_progress(
-                               user_id, channel_id)
-    queue_obj.change_question_progress(question_id, 200)
-    update.callback_query.delete_message()
+    progress_db.change_question_progress(
+        user_id, channel_id, question_id, 200)
+    send(update, update.callback_query.delete_message)
     send_phrase_to_learn(update, context, from_callback=True)
 
 
@@ -345,14 +797,17 @@ def show_learning_progress(update, context):
 
     exit_code, channel_id = progress_db.get_current_channel_of_user(user_id)
     if exit_code != 0:
-        update.message.reply_text(answers["error"][lang_code],
-                  parse_mode=ParseMode.HTML)
+        send(update, update.message.reply_text,
+             answer_templates.get("error", lang_code),
+             parse_mode=ParseMode.HTML)
     if channel_id is None:
-        update.message.reply_text(answers["hello"][lang_code],
-                          parse_mode=ParseMode.HTML)
+        send(update, update.message.reply_text,
+             answer_templates.get("hello", lang_code),
+             parse_mode=ParseMode.HTML)
 
     exit_code, queue_obj = progress_db.get_channel_progress(
                            user_id, channel_id)
+    question_db = question_db_refresher.get_question_db()
 
     good_amount = medium_amount = low_amount = ignored_amount = 0
     for value in queue_obj.get_progress().values():
@@ -362,26 +817,51 @@ def show_learning_progress(update, context):
             medium_amount += 1
         if 60 <= value:
             good_amount += 1
-    progress_answer = answers["show_progress"][lang_code].format(
+    progress_answer = answer_templates.get("show_progress", lang_code).format(
             question_db.get_channel_metadata(channel_id, "channel_name"),
             good_amount, medium_amount,
             low_amount, ignored_amount)
-    update.message.reply_text(progress_answer,
-                              parse_mode=ParseMode.HTML)
+    send(update, update.message.reply_text,
+         progress_answer, parse_mode=ParseMode.HTML)
+
+
+def start_profiling(update, context):
+    """
+    /profile <seconds> - profile handlers of all users for <seconds>
+    """
+
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        return
+
+    try:
+        duration = min(float(context.args[0]), MAX_PROFILE_DURATION)
+    except (IndexError, ValueError):
+        duration = 30
+
+    def on_finish(filename, summary):
+        send(update, update.message.reply_text,
+             f"{filename}\n{summary[:3000]}")
+
+    if profiling_session.start(duration, on_finish=on_finish):
+        send(update, update.message.reply_text,
+             f"profiling for {duration} seconds")
+    else:
+        send(update, update.message.reply_text,
+             "profiling session is already running")
 
 
 def show_version_info(update, context):
     git_version = os.environ.get("GIT_VERSION", "unknown-version")
-    update.message.reply_text(git_version, parse_mode=ParseMode.HTML)     
+    send(update, update.message.reply_text,
+         git_version, parse_mode=ParseMode.HTML)
 
 
 if __name__ == "__main__":
 
     api_key = os.environ.get("BOT_API_KEY", None)
     poll_channel_url = os.environ.get("POLL_CHANNELS_URL", None)
-    answers_file = os.environ.get("ANSWERS_FILE", None)
 
-    if answers_file is None:
+    if ANSWERS_FILE is None:
         print("specify ANSWERS_FILE variable")
         sys.exit(1)
 
@@ -393,25 +873,85 @@ if __name__ == "__main__":
         print("specify POLL_CHANNELS_URL variable")
         sys.exit(1)
 
-    answers = parse_answers_file(answers_file)["answers"]
+    if BOT_MODE not in ["polling", "webhook", "shard"]:
+        print("BOT_MODE should be either polling, webhook or shard")
+        sys.exit(1)
+
+    if BOT_MODE == "webhook" and \
+            (WEBHOOK_URL is None or WEBHOOK_SECRET_TOKEN is None):
+        print("specify WEBHOOK_URL and WEBHOOK_SECRET_TOKEN variables")
+        sys.exit(1)
 
-    restore_data()
-    update_question_db()
+    if BOT_MODE == "shard" and WEBHOOK_SECRET_TOKEN is None:
+        print("specify WEBHOOK_SECRET_TOKEN variable")
+        sys.exit(1)
 
-    updater = Updater(api_key)
+    if not 0 <= SHARD_INDEX < SHARD_COUNT:
+        print("SHARD_INDEX should be in range from 0 to SHARD_COUNT - 1")
+        sys.exit(1)
+
+    if not answer_templates.reload():
+        print("Cannot load ANSWERS_FILE, check path, "
+              "permissions and format of the file")
+        sys.exit(1)
+
+    restore_data()
+    snapshot_writer.start()
+    if progress_journal is not None:
+        progress_journal.start()
+    question_db_refresher.refresh()
+    question_db_refresher.start()
+
+    if METRICS_PORT:
+        metrics_server = MetricsServer(metrics_registry,
+                                       listen=METRICS_LISTEN,
+                                       port=METRICS_PORT)
+        metrics_server.start()
+
+    update_executor.start()
+    send_queue.start()
+    # senders, workers (answerCallbackQuery) and getUpdates
+    # keep their own connections to the Bot API
+    updater = Updater(api_key, base_url=TELEGRAM_API_URL,
+                      request_kwargs={
+                          "con_pool_size": SEND_WORKERS + BOT_WORKERS + 4
+                      })
 
     dispatcher = updater.dispatcher
     dispatcher.add_handler(
-        CallbackQueryHandler(callback_handler.callback_routing.handle)
+        CallbackQueryHandler(
+            handle_in_order(callback_handler.callback_routing.handle))
     )
     
-    dispatcher.add_handler(CommandHandler("start", start))
-    dispatcher.add_handler(CommandHandler("help", help_handler))
-    dispatcher.add_handler(CommandHandler("progress", show_learning_progress))
-    dispatcher.add_handler(CommandHandler("learn", set_channel_to_learn))
-    dispatcher.add_handler(CommandHandler("reset", reset_learning_progress))
-    dispatcher.add_handler(CommandHandler("version", show_version_info))
+    dispatcher.add_handler(CommandHandler(
+        "start", handle_in_order(start)))
+    dispatcher.add_handler(CommandHandler(
+        "help", handle_in_order(help_handler)))
+    dispatcher.add_handler(CommandHandler(
+        "progress", handle_in_order(show_learning_progress)))
+    dispatcher.add_handler(CommandHandler(
+        "learn", handle_in_order(set_channel_to_learn)))
+    dispatcher.add_handler(CommandHandler(
+        "reset", handle_in_order(reset_learning_progress)))
+    dispatcher.add_handler(CommandHandler(
+        "version", handle_in_order(show_version_info)))
+    dispatcher.add_handler(CommandHandler(
+        "profile", handle_in_order(start_profiling)))
     dispatcher.add_handler(MessageHandler(Filters.text & ~Filters.command,
-                                          check_translation))
-    updater.start_polling()
-    updater.idle()
+                                          handle_in_order(check_translation)))
+    if BOT_MODE == "webhook":
+        run_webhook(updater)
+    elif BOT_MODE == "shard":
+        run_webhook(updater, set_webhook=False)
+    else:
+        updater.start_polling()
+        updater.idle()
+
+    update_executor.stop()
+    send_queue.stop()
+    question_db_refresher.stop()
+    snapshot_writer.stop()
+    if progress_journal is not None:
+        progress_journal.stop()
+    else:
+        progress_db.close()
@@ -0,0 +1,349 @@
+import time
+import bisect
+import logging
+import functools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [
+        (name, str(value).replace("\\", "\\\\")
+                         .replace("\"", "\\\"")
+                         .replace("\n", "\\n"))
+        for name, value in pairs
+    ]
+    return "{" + ",".join(f'{name}="{value}"'
+                          for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+
+class Metric():
+    """
+    base class of metrics, a metric with labels keeps
+    a child per tuple of label values, children are created
+    on the first use and are never removed
+
+    callback (optional) - function which returns the value of
+    a metric without labels or a list of (label values, value)
+    at the moment of collection, e.g. the size of a database
+    """
+
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+        self._lock = threading.Lock()
+        self._children = {}
+
+
+    def labels(self, *labelvalues):
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues,
+                                                  self._new_child())
+        return child
+
+
+    def _new_child(self):
+        raise NotImplementedError
+
+
+    def collect(self):
+        """
+        function returns:
+            list of lines in Prometheus text format
+        """
+
+        lines = [f"# HELP {self.name} {self.documentation}",
+                 f"# TYPE {self.name} {self.TYPE}"]
+        if self.callback is not None:
+            values = self.callback()
+            if not isinstance(values, list):
+                values = [((), values)]
+            for labelvalues, value in values:
+                lines.append(
+                    f"{self.name}"
+                    f"{_format_labels(self.labelnames, labelvalues)} "
+                    f"{_format_value(value)}")
+            return lines
+
+        for labelvalues, child in list(self._children.items()):
+            lines.extend(child.collect(self.name, self.labelnames,
+                                       labelvalues))
+        return lines
+
+
+
+class _Value():
+    __slots__ = ("lock", "value")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+    def set(self, value):
+        self.value = value
+
+
+    def collect(self, name, labelnames, labelvalues):
+        return [f"{name}{_format_labels(labelnames, labelvalues)} "
+                f"{_format_value(self.value)}"]
+
+
+
+class Counter(Metric):
+    """
+    USAGE:
+        requests = Counter("bot_requests_total", "Requests", ["outcome"])
+        requests.labels("updated").inc()
+    """
+
+    TYPE = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+
+class Gauge(Counter):
+    """
+    USAGE:
+        users = Gauge("bot_users", "Users", callback=lambda: len(users))
+    """
+
+    TYPE = "gauge"
+
+    def set(self, value):
+        self.labels().set(value)
+
+
+
+class _HistogramValue():
+    __slots__ = ("lock", "buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+    def time(self):
+        return _Timer(self)
+
+
+    def collect(self, name, labelnames, labelvalues):
+        with self.lock:
+            counts = list(self.counts)
+            total_sum = self.sum
+
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + [float("inf")], counts):
+            cumulative += count
+            labels = _format_labels(labelnames, labelvalues,
+                                    [("le", _format_value(bound))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, labelvalues)
+        lines.append(f"{name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+
+class _Timer():
+    """
+    context manager and decorator, a decorated function gets
+    a new timer for every call, so overlapping and nested calls
+    don't share the start time
+    """
+
+    def __init__(self, histogram_value):
+        self.histogram_value = histogram_value
+        self.started = None
+
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with _Timer(self.histogram_value):
+                return func(*args, **kwargs)
+        return timed
+
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.histogram_value.observe(time.perf_counter() - self.started)
+        return False
+
+
+
+class Histogram(Metric):
+    """
+    USAGE:
+        latency = Histogram("bot_handler_seconds", "Latency", ["handler"])
+        with latency.labels("start").time():
+            ...
+        latency.labels("start").observe(0.1)
+    """
+
+    TYPE = "histogram"
+    DEFAULT_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                       0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+    def __init__(self, name, documentation, labelnames=(), buckets=None):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = sorted(buckets or self.DEFAULT_BUCKETS)
+
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+    def time(self):
+        return self.labels().time()
+
+
+
+class MetricsRegistry():
+    """
+    USAGE:
+        registry = MetricsRegistry()
+        latency = registry.register(Histogram(...))
+        text = registry.render()
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+        self.__metrics = []
+
+
+    def register(self, metric):
+        self.__metrics.append(metric)
+        return metric
+
+
+    def render(self):
+        """
+        function returns:
+            str - all metrics in Prometheus text format 0.0.4
+        """
+
+        lines = []
+        for metric in self.__metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as exc:
+                # one broken callback should not hide other metrics
+                self.logger.exception("Cannot collect %s due to %s",
+                                      metric.name, exc)
+        return "\n".join(lines) + "\n"
+
+
+
+class MetricsServer():
+    """
+    USAGE:
+        metrics_server = MetricsServer(registry, port=9100)
+        metrics_server.start()
+
+    serves GET /metrics in Prometheus text format
+    """
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry, listen="127.0.0.1", port=9100):
+        self.logger = logging.getLogger(__name__)
+
+        self.registry = registry
+        self.__server = ThreadingHTTPServer((listen, port),
+                                            self._make_request_handler())
+        self.__server.daemon_threads = True
+        self.__thread = None
+
+
+    def get_address(self):
+        return self.__server.server_address[:2]
+
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__server.serve_forever,
+                                         name="metrics-server",
+                                         daemon=True)
+        self.__thread.start()
+
+
+    def stop(self, timeout=None):
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+
+    def _make_request_handler(self):
+        metrics_server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                data = metrics_server.registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type",
+                                 metrics_server.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                metrics_server.logger.debug(format, *args)
+
+        return RequestHandler
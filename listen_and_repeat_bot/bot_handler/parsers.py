@@ -1,5 +1,8 @@
 import os
+import hashlib
 import logging
+from collections import OrderedDict
+
 import emoji
 
 
@@ -26,6 +29,54 @@ class Parsers:
 parsers = Parsers()
 
 
+class ParseCache:
+    """
+    USAGE:
+        parse_cache = ParseCache(parsers, max_size=10000)
+        entry = parse_cache.run("parser_default", message_data)
+
+    memoizes parser results by (parser name, hash of raw post),
+    least recently used entries are evicted after max_size
+
+    prepare(entry) is called once for every successfully parsed
+    entry before it's cached, so its result is memoized as well
+
+    entries are returned as shallow copies, so callers can add keys
+    """
+
+    def __init__(self, parsers, max_size=10000, prepare=None):
+        self.parsers = parsers
+        self.max_size = max_size
+        self.prepare = prepare
+
+        self.hits = 0
+        self.misses = 0
+        self.__cache = OrderedDict()
+
+    def run(self, parser, message_data):
+        key = (parser,
+               hashlib.sha1(message_data.encode("utf-8")).digest())
+
+        if key in self.__cache:
+            self.hits += 1
+            self.__cache.move_to_end(key)
+            entry = self.__cache[key]
+        else:
+            self.misses += 1
+            entry = self.parsers.run(parser)(message_data)
+            if entry is not None and self.prepare is not None:
+                entry = self.prepare(entry)
+
+            self.__cache[key] = entry
+            if len(self.__cache) > self.max_size:
+                self.__cache.popitem(last=False)
+
+        return None if entry is None else {**entry}
+
+    def len(self):
+        return len(self.__cache)
+
+
 
 @parsers.register
 def parser_default(message_data):
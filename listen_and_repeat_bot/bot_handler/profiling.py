@@ -0,0 +1,200 @@
+import io
+import os
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from contextlib import contextmanager
+
+
+
+class ProfilingSession():
+    """
+    USAGE:
+        profiling_session = ProfilingSession("./data/profiles")
+
+        # in worker threads
+        profiling_session.run(handler, update, context)
+
+        # e.g. from an admin command, returns immediately
+        profiling_session.start(60, on_finish=lambda filename, summary: ...)
+
+    while a session is active, every call made by run() is profiled
+    by cProfile of its thread, after <duration> seconds profiles
+    of all threads are merged and dumped as pstats to
+    <directory>/profile-<time>.pstats, calls made outside of
+    a session cost one attribute check
+    """
+
+    SUMMARY_LINES = 15
+
+    def __init__(self, directory):
+        self.logger = logging.getLogger(__name__)
+
+        self.directory = directory
+
+        self.__condition = threading.Condition()
+        self.__local = threading.local()
+        self.__session_id = 0
+        self.__active = False
+        self.__in_flight = 0
+        self.__profilers = []
+
+
+    def is_active(self):
+        return self.__active
+
+
+    def start(self, duration, on_finish=None):
+        """
+        args:
+            on_finish(filename, summary) - called when pstats are dumped,
+                                           filename is None if nothing
+                                           has been profiled
+
+        function returns:
+            True - session is started
+            False - another session is running
+        """
+
+        with self.__condition:
+            if self.__active:
+                return False
+            self.__session_id += 1
+            self.__profilers = []
+            self.__active = True
+
+        timer = threading.Timer(duration, self._finish, args=(on_finish,))
+        timer.name = "profiling-session"
+        timer.daemon = True
+        timer.start()
+        self.logger.warning("profiling session is started for %s seconds",
+                            duration)
+        return True
+
+
+    def run(self, func, *args, **kwargs):
+        if not self.__active:
+            return func(*args, **kwargs)
+
+        with self.__condition:
+            if not self.__active:
+                profiler = None
+            else:
+                profiler = self._get_profiler()
+                self.__in_flight += 1
+
+        if profiler is None:
+            return func(*args, **kwargs)
+
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            with self.__condition:
+                self.__in_flight -= 1
+                self.__condition.notify_all()
+
+
+    def _get_profiler(self):
+        # self.__condition should be acquired by the caller
+        if getattr(self.__local, "session_id", None) != self.__session_id:
+            self.__local.session_id = self.__session_id
+            self.__local.profiler = cProfile.Profile()
+            self.__profilers.append(self.__local.profiler)
+        return self.__local.profiler
+
+
+    def _finish(self, on_finish):
+        with self.__condition:
+            self.__active = False
+            # profilers can be read only when their calls are finished
+            self.__condition.wait_for(lambda: self.__in_flight == 0)
+            profilers, self.__profilers = self.__profilers, []
+
+        filename = None
+        summary = "no calls have been profiled"
+        if profilers:
+            stats = pstats.Stats(profilers[0])
+            for profiler in profilers[1:]:
+                stats.add(profiler)
+
+            os.makedirs(self.directory, exist_ok=True)
+            filename = os.path.join(
+                self.directory,
+                time.strftime("profile-%Y%m%d-%H%M%S.pstats"))
+            stats.dump_stats(filename)
+
+            output = io.StringIO()
+            stats.stream = output
+            stats.sort_stats("cumulative").print_stats(self.SUMMARY_LINES)
+            summary = output.getvalue()
+
+        self.logger.warning("profiling session is finished, "
+                            "stats are saved to %s", filename)
+        if on_finish is not None:
+            on_finish(filename, summary)
+
+
+
+class SlowHandlerLog():
+    """
+    USAGE:
+        slow_handler_log = SlowHandlerLog(threshold=1.0)
+
+        with slow_handler_log.track("check_translation"):
+            with slow_handler_log.phase("db"):
+                ...
+            with slow_handler_log.phase("similarity"):
+                ...
+
+    a handler which takes more than <threshold> seconds is logged
+    with time spent in every phase, time outside of phases is
+    reported as "other", phases of one name are summed up
+    """
+
+    def __init__(self, threshold=1.0):
+        self.logger = logging.getLogger(__name__)
+
+        self.threshold = threshold
+        self.slow_handlers = 0
+
+        self.__local = threading.local()
+
+
+    @contextmanager
+    def track(self, handler_name):
+        self.__local.phases = {}
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            phases, self.__local.phases = self.__local.phases, None
+            if duration > self.threshold:
+                self._log(handler_name, duration, phases)
+
+
+    @contextmanager
+    def phase(self, name):
+        phases = getattr(self.__local, "phases", None)
+        if phases is None:
+            # called outside of a tracked handler
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases[name] = phases.get(name, 0) + \
+                           time.perf_counter() - started
+
+
+    def _log(self, handler_name, duration, phases):
+        self.slow_handlers += 1
+        phases["other"] = max(0, duration - sum(phases.values()))
+        breakdown = " ".join(f"{name}={value * 1000:.1f}ms"
+                             for name, value in phases.items())
+        self.logger.warning("slow handler %s took %.1fms: %s",
+                            handler_name, duration * 1000, breakdown)
@@ -1,6 +1,10 @@
 import json
 import logging
 
+from concurrency import ReadWriteLock
+from json_stream import iterate_json_object, write_json_object
+from progress_snapshot import ProgressSnapshot, SnapshotUsers, write_snapshot
+
 """
 progress_db = {
     user_id: {
@@ -16,12 +20,23 @@ progress_db = {
 class ProgressDatabase():
     
     CUR_CHANNEL_KEY = "current_channel_id"
+    # users exported while the lock is held by export_to_file()
+    EXPORT_CHUNK_USERS = 1000
 
-    def __init__(self, queue_class):
+    def __init__(self, queue_class, journal=None):
+        """
+        args:
+            queue_class - ProgressQueue successor to keep progress with
+            journal - ProgressJournal obj to record mutations to, optional
+        """
         self.logger = logging.getLogger(__name__)
 
         self.queue_class = queue_class
+        self.journal = journal
         self.progress_db = {}
+        # handlers hold it shared while they change their own user,
+        # the whole database is exported and imported exclusively
+        self.lock = ReadWriteLock()
 
 
     def create_user(self, user_id):
@@ -37,6 +52,7 @@ class ProgressDatabase():
             self.progress_db[user_id] = {
                 self.CUR_CHANNEL_KEY: None
             }
+            self._journal({"op": "create_user", "user": user_id})
             self.logger.info(f"{user_id} was created in database")
             return True
 
@@ -50,6 +66,7 @@ class ProgressDatabase():
 
         if user_id in self.progress_db:
             self.progress_db.pop(user_id)
+            self._journal({"op": "delete_user", "user": user_id})
             self.logger.info(f"{user_id} was deleted from database")
             return True
         else:
@@ -68,7 +85,10 @@ class ProgressDatabase():
         if channel_id in self.progress_db[user_id]:
             return False
 
-        self.progress_db[user_id][channel_id] = self.queue_class()
+        self.progress_db[user_id][channel_id] = \
+            self.queue_class.for_channel(channel_id)
+        self._journal({"op": "create_channel",
+                       "user": user_id, "channel": channel_id})
         self.logger.info(f"{user_id}:{channel_id} was created in database")
         return True
 
@@ -87,6 +107,8 @@ class ProgressDatabase():
             return False
 
         self.progress_db[user_id].pop(channel_id)
+        self._journal({"op": "delete_channel",
+                       "user": user_id, "channel": channel_id})
         self.logger.info(f"{user_id}:{channel_id} was deleted from database")
         return True
 
@@ -115,6 +137,8 @@ class ProgressDatabase():
 
         if user_id in self.progress_db:
             self.progress_db[user_id][self.CUR_CHANNEL_KEY] = channel_id
+            self._journal({"op": "set_channel",
+                           "user": user_id, "channel": channel_id})
             return True
         else: 
             return False 
@@ -137,41 +161,218 @@ class ProgressDatabase():
         return (0, self.progress_db[user_id][channel_id])
 
 
+    def change_question_progress(self, user_id, channel_id,
+                                 question_id, change):
+        """
+        change progress of question_id and record it to the journal
+
+        function returns:
+            True - progress is changed
+            False - user_id:channel_id is absent in database
+        """
+
+        exit_code, queue_obj = self.get_channel_progress(user_id, channel_id)
+        if exit_code != 0:
+            return False
+
+        queue_obj.change_question_progress(question_id, change)
+        self._journal({"op": "progress",
+                       "user": user_id, "channel": channel_id,
+                       "question": question_id,
+                       "value": queue_obj.get_question_progress(question_id)})
+        return True
+
+
+    def apply_journal_record(self, record):
+        """
+        apply a record made by this class without recording it again
+        """
+
+        journal, self.journal = self.journal, None
+        try:
+            op = record["op"]
+            if op == "create_user":
+                self.create_user(record["user"])
+            elif op == "delete_user":
+                self.delete_user(record["user"])
+            elif op == "create_channel":
+                self.create_channel_progress(record["user"],
+                                             record["channel"])
+            elif op == "delete_channel":
+                self.delete_channel_progress(record["user"],
+                                             record["channel"])
+            elif op == "set_channel":
+                self.set_current_channel_of_user(record["user"],
+                                                 record["channel"])
+            elif op == "progress":
+                self.create_channel_progress(record["user"],
+                                             record["channel"])
+                self.progress_db[record["user"]][record["channel"]]\
+                    .set_question_progress(record["question"],
+                                           record["value"])
+            else:
+                self.logger.warning(f"Unknown journal record op={op}")
+        finally:
+            self.journal = journal
+
+
+    def _journal(self, record):
+        if self.journal is not None:
+            self.journal.append(record)
+
+
     def export_to_json(self):
         # self.progress_db is not JSON serializable
         # => create its copy with converted ProgressQueue obj
 
         duplicated_db = {}
-        for user_id in self.progress_db:
-            duplicated_db[user_id] = {}
-            
-            for key, value in self.progress_db[user_id].items():
-                if key == self.CUR_CHANNEL_KEY:
-                    # save current channel id
-                    duplicated_db[user_id][key] = value
-                else:
-                    # it's ProgressQueue successor
-                    duplicated_db[user_id][key] = value.get_progress()
+        with self.lock.exclusive():
+            for user_id in self.progress_db:
+                duplicated_db[user_id] = self._export_user(user_id)
         
         # now object is serializable
         return json.dumps(duplicated_db)
 
 
+    def export_to_file(self, file):
+        """
+        write the same JSON as export_to_json() to a text file obj
+        user by user, only one user is converted at a time
+
+        function returns:
+            int - amount of exported users
+        """
+
+        return write_json_object(self.iterate_exported_users(), file)
+
+
+    def export_to_snapshot(self, file):
+        """
+        write users to a binary file obj in the format of
+        progress_snapshot, see import_from_snapshot()
+
+        function returns:
+            int - amount of exported users
+        """
+
+        return write_snapshot(self.iterate_exported_users(), file)
+
+
+    def iterate_exported_users(self):
+        """
+        users are converted by chunks of EXPORT_CHUNK_USERS while
+        the lock is held exclusively, chunks are yielded after it's
+        released, so handlers run while a chunk is written,
+        every user is consistent, but users can be saved at different
+        moments, the journal which is rotated before the export
+        covers the difference
+
+        function yields:
+            (user_id, user_data) - user_data is in the format
+                                   of export_to_json()
+        """
+
+        with self.lock.exclusive():
+            user_ids = list(self.progress_db)
+
+        for start in range(0, len(user_ids), self.EXPORT_CHUNK_USERS):
+            with self.lock.exclusive():
+                chunk = [
+                    (user_id, self._export_user(user_id, copy=True))
+                    for user_id in user_ids[start:start +
+                                            self.EXPORT_CHUNK_USERS]
+                    # user might be deleted after the export started
+                    if user_id in self.progress_db
+                ]
+            yield from chunk
+
+
+    def _export_user(self, user_id, copy=False):
+        """
+        args:
+            copy - copy progress of every channel, so it can be
+                   serialized after the lock is released
+        """
+
+        if isinstance(self.progress_db, SnapshotUsers):
+            # users who haven't been accessed are copied as they are
+            exported_user = self.progress_db.get_unloaded(user_id)
+            if exported_user is not None:
+                return exported_user
+
+        exported_user = {}
+        for key, value in self.progress_db[user_id].items():
+            if key == self.CUR_CHANNEL_KEY:
+                # save current channel id
+                exported_user[key] = value
+            elif copy:
+                exported_user[key] = dict(value.get_progress())
+            else:
+                # it's ProgressQueue successor
+                exported_user[key] = value.get_progress()
+        return exported_user
+
+
     def import_from_json(self, data):
         # go through restored object and convert
         # dict object to ProgressQueue
 
         restored_db = json.loads(data)
-        for user_id in restored_db:
-            self.progress_db[user_id] = {}
-
-            for key, value in restored_db[user_id].items():
-                if key == self.CUR_CHANNEL_KEY:
-                    # save current channel id
-                    self.progress_db[user_id][key] = value
-                else:
-                    # it's ProgressQueue successor
-                    self.progress_db[user_id][key] = self.queue_class()
-                    self.progress_db[user_id][key].set_progress(value)
-
-        return True
\ No newline at end of file
+        with self.lock.exclusive():
+            for user_id in restored_db:
+                self._import_user(user_id, restored_db[user_id])
+
+        return True
+
+
+    def import_from_file(self, file):
+        """
+        read JSON made by export_to_json() or export_to_file()
+        from a text file obj user by user, the whole file
+        is never loaded to memory
+
+        function returns:
+            True - all users are imported
+        raises:
+            ValueError - file is not a JSON object
+        """
+
+        with self.lock.exclusive():
+            for user_id, user_data in iterate_json_object(file):
+                self._import_user(user_id, user_data)
+
+        return True
+
+
+    def import_from_snapshot(self, filename):
+        """
+        replace all users with users of the binary snapshot written
+        by export_to_snapshot(), the file is mapped to memory and
+        ProgressQueue objects are created on the first access to
+        a user, so the import doesn't depend on the size of progress
+
+        raises:
+            ValueError - file is not a snapshot
+        """
+
+        snapshot = ProgressSnapshot(filename)
+        with self.lock.exclusive():
+            if isinstance(self.progress_db, SnapshotUsers):
+                # users of the previous snapshot are replaced as well
+                self.progress_db.snapshot.close()
+            self.progress_db = SnapshotUsers(snapshot, self._import_user)
+        return True
+
+
+    def _import_user(self, user_id, user_data):
+        self.progress_db[user_id] = {}
+
+        for key, value in user_data.items():
+            if key == self.CUR_CHANNEL_KEY:
+                # save current channel id
+                self.progress_db[user_id][key] = value
+            else:
+                # it's ProgressQueue successor
+                self.progress_db[user_id][key] = \
+                    self.queue_class.for_channel(key)
+                self.progress_db[user_id][key].set_progress(value)
@@ -0,0 +1,378 @@
+import sys
+import json
+import time
+import sqlite3
+import threading
+
+from json_stream import iterate_json_object
+from progress_db import ProgressDatabase
+
+
+
+class SQLiteProgressDatabase(ProgressDatabase):
+    """
+    ProgressDatabase with the same public API which keeps progress
+    in SQLite (WAL mode) instead of one JSON document
+
+    users are loaded on demand and at most max_cached_users are kept
+    in memory, mutations are written back in batches by flush()
+
+    only progress values are saved, queues also keep the current
+    question and subset in memory, so users accessed within
+    active_seconds are never evicted, the cache grows over
+    max_cached_users while there are more active users
+
+    tables:
+        users: user_id, current_channel_id
+        channels: user_id, channel_id
+        progress: user_id, channel_id, question_id, value
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS users (
+               user_id TEXT PRIMARY KEY,
+               current_channel_id TEXT
+           )""",
+        """CREATE TABLE IF NOT EXISTS channels (
+               user_id TEXT NOT NULL,
+               channel_id TEXT NOT NULL,
+               PRIMARY KEY (user_id, channel_id)
+           ) WITHOUT ROWID""",
+        """CREATE TABLE IF NOT EXISTS progress (
+               user_id TEXT NOT NULL,
+               channel_id TEXT NOT NULL,
+               question_id TEXT NOT NULL,
+               value INTEGER NOT NULL,
+               PRIMARY KEY (user_id, channel_id, question_id)
+           ) WITHOUT ROWID"""
+    ]
+
+    def __init__(self, queue_class, filename,
+                 max_cached_users=10000, batch_size=1000,
+                 active_seconds=3600):
+        """
+        args:
+            queue_class - ProgressQueue successor to keep progress with
+            filename - SQLite database file
+            max_cached_users - how many users to keep in memory
+            batch_size - flush automatically after <batch_size> mutations
+            active_seconds - users accessed within it are not evicted
+        """
+        super().__init__(queue_class)
+
+        self.filename = filename
+        self.max_cached_users = max_cached_users
+        self.batch_size = batch_size
+        self.active_seconds = active_seconds
+
+        self.__lock = threading.RLock()
+        self.__pending = []
+        # user_id: time.monotonic() of the last access
+        self.__accessed = {}
+
+        self.connection = sqlite3.connect(filename,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for statement in self.SCHEMA:
+                self.connection.execute(statement)
+
+
+    def create_user(self, user_id):
+        self._load_user(user_id)
+        with self.__lock:
+            created = super().create_user(user_id)
+            if created:
+                self.__accessed[user_id] = time.monotonic()
+            self._evict_users()
+        return created
+
+
+    def delete_user(self, user_id):
+        self._load_user(user_id)
+        with self.__lock:
+            self.__accessed.pop(user_id, None)
+            return super().delete_user(user_id)
+
+
+    def create_channel_progress(self, user_id, channel_id):
+        self._load_user(user_id)
+        return super().create_channel_progress(user_id, channel_id)
+
+
+    def delete_channel_progress(self, user_id, channel_id):
+        self._load_user(user_id)
+        return super().delete_channel_progress(user_id, channel_id)
+
+
+    def get_current_channel_of_user(self, user_id):
+        self._load_user(user_id)
+        return super().get_current_channel_of_user(user_id)
+
+
+    def set_current_channel_of_user(self, user_id, channel_id):
+        self._load_user(user_id)
+        return super().set_current_channel_of_user(user_id, channel_id)
+
+
+    def get_channel_progress(self, user_id, channel_id):
+        self._load_user(user_id)
+        return super().get_channel_progress(user_id, channel_id)
+
+
+    def flush(self):
+        """
+        write pending mutations in one transaction
+
+        function returns:
+            int - amount of written mutations
+        """
+
+        with self.__lock:
+            pending, self.__pending = self.__pending, []
+            if not pending:
+                return 0
+
+            with self.connection:
+                for record in pending:
+                    self._write_record(record)
+
+            self.logger.info("flushed %s mutations to %s",
+                             len(pending), self.filename)
+            return len(pending)
+
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+    def export_to_json(self):
+        exported = {}
+        with self.lock.exclusive(), self.__lock:
+            self.flush()
+
+            for user_id, channel_id in self.connection.execute(
+                    "SELECT user_id, current_channel_id FROM users"):
+                exported[user_id] = {self.CUR_CHANNEL_KEY: channel_id}
+
+            for user_id, channel_id in self.connection.execute(
+                    "SELECT user_id, channel_id FROM channels"):
+                exported[user_id][channel_id] = {}
+
+            for user_id, channel_id, question_id, value in \
+                    self.connection.execute(
+                        "SELECT user_id, channel_id, question_id, value "
+                        "FROM progress"):
+                exported[user_id][channel_id][question_id] = value
+
+        return json.dumps(exported)
+
+
+    def export_to_file(self, file):
+        """
+        write the same JSON as export_to_json() to a text file obj,
+        users are read from SQLite one by one
+
+        function returns:
+            int - amount of exported users
+        """
+
+        exported = 0
+        with self.lock.exclusive(), self.__lock:
+            self.flush()
+
+            file.write("{")
+            for user_id, current_channel_id in self.connection.execute(
+                    "SELECT user_id, current_channel_id FROM users"):
+                user_data = {self.CUR_CHANNEL_KEY: current_channel_id}
+                for (channel_id,) in self.connection.execute(
+                        "SELECT channel_id FROM channels WHERE user_id = ?",
+                        (user_id,)):
+                    user_data[channel_id] = {}
+                for channel_id, question_id, value in \
+                        self.connection.execute(
+                            "SELECT channel_id, question_id, value "
+                            "FROM progress WHERE user_id = ?", (user_id,)):
+                    user_data[channel_id][question_id] = value
+
+                if exported:
+                    file.write(", ")
+                file.write(f"{json.dumps(user_id)}: {json.dumps(user_data)}")
+                exported += 1
+            file.write("}")
+
+        return exported
+
+
+    def import_from_json(self, data):
+        """
+        replace the whole database with the JSON exported by
+        ProgressDatabase.export_to_json()
+        """
+
+        return self._replace_all(json.loads(data).items())
+
+
+    def import_from_file(self, file):
+        """
+        replace the whole database with the JSON read user by user
+        from a text file obj
+        """
+
+        return self._replace_all(iterate_json_object(file))
+
+
+    def _replace_all(self, restored_users):
+        with self.lock.exclusive(), self.__lock:
+            self.__pending = []
+            self.progress_db = {}
+            self.__accessed = {}
+
+            with self.connection:
+                for table in ["users", "channels", "progress"]:
+                    self.connection.execute(f"DELETE FROM {table}")
+
+                for user_id, user_data in restored_users:
+                    self.connection.execute(
+                        "INSERT INTO users VALUES (?, ?)",
+                        (user_id, user_data.get(self.CUR_CHANNEL_KEY)))
+
+                    for channel_id, progress in user_data.items():
+                        if channel_id == self.CUR_CHANNEL_KEY:
+                            continue
+                        self.connection.execute(
+                            "INSERT INTO channels VALUES (?, ?)",
+                            (user_id, channel_id))
+                        self.connection.executemany(
+                            "INSERT INTO progress VALUES (?, ?, ?, ?)",
+                            [(user_id, channel_id, question_id, value)
+                             for question_id, value in progress.items()])
+
+        return True
+
+
+    def _load_user(self, user_id):
+        with self.__lock:
+            if user_id in self.progress_db:
+                # keep recently used users at the end
+                self.progress_db[user_id] = self.progress_db.pop(user_id)
+                self.__accessed[user_id] = time.monotonic()
+                return
+
+            # pending mutations might have deleted the user
+            self.flush()
+
+            row = self.connection.execute(
+                "SELECT current_channel_id FROM users WHERE user_id = ?",
+                (user_id,)).fetchone()
+            if row is None:
+                return
+
+            user_data = {self.CUR_CHANNEL_KEY: row[0]}
+            progress = {}
+            for (channel_id,) in self.connection.execute(
+                    "SELECT channel_id FROM channels WHERE user_id = ?",
+                    (user_id,)):
+                progress[channel_id] = {}
+
+            for channel_id, question_id, value in self.connection.execute(
+                    "SELECT channel_id, question_id, value FROM progress "
+                    "WHERE user_id = ?", (user_id,)):
+                progress[channel_id][question_id] = value
+
+            for channel_id, channel_progress in progress.items():
+                user_data[channel_id] = \
+                    self.queue_class.for_channel(channel_id)
+                user_data[channel_id].set_progress(channel_progress)
+
+            self.progress_db[user_id] = user_data
+            self.__accessed[user_id] = time.monotonic()
+            self._evict_users()
+
+
+    def _evict_users(self):
+        if len(self.progress_db) <= self.max_cached_users:
+            return
+
+        # evicted users should not have unsaved mutations
+        self.flush()
+        deadline = time.monotonic() - self.active_seconds
+        while len(self.progress_db) > self.max_cached_users:
+            # users are ordered from the least recently used one
+            user_id = next(iter(self.progress_db))
+            if self.__accessed.get(user_id, deadline) > deadline:
+                return
+            self.progress_db.pop(user_id)
+            self.__accessed.pop(user_id, None)
+
+
+    def _journal(self, record):
+        with self.__lock:
+            self.__pending.append(record)
+            if len(self.__pending) >= self.batch_size:
+                self.flush()
+
+
+    def _write_record(self, record):
+        op = record["op"]
+        if op == "create_user":
+            self.connection.execute(
+                "INSERT OR IGNORE INTO users VALUES (?, NULL)",
+                (record["user"],))
+        elif op == "delete_user":
+            for table in ["users", "channels", "progress"]:
+                self.connection.execute(
+                    f"DELETE FROM {table} WHERE user_id = ?",
+                    (record["user"],))
+        elif op == "create_channel":
+            self.connection.execute(
+                "INSERT OR IGNORE INTO channels VALUES (?, ?)",
+                (record["user"], record["channel"]))
+        elif op == "delete_channel":
+            for table in ["channels", "progress"]:
+                self.connection.execute(
+                    f"DELETE FROM {table} "
+                    f"WHERE user_id = ? AND channel_id = ?",
+                    (record["user"], record["channel"]))
+        elif op == "set_channel":
+            self.connection.execute(
+                "UPDATE users SET current_channel_id = ? WHERE user_id = ?",
+                (record["channel"], record["user"]))
+        elif op == "progress":
+            self.connection.execute(
+                "INSERT OR REPLACE INTO progress VALUES (?, ?, ?, ?)",
+                (record["user"], record["channel"],
+                 record["question"], record["value"]))
+        else:
+            self.logger.warning(f"Unknown mutation record op={op}")
+
+
+def migrate_json_to_sqlite(json_filename, sqlite_filename):
+    """
+    one-shot migration of users.db.json to the SQLite database,
+    existing content of the SQLite database is replaced
+
+    function returns:
+        int - amount of migrated users
+    """
+
+    # queue_class is not used for import
+    progress_db = SQLiteProgressDatabase(queue_class=None,
+                                         filename=sqlite_filename)
+    with open(json_filename, "r", encoding="utf-8") as file:
+        progress_db.import_from_file(file)
+    (migrated,) = progress_db.connection.execute(
+                  "SELECT COUNT(*) FROM users").fetchone()
+    progress_db.close()
+    return migrated
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"usage: {sys.argv[0]} <users.db.json> <users.db.sqlite3>")
+        sys.exit(1)
+
+    users_amount = migrate_json_to_sqlite(sys.argv[1], sys.argv[2])
+    print(f"migrated {users_amount} users to {sys.argv[2]}")
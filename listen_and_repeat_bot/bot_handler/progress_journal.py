@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import logging
+import threading
+
+
+
+class ProgressJournal():
+    """
+    USAGE:
+        journal = ProgressJournal("users.db.json.journal")
+        progress_db = ProgressDatabase(queue_class, journal=journal)
+
+        progress_db.import_from_json(...)   # restore the last snapshot
+        journal.replay(progress_db)         # apply mutations made after it
+        journal.start()
+
+        # periodically replace the journal with a snapshot
+        journal.compact(write_snapshot)
+
+    every record is a JSON line with absolute values,
+    so replaying a record more than once is harmless
+
+    records are written and fsync'ed in batches every batch_interval
+    seconds, a crash loses at most one batch window
+    """
+
+    def __init__(self, filename, batch_interval=1.0, compact_interval=3600):
+        self.logger = logging.getLogger(__name__)
+
+        self.filename = filename
+        self.compacting_filename = f"{filename}.compacting"
+        self.batch_interval = batch_interval
+        self.compact_interval = compact_interval
+
+        self.__lock = threading.Lock()
+        self.__buffer = []
+        self.__file = None
+        self.__last_compaction = time.monotonic()
+
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+
+    def start(self):
+        """
+        function returns:
+            True - background flushing is started
+            False - background flushing is already running
+        """
+
+        if self.__thread is not None and self.__thread.is_alive():
+            return False
+
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self._run,
+                                         name="progress-journal",
+                                         daemon=True)
+        self.__thread.start()
+        return True
+
+
+    def stop(self, timeout=None):
+        self.__stopped.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+        self.flush()
+
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+
+
+    def append(self, record):
+        """
+        args:
+            record (dict) - JSON serializable mutation record,
+                            it's written on the next flush
+        """
+
+        line = json.dumps(record, ensure_ascii=False)
+        with self.__lock:
+            self.__buffer.append(line)
+
+
+    def flush(self):
+        """
+        write buffered records and fsync the journal file
+
+        function returns:
+            int - amount of written records
+        """
+
+        with self.__lock:
+            return self._flush()
+
+
+    def replay(self, progress_db):
+        """
+        apply records of the journal (and of an interrupted compaction)
+        to progress_db, broken lines are skipped
+
+        function returns:
+            int - amount of applied records
+        """
+
+        applied = 0
+        for filename in [self.compacting_filename, self.filename]:
+            try:
+                with open(filename, "r", encoding="utf-8") as file:
+                    for line in file:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # the last line is partially written after crash
+                            self.logger.warning("Skip broken record "
+                                                "in %s", filename)
+                            continue
+                        progress_db.apply_journal_record(record)
+                        applied += 1
+            except FileNotFoundError:
+                continue
+
+        self.logger.info("replayed %s records from %s",
+                         applied, self.filename)
+        return applied
+
+
+    def is_compaction_due(self):
+        return time.monotonic() - self.__last_compaction \
+               >= self.compact_interval
+
+
+    def compact(self, write_snapshot):
+        """
+        args:
+            write_snapshot - function which saves the whole progress_db,
+                             records appended while it's running are kept
+                             in a new journal, returns False or raises
+                             an exception if snapshot is not saved
+
+        function returns:
+            True - snapshot is written and old records are dropped
+            False - write_snapshot failed, old records are kept
+        """
+
+        with self.__lock:
+            self._flush()
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+            if os.path.exists(self.compacting_filename):
+                # previous compaction has failed, keep its records
+                self._append_to_compacting()
+            elif os.path.exists(self.filename):
+                os.replace(self.filename, self.compacting_filename)
+
+        try:
+            written = write_snapshot()
+        except Exception as exc:
+            self.logger.exception("Failed to write snapshot, "
+                                  "journal is kept due to %s", exc)
+            return False
+
+        if written is False:
+            self.logger.warning("Snapshot is not written, journal is kept")
+            return False
+
+        if os.path.exists(self.compacting_filename):
+            os.remove(self.compacting_filename)
+        self.__last_compaction = time.monotonic()
+        return True
+
+
+    def _flush(self):
+        # self.__lock should be acquired by the caller
+        if not self.__buffer:
+            return 0
+
+        if self.__file is None:
+            self.__file = open(self.filename, "a", encoding="utf-8")
+
+        written = len(self.__buffer)
+        self.__file.write("\n".join(self.__buffer) + "\n")
+        self.__file.flush()
+        os.fsync(self.__file.fileno())
+        self.__buffer = []
+        return written
+
+
+    def _append_to_compacting(self):
+        # self.__lock should be acquired by the caller
+        if not os.path.exists(self.filename):
+            return
+
+        with open(self.filename, "r", encoding="utf-8") as source, \
+             open(self.compacting_filename, "a", encoding="utf-8") as target:
+            for line in source:
+                target.write(line)
+            target.flush()
+            os.fsync(target.fileno())
+        os.remove(self.filename)
+
+
+    def _run(self):
+        while not self.__stopped.wait(self.batch_interval):
+            try:
+                self.flush()
+            except OSError as exc:
+                self.logger.exception("Failed to flush journal "
+                                      "due to %s", exc)
@@ -2,6 +2,9 @@ import json
 import random
 import logging
 import os
+import threading
+from array import array
+from collections.abc import MutableMapping
 
 
 logging.basicConfig(
@@ -11,6 +14,130 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class QuestionIdTable():
+    """
+    interns question IDs (str) of a channel to int indexes,
+    a table is shared by all progress queues of the channel
+    """
+
+    __slots__ = ("ids", "indexes", "lock")
+
+    def __init__(self):
+        self.ids = []
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def intern(self, question_id):
+        """
+        returns:
+            index (int) - index of question_id, it's added if absent
+        """
+        index = self.indexes.get(question_id)
+        if index is not None:
+            return index
+
+        with self.lock:
+            if question_id not in self.indexes:
+                self.indexes[question_id] = len(self.ids)
+                self.ids.append(question_id)
+            return self.indexes[question_id]
+
+    def get_index(self, question_id):
+        """
+        returns:
+            index (int) - index of question_id
+            None - question_id has not been interned
+        """
+        return self.indexes.get(question_id)
+
+    def get_id(self, index):
+        return self.ids[index]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+question_id_tables = {}
+question_id_tables_lock = threading.Lock()
+
+
+def get_question_id_table(channel_id):
+    """
+    returns:
+        QuestionIdTable obj - shared table of channel_id
+    """
+    table = question_id_tables.get(channel_id)
+    if table is None:
+        with question_id_tables_lock:
+            table = question_id_tables.setdefault(channel_id,
+                                                  QuestionIdTable())
+    return table
+
+
+class CompactProgress(MutableMapping):
+    """
+    mapping of <question_id>: <progress_value> which keeps
+    values in array('H') indexed through a shared QuestionIdTable,
+    so question IDs are not duplicated for every user
+    """
+
+    __slots__ = ("table", "values_array", "size")
+
+    ABSENT = 0xFFFF
+
+    def __init__(self, table, progress=None):
+        self.table = table
+        self.values_array = array("H")
+        self.size = 0
+        if progress:
+            self.update(progress)
+
+    def __getitem__(self, question_id):
+        index = self.table.get_index(question_id)
+        if index is None or index >= len(self.values_array) or \
+           self.values_array[index] == self.ABSENT:
+            raise KeyError(question_id)
+        return self.values_array[index]
+
+    def __setitem__(self, question_id, value):
+        index = self.table.intern(question_id)
+        if index >= len(self.values_array):
+            self.values_array.extend(
+                [self.ABSENT] * (index + 1 - len(self.values_array)))
+        if self.values_array[index] == self.ABSENT:
+            self.size += 1
+        self.values_array[index] = value
+
+    def __delitem__(self, question_id):
+        if question_id not in self:
+            raise KeyError(question_id)
+        self.values_array[self.table.get_index(question_id)] = self.ABSENT
+        self.size -= 1
+
+    def __contains__(self, question_id):
+        index = self.table.get_index(question_id)
+        return index is not None and index < len(self.values_array) and \
+               self.values_array[index] != self.ABSENT
+
+    def __iter__(self):
+        for index, value in enumerate(self.values_array):
+            if value != self.ABSENT:
+                yield self.table.get_id(index)
+
+    def __len__(self):
+        return self.size
+
+    def items(self):
+        return [
+            (self.table.get_id(index), value)
+            for index, value in enumerate(self.values_array)
+            if value != self.ABSENT
+        ]
+
+    def values(self):
+        return [value for value in self.values_array if value != self.ABSENT]
+
+
 class ProgressQueue(dict):
     """
     class contains all required
@@ -23,6 +150,16 @@ class ProgressQueue(dict):
                     0 - user knows nothing; 1000 - user knows excellent
     """
 
+    __slots__ = ("progress", "current_question_id")
+
+    @classmethod
+    def for_channel(cls, channel_id):
+        """
+        returns:
+            ProgressQueue obj - new queue to keep progress of channel_id
+        """
+        return cls()
+
     def __init__(self):
         """
         define required objects for class instance
@@ -44,6 +181,20 @@ class ProgressQueue(dict):
         """
         raise NotImplemented
 
+    def remove_questions(self, questions):
+        """
+        args:
+            questions - list of question IDs (str) to
+                        remove from progress queue object
+        """
+        for question_id in questions:
+            old_value = self.progress.pop(question_id, None)
+            if old_value is not None:
+                self._progress_changed(question_id, old_value, None)
+
+        if self.current_question_id in questions:
+            self.current_question_id = None
+
     def next_question(self):
         """
         returns:
@@ -85,6 +236,24 @@ class ProgressQueue(dict):
                                        represents how a user knows question
         """
         self.progress = progress
+        self._progress_replaced()
+
+    def get_question_progress(self, question_id):
+        """
+        returns:
+            value (int) - progress of question_id between 0-1000
+        """
+        return self.progress[question_id]
+
+    def set_question_progress(self, question_id, value):
+        """
+        args:
+            question_id (str) - question_id to set progress of
+            value (int) - progress value between 0-1000
+        """
+        old_value = self.progress.get(question_id)
+        self.progress[question_id] = value
+        self._progress_changed(question_id, old_value, value)
 
     def change_question_progress(self, question_id, change):
         """
@@ -92,9 +261,162 @@ class ProgressQueue(dict):
             question_id (str) - question_id to change progress of
             change (float) - value to add up to the question_id progress
         """
-        self.progress[question_id] += int(change)
-        self.progress[question_id] = max(self.progress[question_id], 1)
-        self.progress[question_id] = min(self.progress[question_id], 1000)
+        value = self.progress[question_id] + int(change)
+        value = max(value, 1)
+        value = min(value, 1000)
+        self.set_question_progress(question_id, value)
+
+    def _progress_changed(self, question_id, old_value, new_value):
+        """
+        called after progress of a single question is changed,
+        successors can keep derived structures up to date
+
+        args:
+            question_id (str)
+            old_value (int) - None if question_id has been just added
+            new_value (int) - None if question_id has been removed
+        """
+
+    def _progress_replaced(self):
+        """
+        called after the whole progress is replaced by set_progress()
+        """
+
+
+class QuestionBucket():
+    """
+    set of question IDs with O(1) add, discard and
+    random sampling of k elements in O(k)
+    """
+
+    __slots__ = ("items", "positions")
+
+    def __init__(self):
+        self.items = []
+        self.positions = {}
+
+    def add(self, question_id):
+        if question_id not in self.positions:
+            self.positions[question_id] = len(self.items)
+            self.items.append(question_id)
+
+    def discard(self, question_id):
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+
+        # move the last element to the freed position
+        last_question_id = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last_question_id
+            self.positions[last_question_id] = position
+
+    def sample(self, k):
+        return random.sample(self.items, min(k, len(self.items)))
+
+    def __len__(self):
+        return len(self.items)
+
+
+class WeightedSampler():
+    """
+    Fenwick tree of weights (int) of question IDs,
+    sample(), add(), update() and remove() cost O(log n)
+    """
+
+    __slots__ = ("tree", "weights", "ids", "positions", "free_positions")
+
+    def __init__(self, weighted_items=()):
+        self.weights = []
+        self.ids = []
+        self.positions = {}
+        self.free_positions = []
+        for question_id, weight in weighted_items:
+            self.positions[question_id] = len(self.ids)
+            self.ids.append(question_id)
+            self.weights.append(weight)
+        self._build(len(self.weights))
+
+    def _build(self, capacity):
+        # tree[i] holds the sum of weights[i - lowbit(i), i) (1-based)
+        self.weights.extend([0] * (capacity - len(self.weights)))
+        self.ids.extend([None] * (capacity - len(self.ids)))
+        self.tree = [0] + self.weights[:]
+        for i in range(1, capacity + 1):
+            parent = i + (i & -i)
+            if parent <= capacity:
+                self.tree[parent] += self.tree[i]
+
+    def _add_to_tree(self, position, delta):
+        i = position + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        total, i = 0, len(self.tree) - 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, question_id, weight):
+        if question_id in self.positions:
+            self.update(question_id, weight)
+            return
+
+        if not self.free_positions:
+            # double capacity, amortized O(1) per added question
+            capacity = len(self.weights)
+            self.free_positions = list(
+                range(max(2 * capacity, 8) - 1, capacity - 1, -1))
+            self._build(max(2 * capacity, 8))
+
+        position = self.free_positions.pop()
+        self.positions[question_id] = position
+        self.ids[position] = question_id
+        self.update(question_id, weight)
+
+    def update(self, question_id, weight):
+        position = self.positions[question_id]
+        self._add_to_tree(position, weight - self.weights[position])
+        self.weights[position] = weight
+
+    def remove(self, question_id):
+        position = self.positions.pop(question_id, None)
+        if position is None:
+            return
+        self._add_to_tree(position, -self.weights[position])
+        self.weights[position] = 0
+        self.ids[position] = None
+        self.free_positions.append(position)
+
+    def sample(self):
+        """
+        returns:
+            question_id (str) - random question_id, probability is
+                                proportional to its weight
+            None - there are no questions with positive weight
+        """
+        total = self.total()
+        if total <= 0:
+            return None
+
+        # find the first position where prefix sum exceeds the target
+        target = random.randrange(total)
+        position = 0
+        step = 1 << (len(self.tree) - 1).bit_length()
+        while step:
+            next_position = position + step
+            if next_position < len(self.tree) and \
+               self.tree[next_position] <= target:
+                position = next_position
+                target -= self.tree[next_position]
+            step >>= 1
+        return self.ids[position]
+
+    def __len__(self):
+        return len(self.positions)
 
 
 class ProgressQueueRandom(ProgressQueue):
@@ -103,10 +425,12 @@ class ProgressQueueRandom(ProgressQueue):
         a random manner without any tracking of learning progress
     """
 
+    __slots__ = ()
+
     def update_questions(self, questions):
         for question_id in questions:
             if question_id not in self.progress:
-                self.progress[question_id] = 0
+                self.set_question_progress(question_id, 0)
 
     def next_question(self):
         self.current_question_id = random.choice(
@@ -114,8 +438,8 @@ class ProgressQueueRandom(ProgressQueue):
         return self.current_question_id
 
     def reset(self):
-        for key in self.progress.keys():
-            self.progress[key] = 0
+        for key in list(self.progress.keys()):
+            self.set_question_progress(key, 0)
 
 
 class ProgressQueuePriorityRandom(ProgressQueueRandom):
@@ -123,22 +447,48 @@ class ProgressQueuePriorityRandom(ProgressQueueRandom):
         class can be used to generate next question to learn
         in a weighted random manner
 
-        Weight is a value of learning progress (self.progress[])
-        
+        Weight is derived from learning progress (self.progress[]),
+        see _weight()
+
         the more learning progress of specific question
         the less probability to return it
+
+        weights are kept in WeightedSampler which is built on the
+        first next_question() call and updated on every progress change
     """
 
-    def next_question(self):
-        choices = random.choices(
-                       population=list(self.progress.keys()),
-                       weights=[-el for el in self.progress.values()],
-                       k=1)
-        if choices:
-            self.current_question_id = choices[0]
+    __slots__ = ("weighted_sampler",)
+
+    def __init__(self):
+        self.weighted_sampler = None
+        super().__init__()
+
+    @staticmethod
+    def _weight(value):
+        # progress 0 has weight 1001, progress 1000 has weight 1
+        return 1001 - value
+
+    def _progress_changed(self, question_id, old_value, new_value):
+        super()._progress_changed(question_id, old_value, new_value)
+        if self.weighted_sampler is None:
+            return
+
+        if new_value is None:
+            self.weighted_sampler.remove(question_id)
         else:
-            self.current_question_id = None
+            self.weighted_sampler.add(question_id, self._weight(new_value))
+
+    def _progress_replaced(self):
+        super()._progress_replaced()
+        self.weighted_sampler = None
 
+    def next_question(self):
+        if self.weighted_sampler is None:
+            self.weighted_sampler = WeightedSampler(
+                (question_id, self._weight(value))
+                for question_id, value in self.progress.items())
+
+        self.current_question_id = self.weighted_sampler.sample()
         return self.current_question_id
 
 
@@ -154,14 +504,28 @@ class ProgressQueuePriorityRandomLimited(ProgressQueuePriorityRandom):
         3) return to step 1
     """
 
+    __slots__ = ("selected_subset", "selected_subset_ttl")
+
     SUBSET_SIZE = 10
     SUBSET_TTL = 14
+    # amount of subsets generated by all queues, it's exported as a metric
+    subsets_generated = 0
 
     def __init__(self):
         self.selected_subset = None
         super().__init__()
 
 
+    def remove_questions(self, questions):
+        super().remove_questions(questions)
+
+        if self.selected_subset is not None:
+            # an empty subset is generated again by next_question()
+            self.selected_subset = [
+                question_id for question_id in self.selected_subset
+                if question_id not in questions
+            ] or None
+
     def _generate_subset(self):
         sorted_questions_progress = sorted(self.progress.items(),
                                            key=lambda item: item[1])
@@ -173,6 +537,7 @@ class ProgressQueuePriorityRandomLimited(ProgressQueuePriorityRandom):
         if self.selected_subset is None:
             self.selected_subset = self._generate_subset()
             self.selected_subset_ttl = self.SUBSET_TTL
+            ProgressQueuePriorityRandomLimited.subsets_generated += 1
 
         if len(self.selected_subset):
             # random.choice arg should have len > 0
@@ -207,37 +572,126 @@ class ProgressQueueLearnModesAndSubsets(ProgressQueuePriorityRandomLimited):
         SUBSET_TTL: how much questions ask about the subset
     """
 
+    __slots__ = ("learning_mode", "question_buckets")
+
     LEARNING_MODE = 0
     SUBSET_SIZE = 8
     SUBSET_TTL = 12
 
-    def _shuffle(self, array):
-        random.shuffle(array)
-        return array
+    def __init__(self):
+        # buckets are built on the first _generate_subset() call
+        # and maintained incrementally afterwards
+        self.question_buckets = None
+        super().__init__()
+
+    @staticmethod
+    def _bucket_index(value):
+        if value == 0:
+            return 0
+        if value <= 400:
+            return 1
+        if value <= 800:
+            return 2
+        return 3
+
+    def _build_buckets(self):
+        self.question_buckets = [QuestionBucket() for i in range(4)]
+        for question_id, value in self.progress.items():
+            self.question_buckets[self._bucket_index(value)].add(question_id)
+
+    def _progress_changed(self, question_id, old_value, new_value):
+        super()._progress_changed(question_id, old_value, new_value)
+        if self.question_buckets is None:
+            return
+
+        old_index = None if old_value is None \
+                         else self._bucket_index(old_value)
+        new_index = None if new_value is None \
+                         else self._bucket_index(new_value)
+        if old_index == new_index:
+            return
+
+        if old_index is not None:
+            self.question_buckets[old_index].discard(question_id)
+        if new_index is not None:
+            self.question_buckets[new_index].add(question_id)
+
+    def _progress_replaced(self):
+        super()._progress_replaced()
+        self.question_buckets = None
 
     def _generate_subset(self):
-        question_buffer = [
-            self._shuffle([k for k,v in self.progress.items() if v == 0]),
-            self._shuffle([k for k,v in self.progress.items() if 0   < v <= 400]),
-            self._shuffle([k for k,v in self.progress.items() if 400 < v <= 800]),
-            self._shuffle([k for k,v in self.progress.items() if 800 < v])
-        ]
+        if self.question_buckets is None:
+            self._build_buckets()
+        question_buffer = self.question_buckets
 
         logger.debug(f"Question buffers length are the following "
                      f"{[ len(i) for i in question_buffer]}")
 
         if len(question_buffer[1]) <= 2 * self.SUBSET_SIZE:
-            self.LEARNING_MODE = 0
+            self.learning_mode = 0
         else:
-            self.LEARNING_MODE = random.choice([1, 1, 2, 2, 3])
+            self.learning_mode = random.choice([1, 1, 2, 2, 3])
 
         question_ids = []
         sorted_qb = sorted(range(4),
-                           key=lambda item: abs(self.LEARNING_MODE - item))
-        logger.debug(f"LEARNING_MODE is equal to {self.LEARNING_MODE}")
+                           key=lambda item: abs(self.learning_mode - item))
+        logger.debug(f"LEARNING_MODE is equal to {self.learning_mode}")
         logger.debug(f"Sorted question buffers are equal to {sorted_qb}")
 
         for qb_id in sorted_qb:
-            question_ids += question_buffer[qb_id]
+            question_ids += question_buffer[qb_id].sample(
+                            self.SUBSET_SIZE - len(question_ids))
+
+        return question_ids
+
+
+class CompactProgressQueue(ProgressQueue):
+    """
+        mixin which keeps progress in CompactProgress, use it as
+        the first base class with any ProgressQueue successor:
+
+        class CompactProgressQueueRandom(CompactProgressQueue,
+                                         ProgressQueueRandom):
+            __slots__ = ()
+
+        get_progress() and set_progress() still work with dict
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def for_channel(cls, channel_id):
+        queue_obj = cls()
+        queue_obj.progress = CompactProgress(
+                             get_question_id_table(channel_id))
+        return queue_obj
+
+    def get_progress(self):
+        return dict(self.progress.items())
+
+    def set_progress(self, progress):
+        if isinstance(self.progress, CompactProgress):
+            progress = CompactProgress(self.progress.table, progress)
+        # otherwise queue is created without for_channel()
+        super().set_progress(progress)
+
+
+class CompactProgressQueueRandom(CompactProgressQueue,
+                                 ProgressQueueRandom):
+    __slots__ = ()
+
+
+class CompactProgressQueuePriorityRandom(CompactProgressQueue,
+                                         ProgressQueuePriorityRandom):
+    __slots__ = ()
+
+
+class CompactProgressQueuePriorityRandomLimited(
+        CompactProgressQueue, ProgressQueuePriorityRandomLimited):
+    __slots__ = ()
+
 
-        return question_ids[:self.SUBSET_SIZE]
+class CompactProgressQueueLearnModesAndSubsets(
+        CompactProgressQueue, ProgressQueueLearnModesAndSubsets):
+    __slots__ = ()
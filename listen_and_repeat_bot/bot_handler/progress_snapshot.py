@@ -0,0 +1,383 @@
+import sys
+import mmap
+import struct
+import logging
+from array import array
+from collections.abc import MutableMapping
+
+from json_stream import iterate_json_object, write_json_object
+
+
+"""
+binary snapshot of ProgressDatabase, all integers are little-endian
+
+header:
+    magic "LRPS", version (u16), reserved (u16),
+    amount of users, channels, questions (u32),
+    offsets of user index, user, channel and question tables (u64)
+
+user record (aligned to 4 bytes):
+    current channel index (i32, -1 is None), amount of channels (u32)
+    for every channel:
+        channel index (u32), amount of questions (u32),
+        question indexes (u32 array), progress values (u16 array),
+        padding to 4 bytes
+
+user index:
+    offset of every user record (u64 array, aligned to 8 bytes)
+
+string table:
+    amount of strings (u32), end offsets in blob (u32 array), utf-8 blob
+"""
+
+
+# key of the current channel in ProgressDatabase.export_to_json() format
+CUR_CHANNEL_KEY = "current_channel_id"
+
+MAGIC = b"LRPS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIIQQQQ")
+RECORD_HEADER = struct.Struct("<iI")
+CHANNEL_HEADER = struct.Struct("<II")
+
+
+def _to_bytes(values):
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _read_array(buffer, typecode, offset, amount):
+    values = array(typecode)
+    values.frombytes(buffer[offset:offset + amount * values.itemsize])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _pad(size, alignment):
+    return b"\0" * (-size % alignment)
+
+
+def _pack_strings(strings):
+    encoded = [string.encode("utf-8") for string in strings]
+    ends = array("I")
+    total = 0
+    for item in encoded:
+        total += len(item)
+        ends.append(total)
+    return struct.pack("<I", len(encoded)) + _to_bytes(ends) + \
+           b"".join(encoded)
+
+
+def _unpack_strings(buffer, offset):
+    (amount,) = struct.unpack_from("<I", buffer, offset)
+    ends = _read_array(buffer, "I", offset + 4, amount)
+    start = offset + 4 + 4 * amount
+    size = ends[-1] if amount else 0
+    blob = buffer[start:start + size]
+    if len(ends) != amount or len(blob) != size:
+        raise ValueError("string table is truncated")
+
+    strings = []
+    previous_end = 0
+    for end in ends:
+        strings.append(str(blob[previous_end:end], "utf-8"))
+        previous_end = end
+    return strings
+
+
+def is_snapshot(filename):
+    """
+    function returns:
+        True - file starts with the magic of the binary snapshot
+        False - file is absent or it's in another format (JSON)
+    """
+
+    try:
+        with open(filename, "rb") as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def write_snapshot(users, file):
+    """
+    args:
+        users - iterable of (user_id, user_data) where user_data is
+                in the format of ProgressDatabase.export_to_json()
+        file - binary file obj which supports seek()
+
+    function returns:
+        int - amount of written users
+    """
+
+    interned = [{}, {}, {}]
+    user_ids, channel_ids, question_ids = interned
+
+    def intern(table, string):
+        index = table.get(string)
+        if index is None:
+            index = table[string] = len(table)
+        return index
+
+    file.write(b"\0" * HEADER.size)
+    position = HEADER.size
+    record_offsets = array("Q")
+
+    for user_id, user_data in users:
+        if user_id in user_ids:
+            raise ValueError(f"user_id={user_id} is duplicated")
+        intern(user_ids, user_id)
+        record_offsets.append(position)
+
+        current_channel_id = user_data.get(CUR_CHANNEL_KEY)
+        channels = [(channel_id, progress)
+                    for channel_id, progress in user_data.items()
+                    if channel_id != CUR_CHANNEL_KEY]
+        chunks = [RECORD_HEADER.pack(
+            -1 if current_channel_id is None
+               else intern(channel_ids, current_channel_id),
+            len(channels))]
+
+        for channel_id, progress in channels:
+            indexes = array("I", [intern(question_ids, question_id)
+                                  for question_id in progress])
+            # progress values are between 0-1000
+            values = array("H", progress.values())
+            chunks.append(CHANNEL_HEADER.pack(intern(channel_ids, channel_id),
+                                              len(indexes)))
+            chunks.append(_to_bytes(indexes))
+            chunks.append(_to_bytes(values))
+            chunks.append(_pad(2 * len(values), 4))
+
+        record = b"".join(chunks)
+        file.write(record)
+        position += len(record)
+
+    offsets = []
+    file.write(_pad(position, 8))
+    position += -position % 8
+    for data in [_to_bytes(record_offsets)] + \
+                [_pack_strings(table) for table in interned]:
+        offsets.append(position)
+        file.write(data)
+        position += len(data)
+
+    file.seek(0)
+    file.write(HEADER.pack(MAGIC, VERSION, 0, len(user_ids),
+                           len(channel_ids), len(question_ids), *offsets))
+    file.seek(position)
+    return len(user_ids)
+
+
+
+class ProgressSnapshot():
+    """
+    USAGE:
+        snapshot = ProgressSnapshot("users.db.bin")
+        for user_id in snapshot.user_ids:
+            user_data = snapshot.read_user(user_id)
+
+    the file is mapped to memory, only its header, user index and
+    string tables are read on open, user records are decoded
+    on read_user(), the file can be replaced while it's open
+    """
+
+    def __init__(self, filename):
+        self.logger = logging.getLogger(__name__)
+
+        self.filename = filename
+        with open(filename, "rb") as file:
+            self.__mmap = mmap.mmap(file.fileno(), 0,
+                                    access=mmap.ACCESS_READ)
+
+        try:
+            magic, version, _, users, channels, questions, \
+                index_offset, users_offset, channels_offset, \
+                questions_offset = HEADER.unpack_from(self.__mmap, 0)
+        except struct.error as exc:
+            self.close()
+            raise ValueError(f"{filename} is too short "
+                             f"for a snapshot") from exc
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{filename} is not a snapshot "
+                             f"of version {VERSION}")
+
+        try:
+            self.user_ids = _unpack_strings(self.__mmap, users_offset)
+            self.channel_ids = _unpack_strings(self.__mmap, channels_offset)
+            self.question_ids = _unpack_strings(self.__mmap,
+                                                questions_offset)
+            record_offsets = _read_array(self.__mmap, "Q",
+                                         index_offset, users)
+        except (struct.error, ValueError) as exc:
+            self.close()
+            raise ValueError(f"{filename} is a corrupted snapshot") from exc
+
+        # a truncated file has shorter tables than the header says
+        if [len(self.user_ids), len(self.channel_ids),
+                len(self.question_ids), len(record_offsets)] != \
+                [users, channels, questions, users] or \
+                len(set(self.user_ids)) != users:
+            self.close()
+            raise ValueError(f"{filename} is a corrupted snapshot, "
+                             f"its tables don't match the header")
+        self.__offsets = dict(zip(self.user_ids, record_offsets))
+
+
+    def close(self):
+        self.__mmap.close()
+
+
+    def __len__(self):
+        return len(self.user_ids)
+
+
+    def __contains__(self, user_id):
+        return user_id in self.__offsets
+
+
+    def read_user(self, user_id):
+        """
+        function returns:
+            dict - user_data in the format of
+                   ProgressDatabase.export_to_json()
+        raises:
+            KeyError - user_id is absent in the snapshot
+        """
+
+        buffer = self.__mmap
+        position = self.__offsets[user_id]
+        current_channel, channels = RECORD_HEADER.unpack_from(buffer,
+                                                              position)
+        position += RECORD_HEADER.size
+
+        user_data = {
+            CUR_CHANNEL_KEY: None if current_channel < 0
+                             else self.channel_ids[current_channel]
+        }
+        question_ids = self.question_ids
+        for _ in range(channels):
+            channel, amount = CHANNEL_HEADER.unpack_from(buffer, position)
+            position += CHANNEL_HEADER.size
+            indexes = _read_array(buffer, "I", position, amount)
+            position += 4 * amount
+            values = _read_array(buffer, "H", position, amount)
+            position += 2 * amount + (-2 * amount % 4)
+
+            user_data[self.channel_ids[channel]] = {
+                question_ids[index]: value
+                for index, value in zip(indexes, values)
+            }
+        return user_data
+
+
+    def iterate_users(self):
+        for user_id in self.user_ids:
+            yield (user_id, self.read_user(user_id))
+
+
+
+class SnapshotUsers(MutableMapping):
+    """
+    USAGE:
+        progress_db.progress_db = SnapshotUsers(snapshot, load_user)
+
+    users mapping of ProgressDatabase which loads a user of
+    the snapshot on the first access by load_user(user_id, user_data),
+    load_user should put the converted user to the mapping,
+    users which have never been accessed are not converted at all
+    """
+
+    def __init__(self, snapshot, load_user):
+        self.snapshot = snapshot
+        self.load_user = load_user
+
+        self.loaded = {}
+        self.unloaded = set(snapshot.user_ids)
+
+
+    def __getitem__(self, user_id):
+        if user_id in self.unloaded:
+            self.load_user(user_id, self.snapshot.read_user(user_id))
+        return self.loaded[user_id]
+
+
+    def __setitem__(self, user_id, value):
+        self.unloaded.discard(user_id)
+        self.loaded[user_id] = value
+
+
+    def __delitem__(self, user_id):
+        if user_id in self.unloaded:
+            self.unloaded.discard(user_id)
+        else:
+            del self.loaded[user_id]
+
+
+    def __contains__(self, user_id):
+        return user_id in self.loaded or user_id in self.unloaded
+
+
+    def __iter__(self):
+        yield from list(self.loaded)
+        yield from list(self.unloaded)
+
+
+    def __len__(self):
+        return len(self.loaded) + len(self.unloaded)
+
+
+    def get_unloaded(self, user_id):
+        """
+        function returns:
+            dict - user_data of a user which has not been loaded yet
+            None - user is loaded or absent
+        """
+
+        if user_id not in self.unloaded:
+            return None
+        return self.snapshot.read_user(user_id)
+
+
+def json_to_snapshot(json_filename, snapshot_filename):
+    """
+    function returns:
+        int - amount of converted users
+    """
+
+    with open(json_filename, "r") as json_file, \
+         open(snapshot_filename, "wb") as snapshot_file:
+        return write_snapshot(iterate_json_object(json_file), snapshot_file)
+
+
+def snapshot_to_json(snapshot_filename, json_filename):
+    """
+    function returns:
+        int - amount of converted users
+    """
+
+    snapshot = ProgressSnapshot(snapshot_filename)
+    try:
+        with open(json_filename, "w") as json_file:
+            return write_json_object(snapshot.iterate_users(), json_file)
+    finally:
+        snapshot.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ["to-binary", "to-json"]:
+        print("USAGE:\n"
+              "    python3 progress_snapshot.py to-binary "
+              "users.db.json users.db.bin\n"
+              "    python3 progress_snapshot.py to-json "
+              "users.db.bin users.db.json")
+        sys.exit(1)
+
+    convert = json_to_snapshot if sys.argv[1] == "to-binary" \
+              else snapshot_to_json
+    print(f"{convert(sys.argv[2], sys.argv[3])} users are converted")
@@ -17,17 +17,24 @@ class QuestionDatabase():
                 question_id: {
                     question: value (str),
                     answers: value (set),
-                    examples: value (list)
+                    examples: value (list),
+                    post_id: value (int), optional
                 }
             }
+            post_ids: {
+                post_id (str): question_id
+            }
         }
     }
     """
     QUESTIONS_KEY = "questions"
+    POST_IDS_KEY = "post_ids"
 
     def __init__(self):
         self.question_db = {}
         self.logger = logging.getLogger(__name__)
+        # channels which are shared with the database copied by copy()
+        self.__shared_channels = set()
 
 
     def create_channel(self, channel_id):
@@ -56,6 +63,7 @@ class QuestionDatabase():
 
         if channel_id in self.question_db:
             self.question_db.pop(channel_id)
+            self.__shared_channels.discard(channel_id)
             return True
         else:
             return False
@@ -65,8 +73,8 @@ class QuestionDatabase():
         """
         args:
             channel_id
-            posts - list of messages (str),
-                    example: ["hello\nworld", "test"]
+            posts - list of parsed messages (dict), question_id key
+                    is used if presented, otherwise it's generated
 
         returns:
             False - channel_id is not presented in database,
@@ -79,6 +87,7 @@ class QuestionDatabase():
                               f"presented in database")
             return False
 
+        channel = self._get_writable_channel(channel_id)
         for post in posts:
             question = post["question"]
             answers = post["answers"]
@@ -86,20 +95,76 @@ class QuestionDatabase():
 
             # generate id from question, so question can't be duplicated in db
             try:
-                question_id = hashlib.sha1(
-                                    question.encode("utf-8")).hexdigest()
+                question_id = post.get("question_id") or \
+                              self.generate_question_id(question)
             except Exception as e:
                 self.logger.exception(f"Can't generate hash for "
                                       f"channel_id={channel_id} "
                                       f"question={question} due to {e}")
                 continue
 
-            self.question_db[channel_id]\
-                            [self.QUESTIONS_KEY][question_id] = {**post}
+            channel[self.QUESTIONS_KEY][question_id] = {**post}
+
+            if post.get("post_id") is not None:
+                channel.setdefault(self.POST_IDS_KEY, {})\
+                       [str(post["post_id"])] = question_id
 
         return True
 
 
+    def apply_channel_delta(self, channel_id, posts, deleted_post_ids):
+        """
+        args:
+            channel_id
+            posts - list of added or edited parsed posts,
+                    every post should have "post_id" key
+            deleted_post_ids - list of post ids (int) which were deleted
+
+        returns:
+            False - channel_id is not presented in database,
+                    should create it first
+            True - if questions were updated
+        """
+
+        if channel_id not in self.question_db:
+            self.logger.error(f"channel_id={channel_id} is not "
+                              f"presented in database")
+            return False
+
+        channel = self._get_writable_channel(channel_id)
+        questions = channel[self.QUESTIONS_KEY]
+        post_ids = channel.setdefault(self.POST_IDS_KEY, {})
+
+        # edited post might have changed its question,
+        # so question_id of the edited post has to be removed as well
+        removed_question_ids = set()
+        for post_id in [*deleted_post_ids,
+                        *[post["post_id"] for post in posts]]:
+            question_id = post_ids.pop(str(post_id), None)
+            if question_id is not None:
+                removed_question_ids.add(question_id)
+
+        if removed_question_ids:
+            # the same question might be published by other posts,
+            # it's removed only when none of them is left
+            published_question_ids = set(post_ids.values())
+            for question_id in removed_question_ids - published_question_ids:
+                questions.pop(question_id, None)
+
+        return self.update_channel_posts(channel_id, posts)
+
+
+    def has_question(self, channel_id, question_id):
+        if channel_id not in self.question_db:
+            return False
+        return question_id in self.question_db[channel_id][self.QUESTIONS_KEY]
+
+
+    @staticmethod
+    def generate_question_id(question):
+        return hashlib.sha1(question.encode("utf-8")).hexdigest()
+
+
     def get_question_ids(self, channel_id):
         return list(self.question_db[channel_id][self.QUESTIONS_KEY].keys())
 
@@ -109,7 +174,10 @@ class QuestionDatabase():
 
 
     def set_channel_metadata(self, channel_id, key, value):
-        self.question_db[channel_id][key] = value
+        channel = self.question_db[channel_id]
+        # unchanged metadata doesn't copy a shared channel
+        if key not in channel or channel[key] != value:
+            self._get_writable_channel(channel_id)[key] = value
 
 
     def get_channel_metadata(self, channel_id, key):
@@ -119,6 +187,40 @@ class QuestionDatabase():
             return None
 
 
+    def copy(self):
+        """
+        returns:
+            QuestionDatabase obj - independent copy of the database,
+                                   changing it doesn't affect the original
+
+        channels are copied on write, so the copy costs O(channels)
+        and updating a channel costs O(questions of the channel)
+        """
+
+        duplicated = QuestionDatabase()
+        duplicated.question_db = dict(self.question_db)
+        duplicated.__shared_channels = set(self.question_db)
+        return duplicated
+
+
+    def _get_writable_channel(self, channel_id):
+        """
+        function returns:
+            dict - channel_id which isn't shared with other databases
+        """
+
+        if channel_id in self.__shared_channels:
+            self.__shared_channels.discard(channel_id)
+            # entries of questions are replaced, never changed in place,
+            # so containers of the channel are enough to copy
+            channel = dict(self.question_db[channel_id])
+            for key in [self.QUESTIONS_KEY, self.POST_IDS_KEY]:
+                if key in channel:
+                    channel[key] = dict(channel[key])
+            self.question_db[channel_id] = channel
+        return self.question_db[channel_id]
+
+
     def list_all_channels(self):
         return list(self.question_db.keys())
 
@@ -130,6 +232,7 @@ class QuestionDatabase():
     def import_from_json(self, data):
         try:
             self.question_db = json.loads(data)
+            self.__shared_channels = set()
             return True
         except JSONDecodeError as exc:
             self.logger.exception("Failed to load question_db from JSON")
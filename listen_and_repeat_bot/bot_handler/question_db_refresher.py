@@ -0,0 +1,189 @@
+import logging
+import threading
+
+
+
+class QuestionDatabaseRefresher():
+    """
+    USAGE:
+        refresher = QuestionDatabaseRefresher(update_func, interval=60,
+                                              after_refresh=save_func)
+        refresher.publish(QuestionDatabase())
+        refresher.start()
+
+        # in handlers, never blocks on network or disk
+        question_db = refresher.get_question_db()
+
+        # indexes are derived from question_db once per version
+        refresher.register_index("answers", build_answers_index)
+        question_db, indexes = refresher.get_snapshot()
+
+    update_func(question_db) is called in a background thread
+    with the latest published snapshot and should return:
+        QuestionDatabase obj - a new snapshot to publish
+        None                 - nothing has changed, keep current snapshot
+
+    update_func must not modify the snapshot it receives,
+    handlers may be reading it at the same time
+
+    after_refresh() is called in the same thread after every
+    refresh attempt, whether a new snapshot was published or not
+
+    on_publish(question_db, version) is called after every publish()
+    """
+
+    def __init__(self, update_func, interval,
+                 after_refresh=None, on_publish=None):
+        self.logger = logging.getLogger(__name__)
+
+        self.update_func = update_func
+        self.after_refresh = after_refresh
+        self.on_publish = on_publish
+        self.interval = interval
+
+        self.__lock = threading.Lock()
+        # (question_db, indexes) are replaced at once
+        self.__snapshot = (None, {})
+        self.__index_builders = {}
+        self.__version = 0
+
+        self.__triggered = threading.Event()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+
+    def start(self):
+        """
+        function returns:
+            True - background thread is started
+            False - background thread is already running
+        """
+
+        if self.__thread is not None and self.__thread.is_alive():
+            return False
+
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self._run,
+                                         name="question-db-refresher",
+                                         daemon=True)
+        self.__thread.start()
+        return True
+
+
+    def stop(self, timeout=None):
+        self.__stopped.set()
+        self.__triggered.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+
+    def trigger(self):
+        """
+        request a refresh without waiting for the interval,
+        returns immediately
+        """
+        self.__triggered.set()
+
+
+    def refresh(self):
+        """
+        run update_func synchronously in the calling thread
+
+        function returns:
+            True - a new snapshot was published
+            False - nothing has changed or update_func failed
+        """
+
+        try:
+            question_db = self.update_func(self.get_question_db())
+            if question_db is not None:
+                self.publish(question_db)
+        except Exception as exc:
+            self.logger.exception("Failed to refresh question_db "
+                                  "due to %s", exc)
+            question_db = None
+
+        if self.after_refresh is not None:
+            try:
+                self.after_refresh()
+            except Exception as exc:
+                self.logger.exception("after_refresh failed due to %s", exc)
+
+        return question_db is not None
+
+
+    def register_index(self, name, builder):
+        """
+        args:
+            name (str) - name to get the index by
+            builder - function which accepts question_db and returns
+                      an index, it's called for every published version
+
+        the index is built for the current snapshot immediately
+        """
+
+        with self.__lock:
+            self.__index_builders[name] = builder
+            question_db, indexes = self.__snapshot
+            if question_db is not None:
+                self.__snapshot = (question_db,
+                                   {**indexes, name: builder(question_db)})
+
+
+    def publish(self, question_db):
+        """
+        atomically replace the snapshot returned to handlers,
+        indexes are built before the snapshot is replaced
+
+        function returns:
+            int - version of the published snapshot
+        """
+
+        indexes = {
+            name: builder(question_db)
+            for name, builder in list(self.__index_builders.items())
+        }
+
+        with self.__lock:
+            self.__snapshot = (question_db, indexes)
+            self.__version += 1
+            version = self.__version
+            self.logger.info("question_db version=%s is published",
+                             version)
+
+        if self.on_publish is not None:
+            self.on_publish(question_db, version)
+        return version
+
+
+    def get_question_db(self):
+        return self.__snapshot[0]
+
+
+    def get_snapshot(self):
+        """
+        function returns a tuple:
+            (question_db, indexes) - the latest published question_db
+                                     and dict of indexes built from it
+        """
+
+        return self.__snapshot
+
+
+    def get_index(self, name):
+        return self.__snapshot[1].get(name)
+
+
+    def get_version(self):
+        return self.__version
+
+
+    def _run(self):
+        while not self.__stopped.is_set():
+            self.__triggered.wait(self.interval)
+            self.__triggered.clear()
+
+            if self.__stopped.is_set():
+                break
+
+            self.refresh()
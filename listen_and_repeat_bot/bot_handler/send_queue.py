@@ -0,0 +1,293 @@
+import time
+import heapq
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+
+class TokenBucket():
+    """
+    USAGE:
+        bucket = TokenBucket(rate=30, capacity=30)
+        delay = bucket.get_delay(now)
+        if delay == 0:
+            bucket.take(now)
+
+    <rate> tokens are added per second up to <capacity>,
+    the class is not thread safe, the owner should lock it
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+
+    def _refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens +
+                              (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+
+    def get_delay(self, now):
+        """
+        function returns:
+            float - seconds to wait for one token, 0 if it's available
+        """
+
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+
+class SendQueue():
+    """
+    USAGE:
+        send_queue = SendQueue(workers=4, global_rate=30, chat_rate=1)
+        send_queue.start()
+
+        # returns immediately, the message is sent by a worker
+        future = send_queue.send(chat_id, update.message.reply_text,
+                                 "text", parse_mode=ParseMode.HTML)
+
+        send_queue.stop()   # waits for queued messages
+
+    requests of one chat are sent one by one in order of submission,
+    a request is sent when both the chat and the global token buckets
+    have a token, so bursts are spread instead of being rejected
+
+    a request failed with an exception which has retry_after
+    attribute (telegram.error.RetryAfter) pauses its chat for
+    retry_after seconds and is sent again, at most max_retries times
+    """
+
+    LATENCY_WINDOW = 1000
+    # idle chats with full buckets are forgotten above this amount
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, workers=4, global_rate=30, chat_rate=1,
+                 chat_burst=3, max_retries=3):
+        self.logger = logging.getLogger(__name__)
+
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self.__executor = ThreadPoolExecutor(max_workers=workers,
+                                             thread_name_prefix="sender")
+        self.__condition = threading.Condition()
+        # chat_id: deque of [future, func, args, kwargs, enqueued_at, tries]
+        self.__chats = {}
+        self.__chat_buckets = {}
+        self.__prune_at = self.MAX_CHAT_BUCKETS
+        # chat_id: monotonic time until which the chat is paused
+        self.__paused_until = {}
+        # (time when the chat is ready, sequence, chat_id) of idle chats
+        self.__ready = []
+        self.__sequence = 0
+        self.__stopped = False
+        self.__thread = None
+
+        self.__sent = 0
+        self.__failed = 0
+        self.__retried = 0
+        self.__latencies = deque(maxlen=self.LATENCY_WINDOW)
+
+
+    def start(self):
+        """
+        function returns:
+            True - scheduler is started
+            False - scheduler is already running
+        """
+
+        if self.__thread is not None and self.__thread.is_alive():
+            return False
+
+        self.__stopped = False
+        self.__thread = threading.Thread(target=self._run,
+                                         name="send-queue",
+                                         daemon=True)
+        self.__thread.start()
+        return True
+
+
+    def stop(self, timeout=None):
+        """
+        send queued requests and stop the scheduler and workers
+        """
+
+        with self.__condition:
+            self.__condition.wait_for(lambda: not self.__chats, timeout)
+            self.__stopped = True
+            self.__condition.notify_all()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+        self.__executor.shutdown(wait=True)
+
+
+    def send(self, chat_id, func, *args, **kwargs):
+        """
+        function returns:
+            concurrent.futures.Future obj with result of func
+        """
+
+        future = Future()
+        with self.__condition:
+            tasks = self.__chats.get(chat_id)
+            task = [future, func, args, kwargs, time.monotonic(), 0]
+            if tasks is None:
+                self.__chats[chat_id] = deque([task])
+                self._schedule(chat_id, time.monotonic())
+            else:
+                tasks.append(task)
+            self.__condition.notify_all()
+        return future
+
+
+    def get_queue_depth(self):
+        """
+        function returns:
+            int - amount of requests which are waiting or being sent
+        """
+
+        with self.__condition:
+            return sum(len(tasks) for tasks in self.__chats.values())
+
+
+    def get_stats(self):
+        """
+        function returns:
+            dict with queue_depth, sent, failed, retried counters
+            and latency_avg, latency_p95 - seconds from send()
+            to the response for the last LATENCY_WINDOW requests
+        """
+
+        with self.__condition:
+            latencies = sorted(self.__latencies)
+            stats = {
+                "queue_depth": sum(len(tasks)
+                                   for tasks in self.__chats.values()),
+                "sent": self.__sent,
+                "failed": self.__failed,
+                "retried": self.__retried,
+                "latency_avg": 0.0,
+                "latency_p95": 0.0
+            }
+        if latencies:
+            stats["latency_avg"] = sum(latencies) / len(latencies)
+            stats["latency_p95"] = latencies[int(0.95 * (len(latencies) - 1))]
+        return stats
+
+
+    def _schedule(self, chat_id, not_before):
+        # self.__condition should be acquired by the caller
+        self.__sequence += 1
+        ready_at = max(not_before, self.__paused_until.get(chat_id, 0))
+        heapq.heappush(self.__ready, (ready_at, self.__sequence, chat_id))
+
+
+    def _get_chat_bucket(self, chat_id):
+        bucket = self.__chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.__chat_buckets[chat_id] = bucket
+        return bucket
+
+
+    def _prune_chat_buckets(self, now):
+        # self.__condition should be acquired by the caller
+        for chat_id, bucket in list(self.__chat_buckets.items()):
+            bucket.get_delay(now)
+            # full bucket of an idle chat is the same as a new one
+            if chat_id not in self.__chats and \
+                    bucket.tokens >= bucket.capacity:
+                self.__chat_buckets.pop(chat_id)
+        # amortize pruning when most buckets are still refilling
+        self.__prune_at = max(self.MAX_CHAT_BUCKETS,
+                              2 * len(self.__chat_buckets))
+
+
+    def _run(self):
+        with self.__condition:
+            while not self.__stopped:
+                if not self.__ready:
+                    self.__condition.wait()
+                    continue
+
+                now = time.monotonic()
+                ready_at, _, chat_id = self.__ready[0]
+                if ready_at > now:
+                    self.__condition.wait(ready_at - now)
+                    continue
+
+                delay = max(self._get_chat_bucket(chat_id).get_delay(now),
+                            self.global_bucket.get_delay(now))
+                heapq.heappop(self.__ready)
+                if delay > 0:
+                    self._schedule(chat_id, now + delay)
+                    continue
+
+                self._get_chat_bucket(chat_id).take(now)
+                self.global_bucket.take(now)
+                task = self.__chats[chat_id][0]
+                self.__executor.submit(self._send, chat_id, task)
+
+
+    def _send(self, chat_id, task):
+        future, func, args, kwargs, enqueued_at, tries = task
+        result = exception = None
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            exception = exc
+
+        retry_after = getattr(exception, "retry_after", None)
+        with self.__condition:
+            now = time.monotonic()
+            if retry_after is not None and tries < self.max_retries:
+                # keep the task at the head of the chat queue
+                task[5] += 1
+                self.__retried += 1
+                self.__paused_until[chat_id] = now + float(retry_after)
+                self.logger.warning("Chat %s is paused for %s seconds",
+                                    chat_id, retry_after)
+                self._schedule(chat_id, now)
+                self.__condition.notify_all()
+                return
+
+            tasks = self.__chats[chat_id]
+            tasks.popleft()
+            if tasks:
+                self._schedule(chat_id, now)
+            else:
+                self.__chats.pop(chat_id)
+                self.__paused_until.pop(chat_id, None)
+                if len(self.__chat_buckets) > self.__prune_at:
+                    self._prune_chat_buckets(now)
+
+            self.__latencies.append(now - enqueued_at)
+            if exception is None:
+                self.__sent += 1
+            else:
+                self.__failed += 1
+            self.__condition.notify_all()
+
+        if exception is None:
+            future.set_result(result)
+        else:
+            self.logger.error("Failed to send to chat %s due to %s",
+                              chat_id, exception)
+            future.set_exception(exception)
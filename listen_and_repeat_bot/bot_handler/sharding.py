@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import zlib
+import signal
+import logging
+import threading
+from urllib import request, error
+
+from concurrency import KeyedExecutor
+from webhook_server import WebhookServer
+
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.getLevelName(os.environ.get("LOGLEVEL", "WARNING"))
+)
+logger = logging.getLogger(__name__)
+
+
+# update types which don't have a user are sent to shard 0
+UPDATE_USER_PATHS = [
+    ("message", "from"),
+    ("edited_message", "from"),
+    ("callback_query", "from"),
+    ("inline_query", "from"),
+    ("chosen_inline_result", "from"),
+    ("my_chat_member", "from"),
+    ("chat_member", "from"),
+    ("chat_join_request", "from"),
+    ("poll_answer", "user")
+]
+
+
+def get_shard(user_id, shard_count):
+    """
+    function returns:
+        int - shard index of user_id in range(shard_count),
+              the same for every process and restart
+    """
+
+    return zlib.crc32(str(user_id).encode("utf-8")) % shard_count
+
+
+def shard_filename(filename, shard_index, shard_count):
+    """
+    function returns:
+        str - filename of the shard's own copy of a database file,
+              filename itself if sharding is not used
+    """
+
+    if shard_count <= 1:
+        return filename
+    return f"{filename}.shard{shard_index}"
+
+
+def get_update_user_id(data):
+    """
+    function returns:
+        int - id of the user who has sent the update (raw JSON dict)
+        None - the update doesn't have a user
+    """
+
+    for update_type, user_key in UPDATE_USER_PATHS:
+        user = data.get(update_type, {}).get(user_key)
+        if user is not None:
+            return user.get("id")
+    return None
+
+
+
+class ShardRouter():
+    """
+    USAGE:
+        shard_router = ShardRouter(["http://shard0:8443/webhook",
+                                    "http://shard1:8443/webhook"],
+                                   secret_token="shard-secret")
+        shard_router.start()
+        shard_router.route(update_data)
+
+    front dispatcher which forwards raw updates to bot_handler shards
+    (BOT_MODE=shard) by a stable hash of user_id, updates of one shard
+    are forwarded one by one, so the order of updates of every user
+    is kept
+
+    a failed forward is retried with a backoff capped by
+    max_retry_delay until the shard accepts it, only updates rejected
+    with 4xx are dropped, at most max_backlog updates of a shard
+    wait to be forwarded, route() blocks while the backlog is full,
+    so a shard which is down stops polling instead of piling up updates
+    """
+
+    def __init__(self, shard_urls, secret_token, max_backlog=1000,
+                 retry_delay=1.0, max_retry_delay=30.0, timeout=10):
+        self.logger = logging.getLogger(__name__)
+
+        self.shard_urls = shard_urls
+        self.secret_token = secret_token
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.timeout = timeout
+
+        self.forwarded = [0] * len(shard_urls)
+        self.dropped = [0] * len(shard_urls)
+        self.__backlogs = [threading.Semaphore(max_backlog)
+                           for shard_url in shard_urls]
+        self.__lock = threading.Lock()
+        # update_id of updates which are routed but not forwarded yet
+        self.__undelivered = set()
+        self.__stopped = threading.Event()
+        # one worker per shard, forwards of a shard are never reordered
+        self.__executor = KeyedExecutor(workers=len(shard_urls),
+                                        name="shard-router")
+
+
+    def start(self):
+        self.__stopped.clear()
+        return self.__executor.start()
+
+
+    def stop(self, timeout=None):
+        """
+        updates which are still queued are tried once more,
+        failed ones are left undelivered instead of being retried
+        """
+
+        self.__stopped.set()
+        self.__executor.stop(timeout)
+
+
+    def route(self, data):
+        """
+        queue update to be forwarded to its shard,
+        blocks while the backlog of the shard is full
+
+        function returns:
+            int - shard index of the update
+        """
+
+        user_id = get_update_user_id(data)
+        shard_index = 0 if user_id is None \
+                      else get_shard(user_id, len(self.shard_urls))
+
+        self.__backlogs[shard_index].acquire()
+        if "update_id" in data:
+            with self.__lock:
+                self.__undelivered.add(data["update_id"])
+        self.__executor.submit(shard_index, self._forward, shard_index, data)
+        return shard_index
+
+
+    def get_undelivered_update_id(self):
+        """
+        function returns:
+            int - the lowest update_id which is not forwarded yet,
+                  getUpdates offset must not be moved past it
+            None - every routed update is forwarded or dropped
+        """
+
+        with self.__lock:
+            return min(self.__undelivered, default=None)
+
+
+    def _forward(self, shard_index, data):
+        try:
+            return self._send(shard_index, data)
+        finally:
+            with self.__lock:
+                self.__undelivered.discard(data.get("update_id"))
+            self.__backlogs[shard_index].release()
+
+
+    def _send(self, shard_index, data):
+        body = json.dumps(data).encode("utf-8")
+        attempt = 0
+        while True:
+            req = request.Request(
+                self.shard_urls[shard_index], data=body, method="POST",
+                headers={
+                    "Content-Type": "application/json",
+                    WebhookServer.SECRET_TOKEN_HEADER: self.secret_token
+                })
+            try:
+                with request.urlopen(req, timeout=self.timeout):
+                    self.forwarded[shard_index] += 1
+                    return True
+            except error.HTTPError as exc:
+                if 400 <= exc.code < 500:
+                    # shard will never accept the update
+                    self.logger.error("Shard %s rejected update %s with %s",
+                                      shard_index, data.get("update_id"),
+                                      exc.code)
+                    self.dropped[shard_index] += 1
+                    return False
+                self.logger.warning("Shard %s answered %s",
+                                    shard_index, exc.code)
+            except (error.URLError, OSError) as exc:
+                self.logger.warning("Cannot forward update to shard %s "
+                                    "due to %s", shard_index, exc)
+
+            delay = min(self.retry_delay * 2 ** min(attempt, 16),
+                        self.max_retry_delay)
+            attempt += 1
+            if self.__stopped.wait(delay):
+                self.logger.error("Leave update %s of shard %s "
+                                  "undelivered on stop",
+                                  data.get("update_id"), shard_index)
+                return False
+
+
+def poll_updates(api_url, on_update, stopped, timeout=30,
+                 get_undelivered_update_id=None):
+    """
+    call on_update(data) for every update received by getUpdates
+    until stopped (threading.Event) is set
+
+    args:
+        api_url - https://api.telegram.org/bot<token>
+        get_undelivered_update_id() - returns the lowest update_id
+            which is not handled yet or None, such updates are not
+            confirmed, so Telegram keeps them if the process is stopped
+    """
+
+    # next update_id to pass to on_update
+    offset = 0
+    while not stopped.is_set():
+        confirmed_offset = offset
+        if get_undelivered_update_id is not None:
+            undelivered = get_undelivered_update_id()
+            if undelivered is not None:
+                confirmed_offset = min(offset, undelivered)
+
+        url = f"{api_url}/getUpdates?timeout={timeout}" \
+              f"&offset={confirmed_offset}"
+        try:
+            with request.urlopen(url, timeout=timeout + 10) as response:
+                updates = json.loads(response.read())["result"]
+        except (error.URLError, OSError, ValueError, KeyError) as exc:
+            logger.warning("getUpdates failed due to %s", exc)
+            stopped.wait(1)
+            continue
+
+        new_updates = [data for data in updates
+                       if data["update_id"] >= offset]
+        for data in new_updates:
+            on_update(data)
+            offset = data["update_id"] + 1
+        if updates and not new_updates:
+            # only unconfirmed updates are returned without long polling
+            stopped.wait(1)
+
+
+if __name__ == "__main__":
+    api_key = os.environ.get("BOT_API_KEY", None)
+    telegram_api_url = os.environ.get("TELEGRAM_API_URL",
+                                      "https://api.telegram.org/bot")
+    shard_urls = [url.strip() for url in
+                  os.environ.get("SHARD_URLS", "").split(",") if url.strip()]
+    shard_secret_token = os.environ.get("SHARD_SECRET_TOKEN", None)
+    # polling - the router calls getUpdates,
+    # webhook - Telegram sends updates to the router
+    router_mode = os.environ.get("BOT_MODE", "polling")
+
+    if api_key is None:
+        print("specify BOT_API_KEY variable")
+        sys.exit(1)
+
+    if not shard_urls or shard_secret_token is None:
+        print("specify SHARD_URLS and SHARD_SECRET_TOKEN variables")
+        sys.exit(1)
+
+    shard_router = ShardRouter(shard_urls, shard_secret_token)
+    shard_router.start()
+
+    stopped = threading.Event()
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        signal.signal(signum, lambda signum, frame: stopped.set())
+
+    api_url = f"{telegram_api_url}{api_key}"
+    if router_mode == "webhook":
+        webhook_server = WebhookServer(
+            on_update=shard_router.route,
+            secret_token=os.environ["WEBHOOK_SECRET_TOKEN"],
+            listen=os.environ.get("WEBHOOK_LISTEN", "0.0.0.0"),
+            port=int(os.environ.get("WEBHOOK_PORT", 8443)),
+            url_path=os.environ.get("WEBHOOK_PATH", "/webhook"))
+        webhook_server.start()
+        request.urlopen(request.Request(
+            f"{api_url}/setWebhook",
+            data=json.dumps({
+                "url": os.environ["WEBHOOK_URL"],
+                "secret_token": os.environ["WEBHOOK_SECRET_TOKEN"]
+            }).encode("utf-8"),
+            headers={"Content-Type": "application/json"}))
+        stopped.wait()
+        webhook_server.stop()
+    else:
+        request.urlopen(f"{api_url}/deleteWebhook")
+        poll_updates(api_url, shard_router.route, stopped,
+                     get_undelivered_update_id=(
+                         shard_router.get_undelivered_update_id))
+
+    shard_router.stop()
@@ -0,0 +1,202 @@
+import os
+import time
+import logging
+import threading
+
+
+
+class SnapshotWriter():
+    """
+    USAGE:
+        snapshot_writer = SnapshotWriter(delay=5)
+        snapshot_writer.register("questions", get_question_db,
+                                 "questions.db.json")
+        snapshot_writer.start()
+
+        # returns immediately, the file is written in background
+        snapshot_writer.mark_dirty("questions")
+
+    get_obj() should return an object with export_to_json() method,
+    it's called at the moment of writing, so the latest version is saved,
+    export_to_file(file) is used instead if the object has it,
+    so the snapshot is streamed without one big string in memory,
+    databases registered with binary=True are written by
+    export_to_snapshot(file) to a binary file
+
+    databases marked dirty within <delay> seconds are written once,
+    every file is written to a temporary file and atomically
+    replaced by os.replace(), so a crash never leaves a broken file
+    """
+
+    def __init__(self, delay=5.0):
+        self.logger = logging.getLogger(__name__)
+
+        self.delay = delay
+
+        self.__lock = threading.Lock()
+        self.__write_lock = threading.Lock()
+        self.__databases = {}
+        self.__dirty = {}
+        self.__bytes_written = {}
+
+        self.__wakeup = threading.Event()
+        self.__stopped = threading.Event()
+        self.__thread = None
+
+
+    def register(self, name, get_obj, filename, binary=False):
+        with self.__lock:
+            self.__databases[name] = (get_obj, filename, binary)
+
+
+    def start(self):
+        """
+        function returns:
+            True - background writer is started
+            False - background writer is already running
+        """
+
+        if self.__thread is not None and self.__thread.is_alive():
+            return False
+
+        self.__stopped.clear()
+        self.__thread = threading.Thread(target=self._run,
+                                         name="snapshot-writer",
+                                         daemon=True)
+        self.__thread.start()
+        return True
+
+
+    def stop(self, timeout=None):
+        """
+        stop background writer and write all dirty databases
+        """
+
+        self.__stopped.set()
+        self.__wakeup.set()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+        self.flush()
+
+
+    def mark_dirty(self, name):
+        with self.__lock:
+            if name not in self.__databases:
+                raise KeyError(name)
+            # keep the time of the first change to bound the delay
+            self.__dirty.setdefault(name, time.monotonic())
+        self.__wakeup.set()
+
+
+    def is_dirty(self, name):
+        with self.__lock:
+            return name in self.__dirty
+
+
+    def get_bytes_written(self, name):
+        """
+        function returns:
+            int - size of the last written snapshot of <name>
+            None - <name> has not been written yet
+        """
+
+        return self.__bytes_written.get(name)
+
+
+    def flush(self):
+        """
+        synchronously write all dirty databases
+
+        function returns:
+            list of names which were written
+        """
+
+        with self.__lock:
+            names = list(self.__dirty)
+        return [name for name in names if self.write_now(name)]
+
+
+    def write_now(self, name):
+        """
+        synchronously write database <name> whether it's dirty or not
+
+        function returns:
+            True - snapshot is written
+            False - failed to write snapshot, it's kept dirty
+        """
+
+        with self.__lock:
+            get_obj, filename, binary = self.__databases[name]
+            self.__dirty.pop(name, None)
+
+        # the same file should not be written by two threads at once
+        with self.__write_lock:
+            try:
+                obj = get_obj()
+                if binary:
+                    size = self._write_atomically(filename,
+                                                  obj.export_to_snapshot,
+                                                  binary=True)
+                elif hasattr(obj, "export_to_file"):
+                    size = self._write_atomically(filename,
+                                                  obj.export_to_file)
+                else:
+                    data = obj.export_to_json()
+                    size = self._write_atomically(
+                           filename, lambda file: file.write(data))
+            except Exception as exc:
+                self.logger.exception("Failed to save %s to %s due to %s",
+                                      name, filename, exc)
+                with self.__lock:
+                    self.__dirty.setdefault(name, time.monotonic())
+                return False
+
+        self.__bytes_written[name] = size
+        self.logger.info("saved %s bytes to %s", size, filename)
+        return True
+
+
+    def _write_atomically(self, filename, write, binary=False):
+        """
+        args:
+            write(file) - function which writes to a text file obj
+                          or to a binary one if binary is True
+
+        function returns:
+            int - size of the written file
+        """
+
+        # temporary files are per process, so two processes never share one
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_filename, "wb" if binary else "w",
+                      encoding=None if binary else "utf-8") as file:
+                write(file)
+                file.flush()
+                os.fsync(file.fileno())
+                size = file.tell()
+        except BaseException:
+            # a half written file is useless
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+        os.replace(tmp_filename, filename)
+        return size
+
+
+    def _run(self):
+        while not self.__stopped.is_set():
+            self.__wakeup.wait()
+            self.__wakeup.clear()
+
+            with self.__lock:
+                oldest_change = min(self.__dirty.values(), default=None)
+            if oldest_change is None:
+                continue
+
+            # coalesce changes made within the delay window
+            remaining = oldest_change + self.delay - time.monotonic()
+            if remaining > 0 and self.__stopped.wait(remaining):
+                break
+
+            self.flush()
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from answer_matching import AnswerMatcher
+
+
+@pytest.fixture
+def answer_matcher():
+    return AnswerMatcher(similarity_required=0.8)
+
+
+@pytest.mark.parametrize("text,normalized", [
+    ("Hello,  World!", "hello world"),
+    ("  ЁЖИК  ", "ежик"),
+    ("ﬁrst…second", "first second"),
+    ("Straße", "strasse"),
+    ("to take-off", "to take off")
+])
+def test_normalize(answer_matcher, text, normalized):
+    assert answer_matcher.normalize(text) == normalized
+
+
+def test_is_correct_uses_normalized_answers(answer_matcher):
+    normalized_answers = answer_matcher.normalize_all(["Ёлка", "Пихта"])
+
+    assert answer_matcher.is_correct("елка!", normalized_answers)
+    assert answer_matcher.is_correct("пихтаа", normalized_answers)
+    assert not answer_matcher.is_correct("сосна", normalized_answers)
+
+
+@pytest.mark.parametrize("first,second", [
+    ("", "abc"),
+    ("abc", "abc"),
+    ("kitten", "sitting"),
+    ("мельчайшие детали", "мелчайшие детал"),
+    ("abcdef", "fedcba")
+])
+def test_bounded_distance(first, second):
+    # longest common subsequence by the full table
+    lcs = [[0] * (len(second) + 1) for i in range(len(first) + 1)]
+    for i in range(len(first)):
+        for j in range(len(second)):
+            lcs[i + 1][j + 1] = lcs[i][j] + 1 if first[i] == second[j] \
+                                else max(lcs[i][j + 1], lcs[i + 1][j])
+    total_length = len(first) + len(second)
+    distance = total_length - 2 * lcs[-1][-1]
+
+    assert AnswerMatcher.bounded_distance(first, second,
+                                          total_length) == distance
+    assert AnswerMatcher.bounded_distance(first, second,
+                                          distance) == distance
+    if distance > 0:
+        assert AnswerMatcher.bounded_distance(first, second,
+                                              distance - 1) is None
+
+
+def test_regression_corpus(answer_matcher):
+    # [user answer, correct answer, verdict of difflib matching]
+    with open("tests/fixtures/answer_matching_corpus.json", "r") as file:
+        corpus = json.loads(file.read())
+
+    differences = []
+    for user_answer, correct_answer, expected in corpus:
+        verdict = answer_matcher.is_correct(
+                  user_answer, answer_matcher.normalize_all([correct_answer]))
+        if verdict != expected:
+            differences.append((user_answer, correct_answer, expected))
+
+    # difflib matches greedy blocks and underestimates similarity
+    # sometimes, so a correct answer is never rejected by the new matcher
+    assert all(not expected for _, _, expected in differences)
+    assert len(differences) <= len(corpus) // 100
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+from answer_templates import AnswerTemplates
+
+
+@pytest.fixture
+def answers_file(tmp_path):
+    filename = tmp_path / "answers.yml"
+    filename.write_text(
+        "answers:\n"
+        "  hello:\n"
+        "    en: Hi\n"
+        "    ru: Привет\n"
+        "  feedback:\n"
+        "    en: '{% if ok %}Nice{% else %}Incorrect{% endif %}'\n"
+        "  only_ru:\n"
+        "    ru: Только\n")
+    return filename
+
+
+def test_repo_answers_file_is_compiled():
+    answer_templates = AnswerTemplates("answers.yml")
+
+    assert answer_templates.reload() is True
+    assert "Nice" in answer_templates.render(
+        "user_answer_feedback", "en", is_answer_correct=True,
+        answers=["a"], example="", tags=[])
+
+
+def test_language_fallback(answers_file):
+    answer_templates = AnswerTemplates(str(answers_file), default_lang="en")
+    answer_templates.reload()
+
+    assert answer_templates.get("hello", "ru") == "Привет"
+    assert answer_templates.get("hello", "ru-RU") == "Привет"
+    assert answer_templates.get("hello", "None") == "Hi"
+    assert answer_templates.get("only_ru", "en") == "Только"
+    assert answer_templates.render("feedback", "de", ok=False) \
+           == "Incorrect"
+
+
+def test_reload_when_file_changes(answers_file):
+    answer_templates = AnswerTemplates(str(answers_file), check_interval=0)
+    answer_templates.reload()
+
+    answers_file.write_text("answers:\n  hello:\n    en: Hello\n")
+    # mtime resolution of some filesystems is one second
+    stat = os.stat(answers_file)
+    os.utime(answers_file, (stat.st_atime, stat.st_mtime + 5))
+
+    assert answer_templates.get("hello", "en") == "Hello"
+
+
+def test_broken_file_keeps_templates(answers_file):
+    answer_templates = AnswerTemplates(str(answers_file))
+    answer_templates.reload()
+
+    answers_file.write_text("answers:\n  hello:\n    en: '{% if %}'\n")
+    assert answer_templates.reload() is False
+    assert answer_templates.get("hello", "en") == "Hi"
@@ -0,0 +1,42 @@
+import random
+
+from benchmarks import synthetic_data, run_benchmarks
+from parsers import parsers
+
+
+def test_synthetic_data_is_reproducible():
+    first = synthetic_data.generate_users(random.Random(1), 3, 2, 10)
+    second = synthetic_data.generate_users(random.Random(1), 3, 2, 10)
+
+    assert first == second
+    assert len(first) == 3
+    assert len(first["0"]) == 3     # current channel + 2 channels
+    assert len(first["0"]["channel0"]) == 10
+
+
+def test_generated_messages_are_parsed():
+    rnd = random.Random(0)
+    for parser_name in run_benchmarks.PARSER_NAMES:
+        message = synthetic_data.generate_message(rnd, parser_name,
+                                                  answer_length=15)
+        assert parsers.run(parser_name)(message) is not None
+
+
+def test_run_benchmarks_small():
+    args = run_benchmarks.make_parser().parse_args(
+        ["--questions", "30", "--users", "3", "--answers", "10",
+         "--subsets", "2", "--checks", "10", "--repeat", "1"])
+    results = run_benchmarks.run(args)
+
+    assert {result["benchmark"] for result in results} == {
+        "queue_next_question", "queue_generate_subset",
+        "progress_db_import_from_json", "progress_db_import_from_file",
+        "progress_db_import_from_snapshot", "progress_db_export_to_json",
+        "progress_db_export_to_file", "progress_db_export_to_snapshot",
+        "question_db_update_channel_posts", "parser", "similarity_check"
+    }
+    assert all(result["seconds"] >= 0 for result in results)
+
+    comparison = run_benchmarks.compare(results, {"results": results})
+    assert len(comparison) == len(results)
+    assert all(ratio == 1 for result, ratio in comparison)
@@ -0,0 +1,85 @@
+import time
+import threading
+
+import pytest
+from concurrency import KeyedExecutor, ReadWriteLock
+
+
+@pytest.fixture
+def executor():
+    executor = KeyedExecutor(workers=4)
+    executor.start()
+    yield executor
+    executor.stop(timeout=5)
+
+
+def test_tasks_of_one_key_run_in_order(executor):
+    results = {key: [] for key in range(5)}
+
+    def task(key, value):
+        time.sleep(0.001)
+        results[key].append(value)
+
+    futures = [executor.submit(key, task, key, value)
+               for value in range(20) for key in range(5)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert all(values == list(range(20)) for values in results.values())
+    assert executor.get_queue_depth() == 0
+
+
+def test_different_keys_run_in_parallel(executor):
+    barrier = threading.Barrier(3, timeout=5)
+
+    futures = [executor.submit(key, barrier.wait) for key in range(3)]
+    for future in futures:
+        # all three tasks meet at the barrier only if they run at once
+        future.result(timeout=5)
+
+
+def test_failed_task_does_not_stop_key(executor):
+    failed = executor.submit("user", lambda: 1 / 0)
+    succeeded = executor.submit("user", lambda: "ok")
+
+    with pytest.raises(ZeroDivisionError):
+        failed.result(timeout=5)
+    assert succeeded.result(timeout=5) == "ok"
+
+
+def test_stop_runs_submitted_tasks():
+    executor = KeyedExecutor(workers=2)
+    executor.start()
+    results = []
+    for value in range(10):
+        executor.submit("user", results.append, value)
+    executor.stop(timeout=5)
+
+    assert results == list(range(10))
+
+
+def test_exclusive_waits_for_shared_holders():
+    lock = ReadWriteLock()
+    events = []
+    shared_acquired = threading.Event()
+    release_shared = threading.Event()
+
+    def hold_shared():
+        with lock.shared():
+            shared_acquired.set()
+            release_shared.wait(5)
+            events.append("shared released")
+
+    thread = threading.Thread(target=hold_shared)
+    thread.start()
+    shared_acquired.wait(5)
+
+    threading.Timer(0.05, release_shared.set).start()
+    with lock.exclusive():
+        events.append("exclusive acquired")
+        with lock.exclusive(), lock.shared():
+            # reentrant for the owner
+            pass
+    thread.join(5)
+
+    assert events == ["shared released", "exclusive acquired"]
@@ -0,0 +1,91 @@
+import json
+import pytest
+from question_db import QuestionDatabase
+from question_db_refresher import QuestionDatabaseRefresher
+from distractor_index import DistractorIndex
+
+
+@pytest.fixture
+def question_db():
+    with open("tests/fixtures/poll_channels_data.json", "r") as file:
+        data = json.loads(file.read())
+
+    question_db = QuestionDatabase()
+    for channel in data["channels"]:
+        question_db.create_channel(channel["channel_id"])
+        question_db.update_channel_posts(channel["channel_id"],
+                                         channel["data"])
+    return question_db
+
+
+@pytest.mark.parametrize("hard_distractors", [0, 5])
+def test_distractors_are_unique_and_incorrect(question_db, hard_distractors):
+    distractor_index = DistractorIndex(question_db,
+                                       hard_distractors=hard_distractors)
+
+    for channel_id in question_db.list_all_channels():
+        for question_id in question_db.get_question_ids(channel_id):
+            correct = {
+                answer.lower() for answer in question_db.get_question_by_id(
+                                             channel_id, question_id)["answers"]
+            }
+            options = distractor_index.pick(channel_id, question_id, k=3,
+                                            hard=hard_distractors > 0)
+
+            assert len(options) == 3
+            assert len({option.lower() for option in options}) == 3
+            assert not correct & {option.lower() for option in options}
+
+
+def test_distractors_of_small_channel():
+    question_db = QuestionDatabase()
+    question_db.create_channel("channel")
+    question_db.update_channel_posts("channel", [
+        {"question": "q1", "answers": ["a", "A"], "examples": []},
+        {"question": "q2", "answers": ["b"], "examples": []},
+        {"question": "q3", "answers": ["b"], "examples": []}
+    ])
+    distractor_index = DistractorIndex(question_db)
+    question_id = QuestionDatabase.generate_question_id("q1")
+
+    assert distractor_index.pick("channel", question_id, k=3) == ["b"]
+    assert distractor_index.pick("absent", question_id, k=3) == []
+
+
+def test_hard_distractors_are_similar():
+    question_db = QuestionDatabase()
+    question_db.create_channel("channel")
+    question_db.update_channel_posts("channel", [
+        {"question": "q1", "answers": ["to take off"], "examples": []},
+        {"question": "q2", "answers": ["to take on"], "examples": []},
+        {"question": "q3", "answers": ["xyz"], "examples": []},
+        {"question": "q4", "answers": ["completely different"],
+         "examples": []}
+    ])
+    distractor_index = DistractorIndex(question_db, hard_distractors=1)
+    question_id = QuestionDatabase.generate_question_id("q1")
+
+    assert distractor_index.pick("channel", question_id, k=1, hard=True) \
+           == ["to take on"]
+
+
+def test_distractors_of_restored_questions(question_db, tmp_path):
+    filename = tmp_path / "questions.db.json"
+    filename.write_text(question_db.export_to_json())
+
+    def unreachable(question_db):
+        raise ConnectionError("poll_channels is unreachable")
+
+    refresher = QuestionDatabaseRefresher(unreachable, interval=60)
+    refresher.register_index("distractors", DistractorIndex)
+
+    # the same order as restore_data() of main.py
+    restored_db = QuestionDatabase()
+    restored_db.import_from_json(filename.read_text())
+    refresher.publish(restored_db)
+    assert not refresher.refresh()
+
+    restored_db, indexes = refresher.get_snapshot()
+    channel_id = restored_db.list_all_channels()[0]
+    question_id = restored_db.get_question_ids(channel_id)[0]
+    assert len(indexes["distractors"].pick(channel_id, question_id)) == 3
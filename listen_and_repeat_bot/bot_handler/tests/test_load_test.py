@@ -0,0 +1,77 @@
+import json
+import threading
+from urllib import request, error
+
+import pytest
+
+from parsers import parsers
+from benchmarks.fake_telegram import FakeTelegram, make_message_update
+from benchmarks.fake_poll_channels import FakePollChannels, format_channels
+from benchmarks.load_test import LoadTest, is_message
+
+
+@pytest.fixture
+def channels():
+    with open("tests/fixtures/poll_channels_data.json", "r") as file:
+        return json.load(file)["channels"]
+
+
+def test_fake_poll_channels(channels):
+    fake_poll_channels = FakePollChannels(format_channels(channels))
+    fake_poll_channels.start()
+    try:
+        with request.urlopen(fake_poll_channels.url) as response:
+            etag = response.headers["ETag"]
+            data = json.loads(response.read())
+
+        channel = data["channels"][0]
+        assert channel["channel_id"] == channels[0]["channel_id"]
+        parsed = parsers.run(channel["tags"]["parser"])(
+                 channel["posts"][0]["data"])
+        assert parsed["question"] == channels[0]["data"][0]["question"]
+        assert parsed["answers"] == channels[0]["data"][0]["answers"]
+
+        with pytest.raises(error.HTTPError) as exc_info:
+            request.urlopen(request.Request(
+                fake_poll_channels.url, headers={"If-None-Match": etag}))
+        assert exc_info.value.code == 304
+    finally:
+        fake_poll_channels.stop()
+
+
+def test_get_updates_waits_and_forgets_confirmed():
+    fake_telegram = FakeTelegram()
+    timer = threading.Timer(
+        0.1, fake_telegram.add_update,
+        args=(make_message_update(1, 10, "/start"),))
+    timer.start()
+
+    status, response = fake_telegram.call("getUpdates", {"timeout": 5})
+    assert [update["update_id"] for update in response["result"]] == [1]
+
+    status, response = fake_telegram.call("getUpdates",
+                                          {"offset": 2, "timeout": 0})
+    assert response["result"] == []
+
+
+def test_load_test_step_waits_for_response():
+    fake_telegram = FakeTelegram()
+    load_test = LoadTest(fake_telegram, ["channel"], timeout=5)
+    fake_telegram.on_call = load_test.on_call
+
+    def reply():
+        fake_telegram.call("getUpdates", {"timeout": 5})
+        fake_telegram.call("sendMessage", {"chat_id": 10, "text": "hello"})
+
+    thread = threading.Thread(target=reply)
+    thread.start()
+    response = load_test.step(
+        "start", 10,
+        lambda update_id: make_message_update(update_id, 10, "/start"),
+        is_message)
+    thread.join()
+
+    assert response["text"] == "hello"
+    summary = load_test.get_summary(1)
+    assert summary["steps"] == 1
+    assert summary["actions"]["start"]["steps"] == 1
@@ -0,0 +1,96 @@
+import time
+from urllib import request
+
+import pytest
+from metrics import (MetricsRegistry, MetricsServer,
+                     Counter, Gauge, Histogram)
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_counter_and_gauge(registry):
+    updates = registry.register(Counter("updates_total", "Updates",
+                                        ["outcome"]))
+    users = registry.register(Gauge("users", "Users", callback=lambda: 3))
+    channels = registry.register(Gauge(
+        "questions", "Questions", ["channel"],
+        callback=lambda: [(("a\"b",), 1.5)]))
+
+    updates.labels("updated").inc()
+    updates.labels("updated").inc(2)
+    updates.labels("failed").inc()
+
+    lines = registry.render().splitlines()
+    assert "# TYPE updates_total counter" in lines
+    assert 'updates_total{outcome="updated"} 3' in lines
+    assert 'updates_total{outcome="failed"} 1' in lines
+    assert "users 3" in lines
+    assert 'questions{channel="a\\"b"} 1.5' in lines
+
+
+def test_histogram(registry):
+    latency = registry.register(Histogram("latency_seconds", "Latency",
+                                          ["handler"], buckets=[0.1, 1]))
+    for value in [0.05, 0.1, 0.5, 5]:
+        latency.labels("start").observe(value)
+    with latency.labels("help").time():
+        pass
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{handler="start",le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{handler="start",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{handler="start",le="+Inf"} 4' in lines
+    assert 'latency_seconds_sum{handler="start"} 5.65' in lines
+    assert 'latency_seconds_count{handler="help"} 1' in lines
+
+
+def test_timer_as_decorator(registry):
+    duration = registry.register(Histogram("duration_seconds", "Duration"))
+
+    @duration.time()
+    def work():
+        return "done"
+
+    assert work() == "done"
+    assert work() == "done"
+    assert "duration_seconds_count 2" in registry.render().splitlines()
+
+
+def test_timer_as_decorator_of_nested_calls(registry):
+    duration = registry.register(Histogram("duration_seconds", "Duration",
+                                           buckets=[0.05]))
+
+    @duration.time()
+    def work(depth):
+        if depth:
+            time.sleep(0.1)
+            work(depth - 1)
+
+    # the inner call must not restart the timer of the outer one
+    work(1)
+    lines = registry.render().splitlines()
+    assert 'duration_seconds_bucket{le="0.05"} 1' in lines
+    assert "duration_seconds_count 2" in lines
+
+
+def test_broken_callback_does_not_hide_metrics(registry):
+    registry.register(Gauge("broken", "Broken", callback=lambda: 1 / 0))
+    registry.register(Gauge("users", "Users", callback=lambda: 1))
+
+    assert "users 1" in registry.render().splitlines()
+
+
+def test_metrics_server(registry):
+    registry.register(Gauge("users", "Users", callback=lambda: 7))
+    metrics_server = MetricsServer(registry, port=0)
+    metrics_server.start()
+    try:
+        host, port = metrics_server.get_address()
+        with request.urlopen(f"http://{host}:{port}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert "users 7" in response.read().decode("utf-8")
+    finally:
+        metrics_server.stop(timeout=5)
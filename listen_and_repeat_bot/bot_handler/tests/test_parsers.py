@@ -0,0 +1,52 @@
+import pytest
+from parsers import Parsers, ParseCache
+
+
+@pytest.fixture
+def counting_parsers():
+    calls = []
+    test_parsers = Parsers()
+
+    @test_parsers.register
+    def parser_lines(message_data):
+        calls.append(message_data)
+        lines = message_data.split("\n")
+        if len(lines) < 2:
+            return None
+        return {"question": lines[0], "answers": lines[1:], "examples": []}
+
+    return test_parsers, calls
+
+
+def test_parse_cache_skips_unchanged_posts(counting_parsers):
+    test_parsers, calls = counting_parsers
+    parse_cache = ParseCache(test_parsers, max_size=10)
+
+    first = parse_cache.run("parser_lines", "hello\nworld")
+    second = parse_cache.run("parser_lines", "hello\nworld")
+    broken = [parse_cache.run("parser_lines", "broken") for i in range(2)]
+
+    assert first == second == {"question": "hello",
+                               "answers": ["world"],
+                               "examples": []}
+    assert first is not second, "Cached entries should be copied"
+    assert broken == [None, None]
+    assert calls == ["hello\nworld", "broken"]
+    assert (parse_cache.hits, parse_cache.misses) == (2, 2)
+
+
+def test_parse_cache_evicts_least_recently_used(counting_parsers):
+    test_parsers, calls = counting_parsers
+    parse_cache = ParseCache(test_parsers, max_size=2,
+                             prepare=lambda entry: {**entry, "id": 1})
+
+    parse_cache.run("parser_lines", "a\n1")
+    parse_cache.run("parser_lines", "b\n2")
+    parse_cache.run("parser_lines", "a\n1")
+    parse_cache.run("parser_lines", "c\n3")
+    parse_cache.run("parser_lines", "a\n1")
+    entry = parse_cache.run("parser_lines", "b\n2")
+
+    assert parse_cache.len() == 2
+    assert calls == ["a\n1", "b\n2", "c\n3", "b\n2"]
+    assert entry["id"] == 1, "prepare() result should be cached"
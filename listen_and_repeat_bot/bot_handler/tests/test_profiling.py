@@ -0,0 +1,89 @@
+import time
+import pstats
+import logging
+import threading
+
+from profiling import ProfilingSession, SlowHandlerLog
+
+
+def busy_handler():
+    return sum(i * i for i in range(1000))
+
+
+def test_calls_outside_of_session_are_not_profiled(tmp_path):
+    profiling_session = ProfilingSession(str(tmp_path))
+
+    assert profiling_session.run(busy_handler) == busy_handler()
+    assert not profiling_session.is_active()
+
+
+def test_session_dumps_stats_of_all_threads(tmp_path):
+    profiling_session = ProfilingSession(str(tmp_path))
+    finished = threading.Event()
+    results = []
+
+    def on_finish(filename, summary):
+        results.append((filename, summary))
+        finished.set()
+
+    assert profiling_session.start(0.3, on_finish=on_finish) is True
+    assert profiling_session.start(0.3) is False
+
+    threads = [threading.Thread(target=profiling_session.run,
+                                args=(busy_handler,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert finished.wait(5)
+    filename, summary = results[0]
+    stats = pstats.Stats(filename)
+    calls = [value[0] for key, value in stats.stats.items()
+             if key[2] == "busy_handler"]
+    assert calls == [3]
+    assert "busy_handler" in summary
+    assert not profiling_session.is_active()
+
+
+def test_empty_session(tmp_path):
+    profiling_session = ProfilingSession(str(tmp_path))
+    finished = threading.Event()
+    results = []
+
+    profiling_session.start(0.05, on_finish=lambda *args: (
+                                  results.append(args), finished.set()))
+
+    assert finished.wait(5)
+    assert results[0][0] is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_slow_handler_is_logged_by_phases(caplog):
+    slow_handler_log = SlowHandlerLog(threshold=0.05)
+
+    with caplog.at_level(logging.WARNING, logger="profiling"):
+        with slow_handler_log.track("check_translation"):
+            with slow_handler_log.phase("db"):
+                time.sleep(0.03)
+            with slow_handler_log.phase("db"):
+                time.sleep(0.03)
+            with slow_handler_log.phase("send"):
+                pass
+
+        with slow_handler_log.track("help_handler"):
+            pass
+
+    assert slow_handler_log.slow_handlers == 1
+    assert len(caplog.records) == 1
+    message = caplog.records[0].getMessage()
+    assert message.startswith("slow handler check_translation")
+    assert "db=" in message and "send=" in message and "other=" in message
+
+
+def test_phase_outside_of_handler():
+    slow_handler_log = SlowHandlerLog(threshold=0)
+
+    with slow_handler_log.phase("db"):
+        pass
+    assert slow_handler_log.slow_handlers == 0
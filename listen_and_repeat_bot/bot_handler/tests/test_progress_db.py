@@ -0,0 +1,68 @@
+import io
+import json
+import random
+
+import pytest
+from progress_db import ProgressDatabase, iterate_json_object
+from progress_db_sqlite import SQLiteProgressDatabase
+from progress_queue_library import ProgressQueueLearnModesAndSubsets
+from benchmarks import synthetic_data
+
+
+@pytest.fixture
+def exported_users():
+    return synthetic_data.generate_users(random.Random(0), 30, 2, 50)
+
+
+def create_progress_db(exported_users):
+    progress_db = ProgressDatabase(ProgressQueueLearnModesAndSubsets)
+    progress_db.import_from_json(json.dumps(exported_users))
+    return progress_db
+
+
+def test_export_to_file_is_the_same_as_export_to_json(exported_users):
+    progress_db = create_progress_db(exported_users)
+    # several lock chunks
+    progress_db.EXPORT_CHUNK_USERS = 7
+
+    file = io.StringIO()
+    assert progress_db.export_to_file(file) == len(exported_users)
+    assert file.getvalue() == progress_db.export_to_json()
+    assert json.loads(file.getvalue()) == exported_users
+
+
+def test_import_from_file_reads_existing_format(exported_users):
+    progress_db = ProgressDatabase(ProgressQueueLearnModesAndSubsets)
+    # old snapshots are written by json.dumps(), any formatting is valid
+    progress_db.import_from_file(io.StringIO(json.dumps(exported_users,
+                                                        indent=2)))
+
+    assert json.loads(progress_db.export_to_json()) == exported_users
+    _, queue_obj = progress_db.get_channel_progress("0", "channel0")
+    assert isinstance(queue_obj, ProgressQueueLearnModesAndSubsets)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 65536])
+def test_iterate_json_object_chunks(exported_users, chunk_size):
+    file = io.StringIO(json.dumps({"number": 1234567, **exported_users}))
+    assert dict(iterate_json_object(file, chunk_size=chunk_size)) == \
+           {"number": 1234567, **exported_users}
+
+
+@pytest.mark.parametrize("data", ["", "[]", '{"user" 1}',
+                                  '{"user": {}', '{"user": {},}'])
+def test_iterate_json_object_malformed(data):
+    with pytest.raises(ValueError):
+        list(iterate_json_object(io.StringIO(data), chunk_size=2))
+
+
+def test_sqlite_export_to_file(exported_users, tmp_path):
+    progress_db = SQLiteProgressDatabase(
+                      queue_class=ProgressQueueLearnModesAndSubsets,
+                      filename=str(tmp_path / "users.db.sqlite3"))
+    progress_db.import_from_file(io.StringIO(json.dumps(exported_users)))
+
+    file = io.StringIO()
+    assert progress_db.export_to_file(file) == len(exported_users)
+    assert json.loads(file.getvalue()) == exported_users
+    progress_db.close()
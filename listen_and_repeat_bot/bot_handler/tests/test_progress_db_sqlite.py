@@ -0,0 +1,90 @@
+import json
+import pytest
+from progress_db import ProgressDatabase
+from progress_db_sqlite import SQLiteProgressDatabase, migrate_json_to_sqlite
+from progress_queue_library import ProgressQueueLearnModesAndSubsets
+
+
+@pytest.fixture
+def sqlite_filename(tmp_path):
+    return str(tmp_path / "users.db.sqlite3")
+
+
+def create_progress_db(filename, **kwargs):
+    return SQLiteProgressDatabase(
+               queue_class=ProgressQueueLearnModesAndSubsets,
+               filename=filename, **kwargs)
+
+
+def test_sqlite_progress_db_contract(sqlite_filename):
+    progress_db = create_progress_db(sqlite_filename)
+
+    assert progress_db.create_user("user") is True
+    assert progress_db.create_user("user") is False
+    assert progress_db.get_current_channel_of_user("absent") == (-1, None)
+    assert progress_db.get_channel_progress("user", "channel") == (2, None)
+
+    assert progress_db.create_channel_progress("user", "channel") is True
+    assert progress_db.set_current_channel_of_user("user", "channel")
+    _, queue_obj = progress_db.get_channel_progress("user", "channel")
+    queue_obj.update_questions(["q1", "q2"])
+    progress_db.change_question_progress("user", "channel", "q1", 40)
+    progress_db.close()
+
+    restored = create_progress_db(sqlite_filename)
+    assert restored.get_current_channel_of_user("user") == (0, "channel")
+    _, queue_obj = restored.get_channel_progress("user", "channel")
+    assert queue_obj.get_progress() == {"q1": 40}
+
+    assert restored.delete_channel_progress("user", "channel") is True
+    restored.close()
+
+    restored = create_progress_db(sqlite_filename)
+    assert restored.get_channel_progress("user", "channel") == (2, None)
+
+
+def test_sqlite_progress_db_evicts_users(sqlite_filename):
+    progress_db = create_progress_db(sqlite_filename, max_cached_users=2,
+                                     active_seconds=0)
+
+    for user_id in ["u1", "u2", "u3"]:
+        progress_db.create_channel_progress(user_id, "channel")
+        progress_db.set_current_channel_of_user(user_id, "channel")
+
+    assert len(progress_db.progress_db) == 2
+    assert progress_db.get_current_channel_of_user("u1") == (0, "channel")
+
+
+def test_sqlite_progress_db_keeps_active_users(sqlite_filename):
+    progress_db = create_progress_db(sqlite_filename, max_cached_users=1)
+    progress_db.create_channel_progress("u1", "channel")
+    _, queue_obj = progress_db.get_channel_progress("u1", "channel")
+    queue_obj.update_questions(["q1", "q2"])
+    question_id = queue_obj.next_question()
+
+    for user_id in ["u2", "u3"]:
+        progress_db.create_channel_progress(user_id, "channel")
+
+    # the current question isn't saved, so the queue is kept in memory
+    assert len(progress_db.progress_db) == 3
+    _, restored_queue_obj = progress_db.get_channel_progress("u1", "channel")
+    assert restored_queue_obj is queue_obj
+    assert restored_queue_obj.current_question() == question_id
+    progress_db.close()
+
+
+def test_migrate_json_to_sqlite(sqlite_filename, tmp_path):
+    json_db = ProgressDatabase(queue_class=ProgressQueueLearnModesAndSubsets)
+    json_db.create_channel_progress("user", "channel")
+    json_db.set_current_channel_of_user("user", "channel")
+    _, queue_obj = json_db.get_channel_progress("user", "channel")
+    queue_obj.set_progress({"q1": 10, "q2": 500})
+
+    json_filename = tmp_path / "users.db.json"
+    json_filename.write_text(json_db.export_to_json())
+
+    assert migrate_json_to_sqlite(str(json_filename), sqlite_filename) == 1
+
+    progress_db = create_progress_db(sqlite_filename)
+    assert json.loads(progress_db.export_to_json()) == \
+           json.loads(json_db.export_to_json())
@@ -0,0 +1,71 @@
+import pytest
+from progress_db import ProgressDatabase
+from progress_journal import ProgressJournal
+from progress_queue_library import ProgressQueueLearnModesAndSubsets
+
+
+@pytest.fixture
+def journal_filename(tmp_path):
+    return str(tmp_path / "users.db.json.journal")
+
+
+def create_progress_db(journal):
+    return ProgressDatabase(queue_class=ProgressQueueLearnModesAndSubsets,
+                            journal=journal)
+
+
+def test_journal_replay(journal_filename):
+    journal = ProgressJournal(journal_filename)
+    initial = create_progress_db(journal)
+
+    initial.create_channel_progress("user", "channel")
+    initial.set_current_channel_of_user("user", "channel")
+    _, queue_obj = initial.get_channel_progress("user", "channel")
+    queue_obj.update_questions(["q1", "q2"])
+    initial.change_question_progress("user", "channel", "q1", 15)
+    initial.change_question_progress("user", "channel", "q1", 15)
+    initial.delete_channel_progress("user", "another_channel")
+    journal.stop()
+
+    restored = create_progress_db(ProgressJournal(journal_filename))
+    assert restored.journal.replay(restored) == 5
+
+    assert restored.get_current_channel_of_user("user") == (0, "channel")
+    _, queue_obj = restored.get_channel_progress("user", "channel")
+    assert queue_obj.get_progress() == {"q1": 30}
+
+
+def test_journal_compaction(journal_filename, tmp_path):
+    snapshot_filename = tmp_path / "users.db.json"
+    journal = ProgressJournal(journal_filename)
+    initial = create_progress_db(journal)
+
+    initial.create_channel_progress("user", "channel")
+    journal.flush()
+    assert journal.compact(
+        lambda: snapshot_filename.write_text(initial.export_to_json()))
+
+    initial.set_current_channel_of_user("user", "channel")
+    journal.stop()
+
+    restored = create_progress_db(ProgressJournal(journal_filename))
+    restored.import_from_json(snapshot_filename.read_text())
+    assert restored.journal.replay(restored) == 1,\
+           "Compacted records should not be replayed"
+    assert restored.get_current_channel_of_user("user") == (0, "channel")
+
+
+def test_journal_is_kept_when_snapshot_fails(journal_filename):
+    journal = ProgressJournal(journal_filename)
+    initial = create_progress_db(journal)
+    initial.create_user("user")
+
+    def failing_snapshot():
+        raise OSError("disk is full")
+
+    assert journal.compact(failing_snapshot) is False
+    initial.create_user("another_user")
+    journal.stop()
+
+    restored = create_progress_db(ProgressJournal(journal_filename))
+    assert restored.journal.replay(restored) == 2
@@ -0,0 +1,161 @@
+import pytest
+from progress_queue_library import (
+    ProgressQueueRandom,
+    ProgressQueuePriorityRandomLimited,
+    ProgressQueueLearnModesAndSubsets,
+    CompactProgressQueueRandom,
+    CompactProgressQueuePriorityRandom,
+    CompactProgressQueuePriorityRandomLimited,
+    CompactProgressQueueLearnModesAndSubsets,
+    get_question_id_table
+)
+
+
+COMPACT_QUEUE_CLASSES = [
+    CompactProgressQueueRandom,
+    CompactProgressQueuePriorityRandom,
+    CompactProgressQueuePriorityRandomLimited,
+    CompactProgressQueueLearnModesAndSubsets
+]
+
+
+@pytest.mark.parametrize("queue_class", COMPACT_QUEUE_CLASSES)
+def test_compact_queue_progress_round_trip(queue_class):
+    progress = {f"question-{i}": i * 10 for i in range(50)}
+
+    queue_obj = queue_class.for_channel("round_trip_channel")
+    queue_obj.set_progress(progress)
+    queue_obj.update_questions(["new-question"])
+    queue_obj.change_question_progress("question-1", 15)
+
+    assert queue_obj.get_progress() == {
+        **progress, "question-1": 25, "new-question": 0}
+
+    queue_obj.remove_questions(["question-1"])
+    assert "question-1" not in queue_obj.get_progress()
+    assert len(queue_obj.progress) == 50
+
+
+@pytest.mark.parametrize("queue_class", COMPACT_QUEUE_CLASSES)
+def test_compact_queue_progress_is_clamped(queue_class):
+    queue_obj = queue_class.for_channel("clamped_channel")
+    queue_obj.set_progress({"a": 0, "b": 990})
+
+    # values out of 0-1000 don't fit array('H') of CompactProgress
+    queue_obj.change_question_progress("a", -35)
+    queue_obj.change_question_progress("b", 35)
+    assert queue_obj.get_progress() == {"a": 1, "b": 1000}
+
+    with pytest.raises(KeyError):
+        del queue_obj.progress["absent"]
+
+
+@pytest.mark.parametrize("queue_class", COMPACT_QUEUE_CLASSES)
+def test_compact_queue_next_question(queue_class):
+    queue_obj = queue_class.for_channel("next_question_channel")
+    queue_obj.update_questions([f"question-{i}" for i in range(20)])
+
+    for i in range(30):
+        question_id = queue_obj.next_question()
+        assert question_id in queue_obj.get_progress()
+        queue_obj.change_question_progress(question_id, 15)
+
+
+def test_compact_queues_share_question_ids():
+    first = CompactProgressQueueLearnModesAndSubsets.for_channel("shared")
+    second = CompactProgressQueueLearnModesAndSubsets.for_channel("shared")
+
+    first.update_questions(["a", "b"])
+    second.update_questions(["b", "c"])
+
+    assert first.progress.table is second.progress.table
+    assert len(get_question_id_table("shared")) == 3
+    assert first.get_progress() == {"a": 0, "b": 0}
+    assert second.get_progress() == {"b": 0, "c": 0}
+
+
+@pytest.mark.parametrize("queue_class", [
+    ProgressQueueRandom,
+    ProgressQueuePriorityRandomLimited,
+    ProgressQueueLearnModesAndSubsets,
+    *COMPACT_QUEUE_CLASSES
+])
+def test_queue_classes_have_no_instance_dict(queue_class):
+    queue_obj = queue_class.for_channel("slots_channel")
+    assert not hasattr(queue_obj, "__dict__")
+
+
+def bucket_contents(queue_obj):
+    return [sorted(bucket.items) for bucket in queue_obj.question_buckets]
+
+
+def scanned_buckets(progress):
+    ranges = [(0, 0), (1, 400), (401, 800), (801, 1000)]
+    return [sorted(k for k, v in progress.items() if low <= v <= high)
+            for low, high in ranges]
+
+
+@pytest.mark.parametrize("queue_class", [
+    ProgressQueueLearnModesAndSubsets,
+    CompactProgressQueueLearnModesAndSubsets
+])
+def test_learning_buckets_are_maintained_incrementally(queue_class):
+    queue_obj = queue_class.for_channel("buckets_channel")
+    queue_obj.set_progress({f"question-{i}": i * 20 for i in range(50)})
+    queue_obj.update_questions([f"new-{i}" for i in range(5)])
+
+    subset = queue_obj._generate_subset()
+    assert len(subset) == len(set(subset)) == queue_obj.SUBSET_SIZE
+
+    for i in range(200):
+        question_id = queue_obj.next_question()
+        queue_obj.change_question_progress(question_id, 400 if i % 2 else -35)
+    queue_obj.remove_questions(["question-3", "new-1"])
+    queue_obj.update_questions(["new-5"])
+
+    assert bucket_contents(queue_obj) == \
+           scanned_buckets(queue_obj.get_progress())
+
+    queue_obj.reset()
+    assert bucket_contents(queue_obj) == \
+           scanned_buckets(queue_obj.get_progress())
+
+
+@pytest.mark.parametrize("queue_class", [
+    ProgressQueuePriorityRandomLimited,
+    ProgressQueueLearnModesAndSubsets,
+    *COMPACT_QUEUE_CLASSES[2:]
+])
+def test_subset_is_generated_again_after_its_questions_are_removed(
+        queue_class):
+    queue_obj = queue_class.for_channel("removed_subset_channel")
+    queue_obj.set_progress({f"question-{i}": 0 for i in range(25)})
+    queue_obj.next_question()
+
+    queue_obj.remove_questions(list(queue_obj.selected_subset))
+    for i in range(5):
+        assert queue_obj.next_question() in queue_obj.get_progress()
+
+
+def test_weighted_sampler_prefers_less_known_questions():
+    queue_obj = CompactProgressQueuePriorityRandom.for_channel("weights")
+    queue_obj.set_progress({"unknown": 0, "known": 1000})
+
+    counts = {"unknown": 0, "known": 0}
+    for i in range(2000):
+        counts[queue_obj.next_question()] += 1
+    assert counts["unknown"] > 20 * counts["known"]
+
+    queue_obj.change_question_progress("unknown", 1000)
+    queue_obj.remove_questions(["known"])
+    queue_obj.update_questions([f"new-{i}" for i in range(20)])
+
+    sampler = queue_obj.weighted_sampler
+    assert len(sampler) == 21
+    assert sampler.total() == 1 + 20 * 1001
+    assert queue_obj.next_question() in queue_obj.get_progress()
+
+
+def test_weighted_sampler_on_empty_queue():
+    queue_obj = CompactProgressQueuePriorityRandom.for_channel("empty")
+    assert queue_obj.next_question() is None
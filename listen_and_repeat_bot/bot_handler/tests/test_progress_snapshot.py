@@ -0,0 +1,155 @@
+import io
+import json
+import random
+
+import pytest
+from progress_db import ProgressDatabase
+from progress_journal import ProgressJournal
+from progress_snapshot import (
+    HEADER,
+    ProgressSnapshot,
+    is_snapshot,
+    json_to_snapshot,
+    snapshot_to_json,
+    write_snapshot
+)
+from progress_queue_library import ProgressQueueLearnModesAndSubsets
+from snapshot_writer import SnapshotWriter
+from benchmarks import synthetic_data
+
+
+@pytest.fixture
+def exported_users():
+    users = synthetic_data.generate_users(random.Random(0), 30, 2, 50)
+    # users without channels and with non-ASCII ids are stored as well
+    users["new"] = {"current_channel_id": None}
+    users["пользователь"] = {"current_channel_id": "канал",
+                             "канал": {"вопрос": 1000}}
+    return users
+
+
+@pytest.fixture
+def snapshot_filename(exported_users, tmp_path):
+    filename = str(tmp_path / "users.db.bin")
+    with open(filename, "wb") as file:
+        write_snapshot(exported_users.items(), file)
+    return filename
+
+
+def test_snapshot_round_trip(exported_users, snapshot_filename, tmp_path):
+    snapshot = ProgressSnapshot(snapshot_filename)
+    assert len(snapshot) == len(exported_users)
+    assert dict(snapshot.iterate_users()) == exported_users
+    snapshot.close()
+
+    json_filename = str(tmp_path / "users.db.json")
+    assert snapshot_to_json(snapshot_filename, json_filename) == \
+           len(exported_users)
+    with open(json_filename, "r") as file:
+        assert json.load(file) == exported_users
+
+    assert json_to_snapshot(json_filename, str(tmp_path / "copy.bin")) == \
+           len(exported_users)
+    with open(snapshot_filename, "rb") as original, \
+         open(str(tmp_path / "copy.bin"), "rb") as copy:
+        assert original.read() == copy.read()
+
+
+def test_is_snapshot(snapshot_filename, tmp_path):
+    json_filename = tmp_path / "users.db.json"
+    json_filename.write_text("{}")
+
+    assert is_snapshot(snapshot_filename)
+    assert not is_snapshot(str(json_filename))
+    assert not is_snapshot(str(tmp_path / "absent"))
+
+    with pytest.raises(ValueError):
+        ProgressSnapshot(str(json_filename))
+
+
+@pytest.mark.parametrize("size", [10, 200, -1])
+def test_truncated_snapshot_is_rejected(snapshot_filename, tmp_path,
+                                        size):
+    with open(snapshot_filename, "rb") as file:
+        data = file.read()
+    truncated_filename = tmp_path / "truncated.bin"
+    truncated_filename.write_bytes(data[:size])
+
+    with pytest.raises(ValueError):
+        ProgressSnapshot(str(truncated_filename))
+
+
+def test_snapshot_with_wrong_counts_is_rejected(snapshot_filename):
+    with open(snapshot_filename, "r+b") as file:
+        header = list(HEADER.unpack(file.read(HEADER.size)))
+        # amount of questions
+        header[5] += 1
+        file.seek(0)
+        file.write(HEADER.pack(*header))
+
+    with pytest.raises(ValueError):
+        ProgressSnapshot(snapshot_filename)
+
+
+def test_users_are_loaded_on_access(exported_users, snapshot_filename):
+    progress_db = ProgressDatabase(ProgressQueueLearnModesAndSubsets)
+    progress_db.import_from_snapshot(snapshot_filename)
+    assert len(progress_db.progress_db.unloaded) == len(exported_users)
+
+    _, queue_obj = progress_db.get_channel_progress("0", "channel0")
+    assert isinstance(queue_obj, ProgressQueueLearnModesAndSubsets)
+    assert queue_obj.get_progress() == exported_users["0"]["channel0"]
+    assert "0" not in progress_db.progress_db.unloaded
+    assert len(progress_db.progress_db.unloaded) == len(exported_users) - 1
+
+    assert progress_db.get_current_channel_of_user("absent") == (-1, None)
+    assert json.loads(progress_db.export_to_json()) == exported_users
+
+
+def test_export_to_snapshot_of_loaded_and_unloaded_users(
+        exported_users, snapshot_filename, tmp_path):
+    journal = ProgressJournal(str(tmp_path / "users.db.journal"))
+    progress_db = ProgressDatabase(ProgressQueueLearnModesAndSubsets,
+                                   journal=journal)
+    progress_db.import_from_snapshot(snapshot_filename)
+    progress_db.EXPORT_CHUNK_USERS = 7
+
+    question_id = next(iter(exported_users["1"]["channel1"]))
+    progress_db.change_question_progress("1", "channel1", question_id, 15)
+    progress_db.delete_user("2")
+    progress_db.create_user("31")
+    journal.flush()
+
+    file = io.BytesIO()
+    assert progress_db.export_to_snapshot(file) == len(exported_users)
+    exported_filename = tmp_path / "export.bin"
+    exported_filename.write_bytes(file.getvalue())
+
+    restored_db = ProgressDatabase(ProgressQueueLearnModesAndSubsets)
+    restored_db.import_from_snapshot(str(exported_filename))
+    # loaded users are iterated before the rest, so the order differs
+    expected = json.loads(progress_db.export_to_json())
+    assert json.loads(restored_db.export_to_json()) == expected
+    assert "2" not in expected and "31" in expected
+
+    # the journal is replayed on top of the original snapshot
+    replayed_db = ProgressDatabase(ProgressQueueLearnModesAndSubsets)
+    replayed_db.import_from_snapshot(snapshot_filename)
+    journal.replay(replayed_db)
+    assert json.loads(replayed_db.export_to_json()) == expected
+
+
+def test_snapshot_writer_binary(exported_users, snapshot_filename,
+                                tmp_path):
+    progress_db = ProgressDatabase(ProgressQueueLearnModesAndSubsets)
+    progress_db.import_from_snapshot(snapshot_filename)
+
+    snapshot_writer = SnapshotWriter()
+    # the mapped file is replaced by its next version
+    snapshot_writer.register("users", lambda: progress_db,
+                             snapshot_filename, binary=True)
+    assert snapshot_writer.write_now("users")
+
+    snapshot = ProgressSnapshot(snapshot_filename)
+    assert dict(snapshot.iterate_users()) == exported_users
+    snapshot.close()
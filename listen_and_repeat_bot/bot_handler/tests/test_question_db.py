@@ -48,4 +48,50 @@ def test_question_db_export_and_import(poll_channels_data):
 
     # compare initial and restored
     assert initial.question_db == restored.question_db,\
-           "Export & Import functions for QuestionDatabase do not work"
\ No newline at end of file
+           "Export & Import functions for QuestionDatabase do not work"
+
+def test_question_db_apply_channel_delta():
+    question_db = QuestionDatabase()
+    question_db.create_channel("channel")
+    question_db.update_channel_posts("channel", [
+        {"question": "first", "answers": ["1"], "examples": [], "post_id": 1},
+        {"question": "second", "answers": ["2"], "examples": [], "post_id": 2},
+        {"question": "third", "answers": ["3"], "examples": [], "post_id": 3}
+    ])
+
+    question_db.apply_channel_delta(
+        "channel",
+        posts=[
+            {"question": "second (edited)", "answers": ["2"],
+             "examples": [], "post_id": 2},
+            {"question": "fourth", "answers": ["4"],
+             "examples": [], "post_id": 4}
+        ],
+        deleted_post_ids=[3])
+
+    questions = sorted(
+        question_db.get_question_by_id("channel", question_id)["question"]
+        for question_id in question_db.get_question_ids("channel"))
+
+    assert questions == ["first", "fourth", "second (edited)"],\
+           "Delta is not applied correctly"
+
+
+def test_question_db_apply_channel_delta_keeps_shared_question():
+    question_db = QuestionDatabase()
+    question_db.create_channel("channel")
+    question_db.update_channel_posts("channel", [
+        {"question": "same", "answers": ["1"], "examples": [], "post_id": 1},
+        {"question": "same", "answers": ["1"], "examples": [], "post_id": 2}
+    ])
+
+    # post 2 has written the question last
+    question_db.apply_channel_delta("channel", [], deleted_post_ids=[2])
+
+    assert len(question_db.get_question_ids("channel")) == 1,\
+           "Question published by another post was removed"
+
+    question_db.apply_channel_delta("channel", [], deleted_post_ids=[1])
+
+    assert question_db.get_question_ids("channel") == [],\
+           "Question without posts was not removed"
@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+from question_db import QuestionDatabase
+from question_db_refresher import QuestionDatabaseRefresher
+
+
+def test_refresh_publishes_new_version():
+    updated = QuestionDatabase()
+    refresher = QuestionDatabaseRefresher(lambda db: updated, interval=60)
+    refresher.publish(QuestionDatabase())
+
+    assert refresher.refresh() is True
+    assert refresher.get_question_db() is updated
+    assert refresher.get_version() == 2
+
+
+@pytest.mark.parametrize("update_func", [
+    lambda db: None,
+    lambda db: 1 / 0
+])
+def test_refresh_keeps_snapshot_on_failure(update_func):
+    initial = QuestionDatabase()
+    calls = []
+    refresher = QuestionDatabaseRefresher(
+                    update_func, interval=60,
+                    after_refresh=lambda: calls.append(True))
+    refresher.publish(initial)
+
+    assert refresher.refresh() is False
+    assert refresher.get_question_db() is initial
+    assert refresher.get_version() == 1
+    assert calls == [True], "after_refresh is called for every attempt"
+
+
+def test_trigger_wakes_background_thread():
+    refreshed = threading.Event()
+
+    def update_func(db):
+        refreshed.set()
+        return None
+
+    refresher = QuestionDatabaseRefresher(update_func, interval=3600)
+    refresher.start()
+    try:
+        refresher.trigger()
+        assert refreshed.wait(5), "trigger() did not start a refresh"
+    finally:
+        refresher.stop(timeout=5)
+
+
+def test_question_db_copy_is_independent():
+    initial = QuestionDatabase()
+    initial.create_channel("channel")
+    initial.update_channel_posts("channel", [
+        {"question": "q", "answers": ["a"], "examples": []}
+    ])
+
+    duplicated = initial.copy()
+    duplicated.create_channel("another_channel")
+    duplicated.update_channel_posts("channel", [
+        {"question": "q2", "answers": ["a2"], "examples": []}
+    ])
+
+    assert initial.list_all_channels() == ["channel"]
+    assert len(initial.get_question_ids("channel")) == 1
+    assert len(duplicated.get_question_ids("channel")) == 2
+
+
+def test_question_db_copy_shares_untouched_channels():
+    initial = QuestionDatabase()
+    for channel_id in ["first", "second"]:
+        initial.create_channel(channel_id)
+        initial.update_channel_posts(channel_id, [
+            {"question": "q", "answers": ["a"], "examples": [], "post_id": 1}
+        ])
+    initial.set_channel_metadata("first", "channel_name", "First")
+
+    duplicated = initial.copy()
+    duplicated.set_channel_metadata("first", "channel_name", "First")
+    duplicated.apply_channel_delta("second", [], deleted_post_ids=[1])
+
+    # only the channel changed by the delta is copied
+    assert duplicated.question_db["first"] is initial.question_db["first"]
+    assert duplicated.question_db["second"] is not \
+           initial.question_db["second"]
+    assert len(initial.get_question_ids("second")) == 1
+    question_id = QuestionDatabase.generate_question_id("q")
+    assert initial.question_db["second"]["post_ids"] == {"1": question_id}
+    assert duplicated.get_question_ids("second") == []
+
+
+def test_indexes_are_built_per_version():
+    refresher = QuestionDatabaseRefresher(lambda db: QuestionDatabase(),
+                                          interval=60)
+    refresher.register_index("id", lambda question_db: id(question_db))
+    refresher.publish(QuestionDatabase())
+
+    question_db, indexes = refresher.get_snapshot()
+    assert indexes["id"] == id(question_db)
+
+    refresher.refresh()
+    refreshed_db, refreshed_indexes = refresher.get_snapshot()
+    assert refreshed_db is not question_db
+    assert refresher.get_index("id") == id(refreshed_db)
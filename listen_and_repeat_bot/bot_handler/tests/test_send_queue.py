@@ -0,0 +1,104 @@
+import time
+import threading
+
+import pytest
+from send_queue import TokenBucket, SendQueue
+
+
+class RetryAfter(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"retry after {retry_after}")
+        self.retry_after = retry_after
+
+
+@pytest.fixture
+def send_queue():
+    send_queue = SendQueue(workers=4, global_rate=1000, chat_rate=1000,
+                           chat_burst=1000)
+    send_queue.start()
+    yield send_queue
+    send_queue.stop(timeout=5)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = bucket.updated_at
+
+    for i in range(2):
+        assert bucket.get_delay(now) == 0
+        bucket.take(now)
+    assert bucket.get_delay(now) == pytest.approx(0.1)
+    assert bucket.get_delay(now + 0.11) == 0
+
+
+def test_requests_of_one_chat_are_sent_in_order(send_queue):
+    sent = {chat_id: [] for chat_id in range(4)}
+
+    def send_message(chat_id, value):
+        time.sleep(0.001)
+        sent[chat_id].append(value)
+
+    futures = [send_queue.send(chat_id, send_message, chat_id, value)
+               for value in range(20) for chat_id in range(4)]
+    for future in futures:
+        future.result(timeout=5)
+
+    assert all(values == list(range(20)) for values in sent.values())
+    stats = send_queue.get_stats()
+    assert stats["sent"] == 80
+    assert stats["queue_depth"] == 0
+    assert stats["latency_p95"] > 0
+
+
+def test_chat_rate_is_limited():
+    send_queue = SendQueue(workers=4, global_rate=1000,
+                           chat_rate=20, chat_burst=1)
+    send_queue.start()
+    sent_at = []
+    try:
+        futures = [send_queue.send("chat", lambda: sent_at.append(
+                                           time.monotonic()))
+                   for i in range(5)]
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        send_queue.stop(timeout=5)
+
+    # 4 intervals of at least 1/20 seconds
+    assert sent_at[-1] - sent_at[0] >= 0.15
+
+
+def test_retry_after_pauses_chat(send_queue):
+    attempts = []
+
+    def send_message():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RetryAfter(0.1)
+        return "sent"
+
+    assert send_queue.send("chat", send_message).result(timeout=5) == "sent"
+    assert attempts[1] - attempts[0] >= 0.1
+    assert send_queue.get_stats()["retried"] == 1
+
+
+def test_failed_request_does_not_block_chat(send_queue):
+    failed = send_queue.send("chat", lambda: 1 / 0)
+    succeeded = send_queue.send("chat", lambda: "sent")
+
+    with pytest.raises(ZeroDivisionError):
+        failed.result(timeout=5)
+    assert succeeded.result(timeout=5) == "sent"
+    assert send_queue.get_stats()["failed"] == 1
+
+
+def test_send_returns_immediately(send_queue):
+    release = threading.Event()
+
+    started = time.monotonic()
+    future = send_queue.send("chat", release.wait, 5)
+    assert time.monotonic() - started < 0.1
+    assert send_queue.get_queue_depth() == 1
+
+    release.set()
+    future.result(timeout=5)
@@ -0,0 +1,157 @@
+import queue
+import threading
+
+import pytest
+from sharding import (get_shard, get_update_user_id,
+                      shard_filename, ShardRouter, poll_updates)
+from webhook_server import WebhookServer
+from benchmarks.fake_telegram import FakeTelegram, make_message_update
+
+
+SECRET_TOKEN = "shard-secret"
+
+
+def test_get_shard_is_stable_and_balanced():
+    shards = [get_shard(user_id, 4) for user_id in range(10000)]
+
+    assert shards == [get_shard(str(user_id), 4) for user_id in range(10000)]
+    assert all(2000 < shards.count(shard) < 3000 for shard in range(4))
+
+
+def test_shard_filename():
+    assert shard_filename("users.db.json", 0, 1) == "users.db.json"
+    assert shard_filename("users.db.json", 2, 4) == "users.db.json.shard2"
+
+
+def test_get_update_user_id():
+    assert get_update_user_id(make_message_update(1, 42, "hi")) == 42
+    assert get_update_user_id({
+        "update_id": 2,
+        "callback_query": {"id": "1", "from": {"id": 43}, "data": "0,a"}
+    }) == 43
+    assert get_update_user_id({"update_id": 3, "poll": {}}) is None
+
+
+@pytest.fixture
+def shards():
+    shards = []
+    for shard_index in range(3):
+        received = queue.Queue()
+        webhook_server = WebhookServer(on_update=received.put,
+                                       secret_token=SECRET_TOKEN,
+                                       port=0, url_path="/webhook")
+        webhook_server.start()
+        shards.append((webhook_server, received))
+    yield shards
+    for webhook_server, _ in shards:
+        webhook_server.stop(timeout=5)
+
+
+def test_router_forwards_updates_in_order(shards):
+    shard_urls = []
+    for webhook_server, _ in shards:
+        host, port = webhook_server.get_address()
+        shard_urls.append(f"http://{host}:{port}/webhook")
+    shard_router = ShardRouter(shard_urls, SECRET_TOKEN, retry_delay=0)
+    shard_router.start()
+
+    updates = [make_message_update(update_id, user_id, f"{update_id}")
+               for update_id in range(30) for user_id in range(5)]
+    for update in updates:
+        shard_router.route(update)
+    shard_router.stop(timeout=5)
+
+    for shard_index, (_, received) in enumerate(shards):
+        forwarded = []
+        while not received.empty():
+            forwarded.append(received.get())
+        assert forwarded == [
+            update for update in updates
+            if get_shard(get_update_user_id(update), 3) == shard_index
+        ]
+    assert sum(shard_router.forwarded) == len(updates)
+
+
+def test_router_drops_rejected_updates(shards):
+    webhook_server, received = shards[0]
+    host, port = webhook_server.get_address()
+    shard_router = ShardRouter([f"http://{host}:{port}/webhook"],
+                               "wrong-secret", retry_delay=0)
+    shard_router.start()
+    shard_router.route(make_message_update(1, 1, "hi"))
+    shard_router.stop(timeout=5)
+
+    assert received.empty()
+    assert shard_router.dropped == [1]
+
+
+def test_router_retries_until_shard_accepts(shards):
+    webhook_server, received = shards[0]
+    host, port = webhook_server.get_address()
+    shard_url = f"http://{host}:{port}/webhook"
+    # the shard is down for a while, updates are kept in order
+    webhook_server.stop(timeout=5)
+
+    shard_router = ShardRouter([shard_url], SECRET_TOKEN, max_backlog=2,
+                               retry_delay=0.01, max_retry_delay=0.05)
+    shard_router.start()
+    for update_id in [1, 2]:
+        shard_router.route(make_message_update(update_id, 1, "hi"))
+    assert shard_router.get_undelivered_update_id() == 1
+
+    # the backlog is full, route() waits for a free slot
+    blocked = threading.Thread(target=shard_router.route,
+                               args=(make_message_update(3, 1, "hi"),))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    restarted = WebhookServer(on_update=received.put,
+                              secret_token=SECRET_TOKEN,
+                              listen=host, port=port, url_path="/webhook")
+    restarted.start()
+    try:
+        blocked.join(5)
+        shard_router.stop(timeout=5)
+    finally:
+        restarted.stop(timeout=5)
+
+    assert [received.get()["update_id"] for i in range(3)] == [1, 2, 3]
+    assert shard_router.dropped == [0]
+    assert shard_router.get_undelivered_update_id() is None
+
+
+def test_poll_updates_confirms_only_delivered_updates():
+    fake_telegram = FakeTelegram()
+    fake_telegram.start()
+    for update_id in [10, 11]:
+        fake_telegram.add_update(make_message_update(update_id, 1, "hi"))
+
+    stopped = threading.Event()
+    routed = []
+    undelivered = {10, 11}
+    thread = threading.Thread(
+        target=poll_updates,
+        args=(fake_telegram.base_url, lambda data: routed.append(
+                                      data["update_id"]), stopped),
+        kwargs={"timeout": 0,
+                "get_undelivered_update_id": lambda: min(undelivered,
+                                                         default=None)})
+    thread.start()
+    try:
+        # updates returned again are not routed twice
+        fake_telegram.wait_for_calls("getUpdates", 2)
+        assert routed == [10, 11]
+        offsets = [int(params["offset"]) for _, params in
+                   fake_telegram.get_calls("getUpdates")]
+        assert max(offsets) == 10
+
+        undelivered.clear()
+        fake_telegram.wait_for_calls("getUpdates", len(offsets) + 2)
+        assert int(fake_telegram.get_calls("getUpdates")[-1][1]["offset"]) \
+               == 12
+        assert routed == [10, 11]
+    finally:
+        stopped.set()
+        thread.join(5)
+        fake_telegram.stop(timeout=5)
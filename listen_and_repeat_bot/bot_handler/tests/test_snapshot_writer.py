@@ -0,0 +1,69 @@
+import json
+import os
+
+import pytest
+from question_db import QuestionDatabase
+from snapshot_writer import SnapshotWriter
+
+
+class BrokenDatabase():
+    def export_to_json(self):
+        raise TypeError("Object is not JSON serializable")
+
+
+def test_write_now_is_atomic(tmp_path):
+    filename = tmp_path / "questions.db.json"
+    filename.write_text("previous version")
+
+    snapshot_writer = SnapshotWriter()
+    snapshot_writer.register("broken", BrokenDatabase, str(filename))
+    assert snapshot_writer.write_now("broken") is False
+    assert filename.read_text() == "previous version",\
+           "Failed write should not touch the existing file"
+    assert snapshot_writer.is_dirty("broken")
+
+    question_db = QuestionDatabase()
+    question_db.create_channel("channel")
+    snapshot_writer.register("questions", lambda: question_db, str(filename))
+    assert snapshot_writer.write_now("questions") is True
+
+    assert json.loads(filename.read_text()) == question_db.question_db
+    assert snapshot_writer.get_bytes_written("questions") == \
+           os.path.getsize(filename)
+    assert not [path for path in filename.parent.iterdir()
+                if path.name.endswith(".tmp")]
+
+
+def test_dirty_databases_are_coalesced(tmp_path):
+    exports = []
+
+    class CountingDatabase():
+        def export_to_json(self):
+            exports.append(True)
+            return "{}"
+
+    snapshot_writer = SnapshotWriter(delay=0.1)
+    snapshot_writer.register("questions", CountingDatabase,
+                             str(tmp_path / "questions.db.json"))
+    snapshot_writer.register("users", CountingDatabase,
+                             str(tmp_path / "users.db.json"))
+
+    for i in range(10):
+        snapshot_writer.mark_dirty("questions")
+    assert snapshot_writer.flush() == ["questions"]
+    assert snapshot_writer.flush() == []
+    assert len(exports) == 1
+
+    with pytest.raises(KeyError):
+        snapshot_writer.mark_dirty("unknown")
+
+
+def test_background_writer(tmp_path):
+    filename = tmp_path / "questions.db.json"
+    snapshot_writer = SnapshotWriter(delay=0.05)
+    snapshot_writer.register("questions", QuestionDatabase, str(filename))
+    snapshot_writer.start()
+    snapshot_writer.mark_dirty("questions")
+    snapshot_writer.stop(timeout=5)
+
+    assert json.loads(filename.read_text()) == {}
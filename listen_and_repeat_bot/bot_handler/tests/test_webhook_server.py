@@ -0,0 +1,99 @@
+import queue
+
+import pytest
+from telegram import Bot, Update
+from telegram.ext import Dispatcher, CommandHandler
+
+from webhook_server import WebhookServer
+from benchmarks.fake_telegram import (
+    FakeTelegram,
+    make_message_update,
+    post_update
+)
+
+
+SECRET_TOKEN = "secret"
+
+
+@pytest.fixture
+def fake_telegram():
+    fake_telegram = FakeTelegram()
+    fake_telegram.start()
+    yield fake_telegram
+    fake_telegram.stop(timeout=5)
+
+
+@pytest.fixture
+def received():
+    return queue.Queue()
+
+
+@pytest.fixture
+def webhook_server(received):
+    webhook_server = WebhookServer(on_update=received.put,
+                                   secret_token=SECRET_TOKEN,
+                                   port=0, url_path="/webhook")
+    webhook_server.start()
+    yield webhook_server
+    webhook_server.stop(timeout=5)
+
+
+def webhook_url(webhook_server, path="/webhook"):
+    host, port = webhook_server.get_address()
+    return f"http://{host}:{port}{path}"
+
+
+def test_update_is_accepted(webhook_server, received):
+    update = make_message_update(1, 100, "hello")
+
+    assert post_update(webhook_url(webhook_server), update,
+                       SECRET_TOKEN) == 200
+    assert received.get(timeout=5) == update
+    assert webhook_server.accepted == 1
+
+
+@pytest.mark.parametrize("secret_token", [None, "", "wrong"])
+def test_wrong_secret_token_is_rejected(webhook_server, received,
+                                        secret_token):
+    update = make_message_update(1, 100, "hello")
+
+    assert post_update(webhook_url(webhook_server), update,
+                       secret_token) == 403
+    assert received.empty()
+    assert webhook_server.rejected == 1
+
+
+def test_unknown_path_and_broken_body(webhook_server, received):
+    assert post_update(webhook_url(webhook_server, "/other"),
+                       {}, SECRET_TOKEN) == 404
+    assert post_update(webhook_url(webhook_server),
+                       [1, 2], SECRET_TOKEN) == 400
+    assert received.empty()
+
+
+def test_updates_reach_dispatcher(fake_telegram):
+    bot = Bot("123:token", base_url=fake_telegram.base_url)
+    dispatcher = Dispatcher(bot, queue.Queue(), workers=1)
+    dispatcher.add_handler(CommandHandler(
+        "start", lambda update, context: update.message.reply_text("hi")))
+
+    webhook_server = WebhookServer(
+        on_update=lambda data: dispatcher.update_queue.put(
+                               Update.de_json(data, bot)),
+        secret_token=SECRET_TOKEN, port=0, url_path="/webhook")
+    webhook_server.start()
+    try:
+        for update_id, user_id in enumerate([100, 200]):
+            assert post_update(
+                webhook_url(webhook_server),
+                make_message_update(update_id, user_id, "/start"),
+                SECRET_TOKEN) == 200
+
+        while not dispatcher.update_queue.empty():
+            dispatcher.process_update(dispatcher.update_queue.get())
+    finally:
+        webhook_server.stop(timeout=5)
+
+    assert fake_telegram.wait_for_calls("sendMessage", 2)
+    assert sorted(int(params["chat_id"]) for _, params in
+                  fake_telegram.get_calls("sendMessage")) == [100, 200]
@@ -0,0 +1,145 @@
+import hmac
+import json
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+
+class WebhookServer():
+    """
+    USAGE:
+        webhook_server = WebhookServer(
+            on_update=lambda data: dispatcher.update_queue.put(
+                                   Update.de_json(data, bot)),
+            secret_token="random-secret",
+            listen="0.0.0.0", port=8443, url_path="/webhook")
+        webhook_server.start()
+        bot.set_webhook(url="https://example.com/webhook",
+                        secret_token="random-secret")
+
+    HTTP listener for updates sent by Telegram, a request is accepted
+    only if X-Telegram-Bot-Api-Secret-Token header equals secret_token,
+    on_update(data) is called with the decoded JSON of every update
+    and should return quickly, e.g. put the update to a queue
+
+    responses:
+        200 - update is accepted
+        400 - body is not a JSON object or it's too large
+        403 - secret token is wrong
+        404 - unknown path
+    """
+
+    SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+    MAX_BODY_SIZE = 1024 * 1024
+
+    def __init__(self, on_update, secret_token,
+                 listen="127.0.0.1", port=8443, url_path="/"):
+        self.logger = logging.getLogger(__name__)
+
+        self.on_update = on_update
+        self.secret_token = secret_token
+        self.url_path = url_path
+
+        self.accepted = 0
+        self.rejected = 0
+
+        self.__server = ThreadingHTTPServer((listen, port),
+                                            self._make_request_handler())
+        self.__server.daemon_threads = True
+        self.__thread = None
+
+
+    def get_address(self):
+        """
+        function returns:
+            (host, port) which the listener is bound to,
+            useful when the server is created with port=0
+        """
+
+        return self.__server.server_address[:2]
+
+
+    def start(self):
+        """
+        function returns:
+            True - listener is started
+            False - listener is already running
+        """
+
+        if self.__thread is not None and self.__thread.is_alive():
+            return False
+
+        self.__thread = threading.Thread(target=self.__server.serve_forever,
+                                         name="webhook-server",
+                                         daemon=True)
+        self.__thread.start()
+        self.logger.info("listening for updates on %s:%s%s",
+                         *self.get_address(), self.url_path)
+        return True
+
+
+    def stop(self, timeout=None):
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join(timeout)
+
+
+    def handle(self, path, headers, body):
+        """
+        function returns:
+            int - HTTP status of the response
+        """
+
+        if path.split("?")[0] != self.url_path:
+            return 404
+
+        secret_token = headers.get(self.SECRET_TOKEN_HEADER) or ""
+        if not hmac.compare_digest(secret_token.encode("utf-8"),
+                                   self.secret_token.encode("utf-8")):
+            self.rejected += 1
+            self.logger.warning("Reject update with wrong secret token")
+            return 403
+
+        try:
+            data = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return 400
+        if not isinstance(data, dict):
+            return 400
+
+        try:
+            self.on_update(data)
+        except Exception as exc:
+            # Telegram resends updates answered with errors
+            self.logger.exception("Failed to accept update due to %s", exc)
+            return 500
+
+        self.accepted += 1
+        return 200
+
+
+    def _make_request_handler(self):
+        webhook_server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                except ValueError:
+                    length = -1
+
+                if not 0 <= length <= webhook_server.MAX_BODY_SIZE:
+                    status = 400
+                else:
+                    status = webhook_server.handle(self.path, self.headers,
+                                                   self.rfile.read(length))
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                webhook_server.logger.debug(format, *args)
+
+        return RequestHandler
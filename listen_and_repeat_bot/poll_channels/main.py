@@ -1,10 +1,12 @@
 import re
 import os
 import sys
+import json
 import getpass
 import asyncio
 import logging
 import datetime
+from email.utils import format_datetime, parsedate_to_datetime
 
 import yaml
 from aiohttp import web
@@ -22,29 +24,137 @@ logger = logging.getLogger(__name__)
 
 routes = web.RouteTableDef()
 
+# etag has to change after restart, since version starts from zero again
+STARTUP_ID = int(datetime.datetime.now().timestamp())
+# serialized /data response for the latest content version
+data_cache = {
+    "version": None,
+    "body": None
+}
 
 
-@routes.get('/data')
-async def index_page(request):
-    data = {"channels": []}
+
+def format_posts(messages):
+    return [
+        {
+            "id": post.id,
+            "timestamp": post.date.timestamp(),
+            "data": post.message
+        }
+        for post in messages
+        if isinstance(post, Message)
+    ]
+
+
+def build_data(version):
+    data = {
+        "cursor": build_cursor(version),
+        "full": True,
+        "channels": []
+    }
 
     for channel_obj in config["channels"]:
-        posts = [
-            {
-                "timestamp": post.date.timestamp(),
-                "data": post.message
-            }
-            for post in poll_controller.get_channel_posts(
-                        channel_obj["channel_id"])
-            if isinstance(post, Message)
-        ]
         channel_data = {
             **channel_obj,
-            "posts": posts
+            "posts": format_posts(poll_controller.get_channel_posts(
+                                  channel_obj["channel_id"]))
         }
         data["channels"].append(channel_data)
 
-    return web.json_response(data)
+    return data
+
+
+def build_delta_data(version, changes):
+    data = {
+        "cursor": build_cursor(version),
+        "full": False,
+        "channels": []
+    }
+
+    for channel_obj in config["channels"]:
+        channel_changes = changes.get(channel_obj["channel_id"], {})
+        channel_data = {
+            **channel_obj,
+            "added": format_posts(channel_changes.get("added", [])),
+            "edited": format_posts(channel_changes.get("edited", [])),
+            "deleted": channel_changes.get("deleted", [])
+        }
+        data["channels"].append(channel_data)
+
+    return data
+
+
+def build_cursor(version):
+    return f"{STARTUP_ID}-{version}"
+
+
+def parse_cursor(cursor):
+    """
+    function returns:
+        int - version the cursor was issued for
+        None - cursor is malformed or issued before restart
+    """
+
+    items = cursor.split("-")
+    if len(items) != 2 or items[0] != str(STARTUP_ID):
+        return None
+    try:
+        return int(items[1])
+    except ValueError:
+        return None
+
+
+def is_not_modified(request, etag, last_modified):
+    """
+    function returns:
+        True - client has the same content version
+        False - client has to download content
+    """
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        client_etags = [el.strip() for el in if_none_match.split(",")]
+        return etag in client_etags or "*" in client_etags
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified.replace(microsecond=0) <= since
+
+    return False
+
+
+@routes.get('/data')
+async def index_page(request):
+    version, last_modified = poll_controller.get_version()
+    headers = {
+        "ETag": f'"{build_cursor(version)}"',
+        "Last-Modified": format_datetime(last_modified, usegmt=True)
+    }
+
+    if is_not_modified(request, headers["ETag"], last_modified):
+        return web.Response(status=304, headers=headers)
+
+    since = parse_cursor(request.query.get("since", ""))
+    changes = None
+    if since is not None:
+        changes = poll_controller.get_changes(since)
+
+    if changes is not None:
+        # delta responses are small, don't cache them
+        return web.json_response(build_delta_data(version, changes),
+                                 headers=headers)
+
+    if data_cache["version"] != version:
+        data_cache["body"] = json.dumps(build_data(version))
+        data_cache["version"] = version
+
+    return web.Response(text=data_cache["body"],
+                        content_type="application/json",
+                        headers=headers)
 
 @routes.get('/status')
 async def status(request):
@@ -72,7 +182,9 @@ async def poll_channel_forever(poll_controller, config):
         message_limit = config["message_limit"]
         polling_interval = config["polling_interval"]
 
-        await poll_controller.poll_channel(channel_id, message_limit)
+        await poll_controller.poll_channel(
+                              channel_id, message_limit,
+                              reconcile_every=config.get("reconcile_every"))
         await asyncio.sleep(polling_interval)
 
 
@@ -91,7 +203,8 @@ def parse_listen_address(listen_address):
 def parse_config_file(filename):
     try:
         with open(filename, "r") as file:
-            return yaml.safe_load(file)
+            config = yaml.safe_load(file)
+        return config if check_config(config) else None
     except (yaml.YAMLError, OSError) as exc:
         if isinstance(exc, OSError):
             print("Cannot read configuration file, "
@@ -102,6 +215,26 @@ def parse_config_file(filename):
         return None
 
 
+def check_config(config):
+    """
+    function returns:
+        True - options of every channel are valid
+        False - an option is invalid, the reason is printed
+    """
+
+    for channel_opts in config["channels"]:
+        reconcile_every = channel_opts.get("reconcile_every")
+        # every poll is a reconciliation with reconcile_every: 1
+        if reconcile_every is not None and \
+                (not isinstance(reconcile_every, int) or
+                 reconcile_every < 1):
+            print(f"reconcile_every of channel "
+                  f"{channel_opts.get('channel_id')} "
+                  f"should be an integer >= 1")
+            return False
+    return True
+
+
 def create_poll_channel_controller(session_filename, session_name,
                                    api_id, api_hash):
     poll_channel = PollPublicChannel()
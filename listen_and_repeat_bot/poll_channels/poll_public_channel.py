@@ -1,4 +1,5 @@
 import logging
+import datetime
 
 from telethon.sync import TelegramClient
 from telethon import errors
@@ -7,6 +8,12 @@ from telethon import errors
 
 class PollPublicChannel():
 
+    # how many change records to keep for delta requests
+    CHANGE_LOG_LIMIT = 10000
+    # every RECONCILE_EVERY polls the whole window is fetched
+    # to catch edited and deleted messages
+    RECONCILE_EVERY = 12
+
 
     def __init__(self):
         self.logger = logging.getLogger(__name__)
@@ -14,6 +21,21 @@ class PollPublicChannel():
         self.channels = {}
         self.client = None
 
+        # the highest message id seen and polls made per channel
+        self.max_ids = {}
+        self.poll_counts = {}
+
+        # version is increased every time polled content changes
+        self.version = 0
+        self.last_modified = datetime.datetime.now(datetime.timezone.utc)
+        self.fingerprints = {}
+
+        # list of (version, channel_id, kind, message_id),
+        # kind is one of "added", "edited", "deleted"
+        self.change_log = []
+        # the oldest version get_changes() can be called with
+        self.change_log_start = 0
+
 
     def authenticate(self, session_filename, api_id, api_hash, **kwargs):
         """
@@ -64,22 +86,189 @@ class PollPublicChannel():
             return None
 
 
-    async def poll_channel(self, channel_id, message_limit=100):
+    def get_version(self):
+        """
+        function returns a tuple:
+            (version: int, last_modified: datetime) - content version of
+                                                      all polled channels
+        """
+
+        return (self.version, self.last_modified)
+
+
+    def get_changes(self, since):
+        """
+        function returns:
+            dict - changes of all channels made after version <since>:
+                   {
+                       channel_id: {
+                           "added": list of messages,
+                           "edited": list of messages,
+                           "deleted": list of message ids
+                       }
+                   }
+            None - change log doesn't cover version <since>,
+                   full content has to be requested
+        """
+
+        if since < self.change_log_start or since > self.version:
+            return None
+
+        # the last change of each message wins
+        last_changes = {}
+        added = set()
+        for version, channel_id, kind, message_id in self.change_log:
+            if version <= since:
+                continue
+            last_changes[(channel_id, message_id)] = kind
+            if kind == "added":
+                added.add((channel_id, message_id))
+
+        changes = {}
+        channel_messages = {}
+        for (channel_id, message_id), kind in last_changes.items():
+            channel_changes = changes.setdefault(
+                channel_id, {"added": [], "edited": [], "deleted": []})
+
+            if kind == "deleted":
+                channel_changes["deleted"].append(message_id)
+                continue
+
+            if channel_id not in channel_messages:
+                channel_messages[channel_id] = {
+                    message.id: message
+                    for message in self.channels.get(channel_id, [])
+                }
+
+            message = channel_messages[channel_id].get(message_id)
+            if message is None:
+                # message is out of message_limit window now
+                continue
+
+            if (channel_id, message_id) in added:
+                channel_changes["added"].append(message)
+            else:
+                channel_changes["edited"].append(message)
+
+        return changes
+
+
+    def _update_version(self, channel_id, messages):
+        """
+        compare messages of channel_id with the previous poll cycle,
+        record changes and increase content version if any
+
+        messages which are older than the polled window
+        are not considered as deleted
+
+        function returns:
+            True - content has changed
+            False - content is the same
+        """
+
+        fingerprint = {
+            message.id: (
+                getattr(message, "edit_date", None),
+                getattr(message, "message", None))
+            for message in messages
+        }
+        previous = self.fingerprints.get(channel_id, {})
+
+        if previous == fingerprint:
+            return False
+
+        changes = []
+        for message_id, content in fingerprint.items():
+            if message_id not in previous:
+                changes.append(("added", message_id))
+            elif previous[message_id] != content:
+                changes.append(("edited", message_id))
+
+        oldest_id = min(fingerprint) if fingerprint else None
+        for message_id in previous:
+            if message_id in fingerprint or oldest_id is None:
+                continue
+            if message_id > oldest_id:
+                changes.append(("deleted", message_id))
+
+        self.fingerprints[channel_id] = fingerprint
+        self.version += 1
+        self.last_modified = datetime.datetime.now(datetime.timezone.utc)
+
+        for kind, message_id in changes:
+            self.change_log.append(
+                (self.version, channel_id, kind, message_id))
+
+        if len(self.change_log) > self.CHANGE_LOG_LIMIT:
+            dropped = self.change_log[:-self.CHANGE_LOG_LIMIT]
+            self.change_log = self.change_log[-self.CHANGE_LOG_LIMIT:]
+            self.change_log_start = dropped[-1][0]
+        return True
+
+
+    def _merge_messages(self, channel_id, messages, message_limit):
         """
+        merge new messages into the stored ones, keep only
+        <message_limit> newest messages ordered from newest to oldest
+        """
+
+        merged = {message.id: message
+                  for message in self.channels.get(channel_id, [])}
+        for message in messages:
+            merged[message.id] = message
+
+        self.channels[channel_id] = [
+            merged[message_id]
+            for message_id in sorted(merged, reverse=True)[:message_limit]
+        ]
+
+
+    async def poll_channel(self, channel_id, message_limit=100,
+                           reconcile_every=None):
+        """
+        function accepts args:
+            channel_id
+            message_limit    - how many newest messages to keep
+            reconcile_every  - re-fetch the whole window every
+                               <reconcile_every> polls, otherwise only
+                               messages newer than seen are requested
+
         function returns a tuple:
             (0,) - polling is successfull
             (1,) - connection error during polling
             (5, seconds: int) - flood error, wait for <seconds>
         """
+
+        if reconcile_every is None:
+            reconcile_every = self.RECONCILE_EVERY
+
+        poll_count = self.poll_counts.get(channel_id, 0)
+        max_id = self.max_ids.get(channel_id)
+        reconcile = max_id is None or poll_count % reconcile_every == 0
+
         try:
-            self.channels[channel_id] = await self.client.get_messages(
-                                        channel_id,
-                                        limit=message_limit)
+            if reconcile:
+                messages = await self.client.get_messages(
+                                 channel_id,
+                                 limit=message_limit)
+                self.channels[channel_id] = list(messages)
+            else:
+                messages = await self.client.get_messages(
+                                 channel_id,
+                                 limit=message_limit,
+                                 min_id=max_id)
+                self._merge_messages(channel_id, messages, message_limit)
+
+            self.poll_counts[channel_id] = poll_count + 1
+            if self.channels[channel_id]:
+                self.max_ids[channel_id] = max(
+                    max_id or 0, self.channels[channel_id][0].id)
+            self._update_version(channel_id, self.channels[channel_id])
 
             self.logger.info("@%s has been polled "
-                             "successfully, got "
+                             "successfully (reconcile=%s), got "
                              "%s posts",
-                             channel_id, len(self.channels[channel_id]))
+                             channel_id, reconcile, len(messages))
             return (0,)
 
         except (ConnectionError, errors.FloodWaitError) as exc:
@@ -1,4 +1,5 @@
-from unittest.mock import Mock, patch
+import asyncio
+from unittest.mock import Mock, AsyncMock, patch
 
 import pytest
 from telethon import errors
@@ -38,3 +39,70 @@ def test_telegram_authentication(connect_status, expected, mocker):
         auth_response = (RuntimeError,)
 
     assert auth_response[0] == expected[0], "Failed"
+
+
+def test_version_changes_only_with_content():
+    obj = PollPublicChannel()
+    messages = [Mock(id=1, edit_date=None, message="hello\nworld")]
+
+    assert obj._update_version("channel", messages) is True
+    version, last_modified = obj.get_version()
+
+    assert obj._update_version("channel", list(messages)) is False
+    assert obj.get_version() == (version, last_modified)
+
+    messages[0].message = "hello\nworld!"
+    assert obj._update_version("channel", messages) is True
+    assert obj.get_version()[0] == version + 1
+
+
+def test_changes_since_version():
+    obj = PollPublicChannel()
+    first = Mock(id=1, edit_date=None, message="first")
+    second = Mock(id=2, edit_date=None, message="second")
+    third = Mock(id=3, edit_date=None, message="third")
+
+    obj.channels["channel"] = [third, second, first]
+    obj._update_version("channel", obj.channels["channel"])
+    cursor = obj.get_version()[0]
+
+    fourth = Mock(id=4, edit_date=None, message="fourth")
+    third.message = "third (edited)"
+    obj.channels["channel"] = [fourth, third, first]
+    obj._update_version("channel", obj.channels["channel"])
+
+    changes = obj.get_changes(cursor)["channel"]
+    assert changes["added"] == [fourth]
+    assert changes["edited"] == [third]
+    assert changes["deleted"] == [2]
+
+    assert obj.get_changes(obj.get_version()[0]) == {}
+    assert obj.get_changes(obj.get_version()[0] + 1) is None
+
+
+def test_incremental_polling():
+    obj = PollPublicChannel()
+    obj.client = Mock()
+    first = Mock(id=1, edit_date=None, message="first")
+    second = Mock(id=2, edit_date=None, message="second")
+    third = Mock(id=3, edit_date=None, message="third")
+
+    obj.client.get_messages = AsyncMock(return_value=[second, first])
+    asyncio.run(obj.poll_channel("channel", message_limit=2,
+                                 reconcile_every=2))
+    obj.client.get_messages.assert_called_with("channel", limit=2)
+
+    obj.client.get_messages = AsyncMock(return_value=[third])
+    asyncio.run(obj.poll_channel("channel", message_limit=2,
+                                 reconcile_every=2))
+    obj.client.get_messages.assert_called_with("channel", limit=2, min_id=2)
+
+    assert obj.get_channel_posts("channel") == [third, second],\
+           "New messages are not merged into a bounded store"
+
+    # the third poll is a reconciliation pass
+    obj.client.get_messages = AsyncMock(return_value=[third])
+    asyncio.run(obj.poll_channel("channel", message_limit=2,
+                                 reconcile_every=2))
+    obj.client.get_messages.assert_called_with("channel", limit=2)
+    assert obj.get_channel_posts("channel") == [third]